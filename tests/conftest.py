@@ -0,0 +1,73 @@
+'''
+Fixtures of the tests of the diagnostic servers: the servers are bound to
+inproc addresses of a context of the test and stopped at the end of the test.
+'''
+
+import itertools
+import socket
+import pytest
+import zmq
+from visu.diagServer import diagServer
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def context():
+    context = zmq.Context()
+    yield context
+    context.term()
+
+
+@pytest.fixture
+def tcpAddress():
+    '''
+    Return a tcp address of localhost nobody listens to.
+    '''
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"tcp://127.0.0.1:{sock.getsockname()[1]}"
+
+
+@pytest.fixture
+def startServer(context):
+    '''
+    Return a function starting a diagServer (arguments of diagServer), by
+    default on a new inproc address of 'context'.
+    '''
+    servers = []
+
+    def start(**kwds):
+        kwds.setdefault("address", f"inproc://test-server-{next(_names)}")
+        kwds.setdefault("context", context)
+        server = diagServer(**kwds)
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def ask(context):
+    '''
+    Return a function sending a request to an address and returning the
+    frames of the answer (TimeoutError after 2 s).
+    '''
+    sockets = []
+
+    def request(address, message):
+        sock = context.socket(zmq.REQ)
+        sock.setsockopt(zmq.LINGER, 0)
+        sockets.append(sock)
+        sock.connect(address)
+        sock.send_string(message)
+        if not sock.poll(2000):
+            raise TimeoutError(message)
+        return sock.recv_multipart()
+
+    yield request
+    for sock in sockets:
+        sock.close(0)
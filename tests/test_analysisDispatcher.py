@@ -0,0 +1,79 @@
+'''
+Tests of the analyses run in worker threads (visu.analysisDispatcher).
+The dispatcher delivers its results with Qt signals: skipped without PyQt6.
+'''
+
+import threading
+import time
+import pytest
+
+QtCore = pytest.importorskip("PyQt6.QtCore")
+from visu.analysisDispatcher import AnalysisDispatcher  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def waitDelivered(app, dispatcher, count, timeout=5.):
+    deadline = time.monotonic() + timeout
+    while dispatcher.delivered < count and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+    app.processEvents()
+    return dispatcher.delivered
+
+
+def submitBlocked(dispatcher, results, nbJobs, **kwds):
+    '''
+    Submit 'nbJobs' jobs of the same analysis while the first one is blocked.
+    '''
+    release = threading.Event()
+
+    def compute(index):
+        if index == 0:
+            release.wait(5)
+        return index
+
+    for index in range(nbJobs):
+        dispatcher.submit("analysis", compute, results.append, index, **kwds)
+    release.set()
+
+
+@pytest.mark.parametrize("latestOnly, delivered", [(False, [0, 4, 5]), (True, [0, 5])])
+def test_waitingJobs(app, latestOnly, delivered):
+    dispatcher = AnalysisDispatcher(maxWorkers=2, maxWaiting=2)
+    results = []
+    try:
+        submitBlocked(dispatcher, results, 6, latestOnly=latestOnly)
+        assert waitDelivered(app, dispatcher, len(delivered)) == len(delivered)
+        assert results == delivered  # in the order of the frames
+        assert dispatcher.dropped == 6 - len(delivered)
+        assert dispatcher.pending() == 0
+    finally:
+        dispatcher.shutdown(wait=True)
+
+
+def test_errorDoesNotStopTheAnalysis(app):
+    dispatcher = AnalysisDispatcher(maxWorkers=1)
+    results = []
+
+    def compute(value):
+        return 1 / value
+
+    try:
+        dispatcher.submit("ratio", compute, results.append, 0)
+        dispatcher.submit("ratio", compute, results.append, 4)
+        assert waitDelivered(app, dispatcher, 1) == 1
+        assert results == [0.25]
+        assert dispatcher.stats()["errors"] == 1
+    finally:
+        dispatcher.shutdown(wait=True)
+
+
+def test_shutdown(app):
+    dispatcher = AnalysisDispatcher(maxWorkers=1)
+    dispatcher.shutdown(wait=True)
+    dispatcher.submit("late", lambda: 1, print)
+    assert dispatcher.stats()["submitted"] == 0
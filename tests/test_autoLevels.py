@@ -0,0 +1,67 @@
+'''
+Tests of the levels of the color scale (visu.autoLevels).
+'''
+
+import numpy as np
+import pytest
+from visu.autoLevels import subsample, spotMaximum, percentileLevels
+
+
+def test_subsample():
+    data = np.zeros((1000, 1000))
+    sample = subsample(data, 10000)
+    assert sample.shape == (100, 100)
+    assert np.shares_memory(sample, data)  # a view
+    assert subsample(data[:10, :10], 10000).shape == (10, 10)
+    assert subsample(np.zeros(1000), 100).shape == (100,)
+
+
+def test_smallSpotIsKept():
+    data = np.zeros((2048, 2048), dtype=np.uint16)
+    data[1001:1004, 1001:1004] = 4000  # 3x3 spot between the samples of the stride
+    assert data[::8, ::8].max() == 0
+    assert percentileLevels(data) == (0., 4000.)
+    data[1001:1004, 1001:1004] = 0
+    data[1002:1004, 1002:1004] = 3000  # 2x2 spot in a block of the binning
+    assert percentileLevels(data) == (0., 3000.)
+
+
+def test_hotPixelsIgnored():
+    data = np.zeros((2048, 2048), dtype=np.uint16)
+    data[1001, 1001] = data[500, 500:502] = 60000  # isolated hot pixel and pair
+    data[::7, ::7] = 100
+    assert percentileLevels(data) == (0., 100.)
+
+
+@pytest.mark.parametrize("data, level", [
+    (np.arange(5.), 2.),  # 1-d: blocks (0, 1) (2, 3)
+    (np.array([[4., np.nan], [5., 6.], [9., 9.]]), 4.),  # last row out of the blocks
+    (np.zeros((1, 5)), -np.inf),  # smaller than a block
+])
+def test_spotMaximum(data, level):
+    assert spotMaximum(data) == level
+
+
+def test_lowLevelIgnoresDeadPixels():
+    rng = np.random.default_rng(3)
+    data = rng.normal(100, 1, size=(512, 512)).astype(np.float32)
+    data[:10, :10] = -1000  # 0.04 % of the pixels
+    low, high = percentileLevels(data, low=1)
+    assert low > 90
+    assert 102 < high < data.max()
+
+
+def test_percentileHighLevel():
+    data = np.arange(10000, dtype=np.float64).reshape(100, 100)
+    data[0, 0] = 1e9  # hot pixel
+    low, high = percentileLevels(data, low=10, high=90, binning=None)
+    assert (low, high) == pytest.approx((np.percentile(data, 10), np.percentile(data, 90)))
+    assert percentileLevels(data, high=90)[1] == 9898.  # brightest 2x2 block of the slope
+
+
+def test_nonFiniteAndFlat():
+    data = np.full((4, 4), np.nan)
+    assert percentileLevels(data) == (0., 1.)
+    data[0, :2] = (3, np.inf)
+    assert percentileLevels(data) == (3., 4.)  # flat: high = low + 1
+    assert percentileLevels(np.full((3, 3), 7, dtype=np.uint8)) == (7., 8.)
@@ -0,0 +1,84 @@
+'''
+Tests of the library of the backgrounds (visu.backgroundLibrary).
+'''
+
+import os
+import numpy as np
+import pytest
+from visu.backgroundLibrary import BackgroundKey, RunningBackground, BackgroundLibrary
+
+
+@pytest.fixture
+def darks():
+    rng = np.random.default_rng(4)
+    return rng.normal(100, 5, size=(20, 16, 12)).astype(np.uint16)
+
+
+def accumulate(darks, std=True):
+    background = RunningBackground(std=std)
+    for dark in darks:
+        background.add(dark)
+    return background
+
+
+def test_runningBackground(darks):
+    background = accumulate(darks)
+    assert background.count == 20 and background.shape == (16, 12)
+    assert background.mean.dtype == np.float32
+    np.testing.assert_allclose(background.mean, darks.mean(axis=0), rtol=1e-5)
+    np.testing.assert_allclose(background.std, darks.std(axis=0, ddof=1), rtol=1e-3)
+    assert accumulate(darks, std=False).std is None
+    assert accumulate(darks[:1]).std is None  # one frame
+    with pytest.raises(ValueError):
+        background.add(np.zeros((2, 2)))
+
+
+def test_key():
+    key = BackgroundKey("VISU cam", [16, 12], roi=[0, 0, 16, 12], exposure="10")
+    assert key == BackgroundKey("VISU cam", (16, 12), (0, 0, 16, 12), 10.)
+    assert key.fileName() == "bg_VISU_cam_16x12_roi0_0_16_12_exp10"
+    assert BackgroundKey.fromDict({"camera": "a", "shape": [1, 2]}) == BackgroundKey("a", (1, 2))
+
+
+def test_saveLoad(tmp_path, darks):
+    library = BackgroundLibrary(tmp_path / "library")
+    key = BackgroundKey("VISU", (16, 12), exposure=10)
+    background = accumulate(darks)
+    library.save(key, background)
+
+    mean, std = library.load(key)
+    assert isinstance(mean, np.memmap)
+    np.testing.assert_array_equal(mean, background.mean)
+    np.testing.assert_array_equal(std, background.std)
+    assert library.keys() == [key]
+    assert library.entries()[0]["count"] == 20
+    with pytest.raises(KeyError):
+        library.load(BackgroundKey("VISU", (16, 12)))
+    with pytest.raises(ValueError):
+        library.save(BackgroundKey("VISU", (2, 2)), background)
+
+
+def test_saveReplaces(tmp_path, darks):
+    library = BackgroundLibrary(str(tmp_path))
+    key = BackgroundKey("VISU", (16, 12))
+    library.save(key, darks[0])
+    library.save(key, darks[1])  # same second: new files
+    assert len(library.entries()) == 1
+    mean, std = library.load(key)
+    np.testing.assert_array_equal(mean, darks[1])
+    assert std is None
+    assert sorted(os.listdir(tmp_path)) == sorted(["library.json", library.entries()[0]["mean"]])
+
+
+def test_match(tmp_path, darks):
+    library = BackgroundLibrary(str(tmp_path))
+    anyExposure = BackgroundKey("VISU", (16, 12))
+    exposure10 = BackgroundKey("VISU", (16, 12), exposure=10)
+    library.save(anyExposure, darks[0])
+    library.save(exposure10, darks[1])
+
+    assert library.match(BackgroundKey("VISU", (16, 12), exposure=10)) == exposure10
+    assert library.match(BackgroundKey("VISU", (16, 12), exposure=20)) == anyExposure
+    assert library.match(BackgroundKey("VISU", (16, 12), roi=(0, 0, 8, 8))) is None
+    assert library.find(BackgroundKey("other", (16, 12))) is None
+    np.testing.assert_array_equal(library.find(exposure10), darks[1])
@@ -0,0 +1,27 @@
+'''
+Short runs of the diagServer benchmark (visu.benchDiagServer).
+'''
+
+import argparse
+import json
+import pytest
+from visu.benchDiagServer import run
+
+
+@pytest.mark.parametrize("pattern", ["req", "sub"])
+def test_run(tmp_path, pattern):
+    output = tmp_path / "bench.txt"
+    args = argparse.Namespace(pattern=pattern, mode="router", transport=["inproc"],
+                              payload=["small", "frame"], codec="numpy", clients=[2],
+                              duration=0.2, hwm=10, port=0, output=str(output))
+    results = run(args)
+
+    assert [json.loads(line) for line in output.read_text().splitlines()] == results
+    assert [result["payload"] for result in results] == ["small", "frame"]
+    for result in results:
+        if pattern == "req":
+            assert result["requests"] > 0
+        else:
+            assert result["published"] > 0
+            assert 0 < result["received"] <= result["published"] * 2  # 2 clients
+            assert result["dropped"] >= 0
@@ -0,0 +1,84 @@
+'''
+Tests of the map of the defective pixels (visu.defectMap).
+'''
+
+import numpy as np
+import pytest
+from visu.defectMap import DefectMap, buildDefectMap
+from visu.imageProcessing import ImagePipeline, ProcessingParams
+
+
+@pytest.fixture
+def darks():
+    rng = np.random.default_rng(1)
+    darks = rng.normal(100, 5, size=(8, 40, 30)).astype(np.float32)
+    darks[:, 3, 4] += 500   # hot
+    darks[:, 20, 10] = 0    # dead
+    darks[:, 35, 25] = 102  # stuck
+    return darks
+
+
+def test_buildDefectMap(darks):
+    defects = buildDefectMap(darks)
+    assert sorted(map(tuple, defects.pixels.tolist())) == [(3, 4), (20, 10), (35, 25)]
+    assert defects.shape == (40, 30)
+    assert len(buildDefectMap(darks, stuck=False)) == 2
+    assert len(buildDefectMap(darks[0])) == 2  # one frame: no stuck pixel
+
+
+def test_correct():
+    data = np.arange(25, dtype=np.float32).reshape(5, 5)
+    data[2, 2] = 1000
+    data[0, 0] = -50
+    data[2, 3] = 999  # defective neighbour of (2, 2), not used
+    defects = DefectMap([(2, 2), (0, 0), (2, 3)], data.shape)
+    expected = data.copy()
+    expected[2, 2] = np.median([6, 7, 8, 11, 16, 17, 18])
+    expected[0, 0] = np.median([1, 5, 6])  # corner
+    expected[2, 3] = np.median([7, 8, 9, 14, 17, 18, 19])
+
+    assert defects.correct(data) is data  # in place
+    np.testing.assert_array_equal(data, expected)
+    with pytest.raises(ValueError):
+        defects.correct(np.zeros((4, 4)))
+
+
+def test_pipeline(darks):
+    pipeline = ImagePipeline(ProcessingParams(removeHotPixel=True))
+    pipeline.setDefectMap(buildDefectMap(darks))
+    frame = darks[0].astype(np.uint16)
+    data = pipeline.process(frame).data
+    assert data[3, 4] < 200 and data[20, 10] > 50
+    assert data.max() < frame.max()
+    pipeline.setDefectMap(DefectMap([], (2, 2)))  # other shape: maximum replaced by the mean
+    data = pipeline.process(frame).data
+    assert data[3, 4] == pytest.approx(frame.mean(), rel=1e-5)
+
+
+def test_cluster():
+    # a pixel surrounded by defects has no valid neighbour: not corrected
+    pixels = [(x, y) for x in range(1, 4) for y in range(1, 4)]
+    defects = DefectMap(pixels, (5, 5))
+    assert defects.uncorrected == 1
+    data = np.ones((5, 5))
+    data[1:4, 1:4] = 7
+    corrected = defects.correct(data)
+    assert corrected[2, 2] == 7
+    assert (corrected[1:4, 1:4].sum() - 7) == 8  # the others from the valid border
+
+
+def test_outside():
+    with pytest.raises(ValueError):
+        DefectMap([(5, 0)], (5, 5))
+
+
+def test_saveLoad(tmp_path):
+    defects = DefectMap([(1, 2), (3, 0)], (4, 6))
+    fileName = defects.save(str(tmp_path / "defects"))
+    assert fileName.endswith(".npy")
+    loaded = DefectMap.load(fileName)
+    assert loaded.shape == (4, 6)
+    np.testing.assert_array_equal(loaded.pixels, defects.pixels)
+    np.save(tmp_path / "other.npy", np.zeros(3))
+    with pytest.raises(ValueError):
+        DefectMap.load(str(tmp_path / "other.npy"))
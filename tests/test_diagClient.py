@@ -0,0 +1,175 @@
+'''
+Tests of diagClient and asyncDiagClient against diagServer, and of the choice
+of the local addresses (selectAddress).
+'''
+
+import asyncio
+import os
+import socket
+import threading
+import numpy as np
+import pytest
+import zmq
+import zmq.asyncio
+from visu.diagClient import diagClient, asyncDiagClient
+from visu.diagServer import selectAddress
+
+
+@pytest.fixture
+def makeClient(context):
+    '''
+    Return a function creating a diagClient (arguments of diagClient), by
+    default in the context of the servers. The clients are closed at the end.
+    '''
+    clients = []
+
+    def make(**kwds):
+        kwds.setdefault("context", context)
+        kwds.setdefault("timeout", 0.5)
+        client = diagClient(**kwds)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def test_requests(startServer, makeClient):
+    server = startServer(historyLength=10)
+    server.register("spectro", {"peak": 0})
+    for shot in range(3):
+        server.setData({"shot": shot, "image": np.full((2, 2), shot, dtype=np.uint8)},
+                       shotNumber=shot)
+    server.setFrame(np.eye(3))
+    client = makeClient()
+    address = server.address
+
+    assert client.ping(address)
+    assert client.get(address)["image"] == [[2, 2], [2, 2]]
+    data = client.get(address, codec="numpy")
+    assert data["image"].dtype == np.uint8
+    assert client.get(address, source="spectro") == {"peak": 0}
+    assert client.getIfNewer(address, 3) == (3, None)
+    version, data = client.getIfNewer(address, 2)
+    assert (version, data["shot"]) == (3, 2)
+    assert [item["shotNumber"] for item in client.history(address, 0, 1)] == [0, 1]
+    assert set(client.getSources(address)) == {"default", "spectro"}
+    np.testing.assert_array_equal(client.frame(address), np.eye(3))
+    assert client.stats(address)["setData"] == 3
+
+
+def test_getAllWithDeadServer(startServer, makeClient):
+    servers = [startServer(), startServer(mode="router")]
+    for i, server in enumerate(servers):
+        server.setData({"server": i})
+    dead = "inproc://test-nobody"
+    client = makeClient(timeout=0.1, retries=1, backoff=0.01)
+
+    answers = client.getAll([server.address for server in servers] + [dead])
+    assert [answers[server.address] for server in servers] == [{"server": 0}, {"server": 1}]
+    assert answers[dead] is None
+    assert not client.ping(dead)
+
+
+def test_rejectedRequest(startServer, makeClient, context):
+    server = startServer()
+    server.setData({"server": 0})
+    client = makeClient()
+    with pytest.raises(ValueError, match="rejected"):
+        client.get(server.address, source="nobody")
+
+    old = context.socket(zmq.REP)  # a server which does not know the codec
+    old.bind("inproc://test-old-server")
+
+    def answer():
+        old.recv()
+        old.send(b"unable to understand the demande")
+
+    thread = threading.Thread(target=answer)
+    thread.start()
+    try:
+        client = makeClient(preferLocal=False, retries=0)
+        answers = client.getAll([server.address, "inproc://test-old-server"], codec="numpy")
+        assert answers == {server.address: {"server": 0}, "inproc://test-old-server": None}
+    finally:
+        thread.join()
+        old.close(0)
+
+
+def test_selectAddress():
+    context = zmq.Context.instance()
+    endpoints = {"hostname": socket.gethostname(), "pid": os.getpid(),
+                 "context": context.underlying,
+                 "rep": ["tcp://host:1110", "ipc:///tmp/visu", "inproc://visu"], "pub": []}
+    assert selectAddress(endpoints, context=context) == "inproc://visu"
+    assert selectAddress(endpoints) == "ipc:///tmp/visu"  # no context: no inproc
+    assert selectAddress(dict(endpoints, pid=-1), context=context) == "ipc:///tmp/visu"
+    assert selectAddress(dict(endpoints, hostname="elsewhere"), context=context) == "tcp://host:1110"
+    assert selectAddress(endpoints, kind="pub") == ""
+
+
+def test_inprocOnlyInTheServerContext(startServer, makeClient, tcpAddress):
+    server = startServer(address=tcpAddress.replace("127.0.0.1", "*"),
+                         localAddress="inproc://test-local")
+    server.setData({"a": 1})
+    endpoint = server.addressForClient
+
+    client = makeClient()
+    assert client.get(endpoint) == {"a": 1}
+    assert client._routes[endpoint] == "inproc://test-local"
+
+    other = zmq.Context()
+    try:
+        client = diagClient(timeout=0.5, context=other)
+        assert client.get(endpoint) == {"a": 1}
+        assert client._routes[endpoint] == endpoint  # inproc unusable in another context
+        client.close()
+    finally:
+        other.term()
+
+
+def test_staleRouteDropped(startServer, makeClient):
+    server = startServer()
+    server.setData({"a": 1})
+    client = makeClient(timeout=0.1, retries=1, backoff=0.01)
+    client._routes[server.address] = "inproc://test-stale"  # local address gone
+
+    assert client.get(server.address) == {"a": 1}
+    assert client._routes[server.address] == server.address
+    assert client.gather([server.address], "__PING__")[server.address] == [b"__PONG__"]
+
+
+def test_failedProbeRemembered(makeClient, tcpAddress):
+    dead = tcpAddress
+    client = makeClient(timeout=0.05, retries=0, probeInterval=60.)
+
+    assert not client.ping(dead)
+    failed = client._probeFailed[dead]
+    assert dead not in client._routes
+    assert not client.ping(dead)
+    assert client._probeFailed[dead] == failed  # not probed again
+
+    client.probeInterval = 0.
+    assert not client.ping(dead)
+    assert client._probeFailed[dead] > failed
+
+
+def test_asyncClient(startServer, context):
+    servers = [startServer(), startServer()]
+    for i, server in enumerate(servers):
+        server.setData({"server": i, "image": np.arange(3)})
+    endpoints = [server.address for server in servers]
+
+    async def collect():
+        client = asyncDiagClient(timeout=0.5, context=zmq.asyncio.Context.shadow(context.underlying))
+        try:
+            data = await client.get(endpoints[0], codec="numpy")
+            answers = await client.getAll(endpoints)
+        finally:
+            client.close()
+        return data, answers
+
+    data, answers = asyncio.run(collect())
+    np.testing.assert_array_equal(data["image"], np.arange(3))
+    assert [answers[endpoint]["server"] for endpoint in endpoints] == [0, 1]
@@ -0,0 +1,68 @@
+'''
+Tests of the codecs of diagServer (visu.diagCodec).
+'''
+
+import numpy as np
+import pytest
+from visu.diagCodec import getCodec, registerCodec, CODECS
+
+
+def test_jsonConvertsNumpy():
+    codec = getCodec("json")
+    data = {"energy": np.float32(1.5), "count": np.int64(3),
+            "profile": np.arange(4, dtype=np.uint16), "name": "spectro"}
+    frames = codec.encode(data)
+    assert len(frames) == 1
+    assert codec.decode(frames) == {"energy": 1.5, "count": 3,
+                                    "profile": [0, 1, 2, 3], "name": "spectro"}
+
+
+def test_jsonRejectsUnknownObjects():
+    with pytest.raises(TypeError):
+        getCodec("json").encode({"value": object()})
+
+
+def test_numpyKeepsDtypeAndShape():
+    codec = getCodec("numpy")
+    image = np.arange(12, dtype=np.float32).reshape(3, 4)
+    data = {"image": image, "nested": {"line": image[:, 1]}, "list": [np.int8(2), "a"],
+            "shot": 7}
+    frames = codec.encode(data)
+    assert len(frames) == 3  # header and one raw frame per array
+    decoded = codec.decode(frames)
+    assert decoded["image"].dtype == np.float32
+    np.testing.assert_array_equal(decoded["image"], image)
+    np.testing.assert_array_equal(decoded["nested"]["line"], image[:, 1])  # made contiguous
+    assert decoded["list"] == [2, "a"]
+    assert decoded["shot"] == 7
+
+
+def test_numpyDecodeFromMemoryview():
+    codec = getCodec("numpy")
+    frames = codec.encode({"image": np.ones((2, 2), dtype=np.uint16)})
+    decoded = codec.decode([memoryview(frame) for frame in frames])
+    np.testing.assert_array_equal(decoded["image"], np.ones((2, 2)))
+
+
+def test_unknownCodec():
+    with pytest.raises(KeyError):
+        getCodec("msgpack")
+
+
+def test_registerCodec():
+
+    class ReprCodec:
+        name = "test-repr"
+
+        def encode(self, data):
+            return [repr(data).encode()]
+
+        def decode(self, frames):
+            return eval(frames[0])
+
+    registerCodec(ReprCodec())
+    try:
+        codec = getCodec("test-repr")
+        assert codec.decode(codec.encode({"a": 1})) == {"a": 1}
+    finally:
+        CODECS.pop("test-repr")
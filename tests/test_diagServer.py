@@ -0,0 +1,203 @@
+'''
+Tests of diagServer: requests answered from the snapshots, codecs, history,
+frames, named sources and topics of the publisher.
+'''
+
+import itertools
+import json
+import time
+import numpy as np
+import pytest
+import zmq
+from visu.diagCodec import getCodec
+from visu.diagServer import diagServer, frameFromMessage, topicOf, checkSourceName
+
+
+@pytest.mark.parametrize("mode", ["rep", "router"])
+def test_getJsonAndNumpy(startServer, ask, mode):
+    server = startServer(mode=mode)
+    image = np.arange(6, dtype=np.uint16).reshape(2, 3)
+    server.setData({"energy": np.float64(2.5), "image": image}, shotNumber=12)
+
+    assert json.loads(ask(server.address, "__GET__")[0]) == {"energy": 2.5,
+                                                             "image": [[0, 1, 2], [3, 4, 5]]}
+    data = getCodec("numpy").decode(ask(server.address, "__GET__ codec=numpy"))
+    assert data["image"].dtype == np.uint16
+    np.testing.assert_array_equal(data["image"], image)
+    assert server.shotNumber == 12
+
+
+def test_unknownRequest(startServer, ask):
+    server = startServer()
+    assert ask(server.address, "__GET__ codec=msgpack") == [b"unable to understand the demande"]
+    assert ask(server.address, "__UNKNOWN__") == [b"unable to understand the demande"]
+    assert ask(server.address, "__PING__") == [b"__PONG__"]
+
+
+def test_getIfNewer(startServer, ask):
+    server = startServer()
+    server.setData({"a": 1})
+    version, payload = ask(server.address, "__GET_IF_NEWER__ 0")
+    assert int(version) == 1 and json.loads(payload) == {"a": 1}
+    assert ask(server.address, "__GET_IF_NEWER__ 1") == [b"1", b"__NOT_MODIFIED__"]
+    server.setData({"a": 2})
+    version, payload = ask(server.address, "__GET_IF_NEWER__ 1")
+    assert int(version) == 2 and json.loads(payload) == {"a": 2}
+
+
+def test_snapshotCopiesData(startServer, ask):
+    server = startServer()
+    image = np.zeros(4)
+    data = {"values": [1, 2], "nested": {"b": 1}, "image": image}
+    server.setData(data)
+    data["values"].append(3)
+    data["nested"]["b"] = 2
+    data["new"] = True
+
+    assert server.snapshot.data["image"] is image  # arrays are shared
+    assert json.loads(ask(server.address, "__GET__")[0]) == {"values": [1, 2], "nested": {"b": 1},
+                                                             "image": [0., 0., 0., 0.]}
+
+
+def test_snapshotEncodedWhenAsked(startServer, ask):
+    server = startServer()
+    server.setData({"a": np.arange(3)})
+    snapshot = server.snapshot
+    assert snapshot.encodings == {}  # 'setData' does not encode
+
+    ask(server.address, "__GET__ codec=numpy")
+    assert list(snapshot.encodings) == ["numpy"]  # json never built
+    frames = ask(server.address, "__GET__")
+    assert set(snapshot.encodings) == {"numpy", "json"}
+    assert frames[0] == snapshot.payload
+    json1 = snapshot.encodings["json"]
+    ask(server.address, "__GET__")
+    assert snapshot.encodings["json"] is json1  # encoded once
+
+
+def test_history(startServer, ask):
+    server = startServer(historyLength=3)
+    for shot in range(5):
+        server.setData({"shot": shot}, shotNumber=shot)
+    assert [snap.shotNumber for snap in server.history()] == [2, 3, 4]
+
+    history = json.loads(ask(server.address, "__HISTORY__ 2")[0])
+    assert [item["data"] for item in history] == [{"shot": 3}, {"shot": 4}]
+    history = json.loads(ask(server.address, "__HISTORY__ 2 3")[0])
+    assert [item["shotNumber"] for item in history] == [2, 3]
+    assert ask(server.address, "__HISTORY__ a") == [b"unable to understand the demande"]
+
+
+def test_historyBoundedBytes(startServer):
+    server = startServer(historyMaxBytes=2500)
+    for shot in range(5):
+        server.setData({"image": np.zeros(100)}, shotNumber=shot)  # 800 bytes each
+    assert [snap.shotNumber for snap in server.history()] == [2, 3, 4]
+    server.setData({"image": np.zeros(1000)}, shotNumber=5)
+    assert [snap.shotNumber for snap in server.history()] == [5]  # the last shot is kept
+
+
+def test_frame(startServer, ask):
+    server = startServer()
+    assert frameFromMessage(*ask(server.address, "__FRAME__")) is None
+    image = np.arange(20, dtype=np.int32).reshape(4, 5)
+    server.setFrame(image[:, ::2], shotNumber=3)  # not contiguous
+    header, buffer = ask(server.address, "__FRAME__")
+    np.testing.assert_array_equal(frameFromMessage(header, buffer), image[:, ::2])
+    assert json.loads(header)["shotNumber"] == 3
+
+
+def test_stats(startServer, ask):
+    server = startServer()
+    server.setData({"a": 1})
+    ask(server.address, "__GET__")
+    stats = json.loads(ask(server.address, "__STATS__")[0])
+    assert stats["commands"]["__GET__"]["count"] == 1
+    assert stats["setData"] == 1
+    assert stats["encode_ms"]["max"] >= 0  # the json of the snapshot
+
+
+def test_sources(startServer, ask):
+    server = startServer()
+    source = server.register("spectro", {"peak": 0})
+    source.setData({"peak": 3})
+    assert json.loads(ask(server.address, "__GET__ spectro")[0]) == {"peak": 3}
+    assert json.loads(ask(server.address, "__GET__ source=spectro")[0]) == {"peak": 3}
+    assert ask(server.address, "__VERSION__ spectro") == [b"1"]
+    assert ask(server.address, "__GET__ camera") == [b"unable to understand the demande"]
+    assert json.loads(ask(server.address, "__SOURCES__")[0]) == ["spectro"]
+
+    sources = json.loads(ask(server.address, "__GET_ALL__")[0])
+    assert list(sources) == ["spectro"]  # main data not set yet
+    server.setData({"a": 1})
+    sources = json.loads(ask(server.address, "__GET_ALL__")[0])
+    assert {name: item["data"] for name, item in sources.items()} == {"default": {"a": 1},
+                                                                      "spectro": {"peak": 3}}
+    assert server.history()[-1].data == {"a": 1}  # only the main data in the history
+    with pytest.raises(ValueError):
+        server.register("spectro")
+
+
+@pytest.mark.parametrize("name", ["", "two words", "a=b", "cam/1"])
+def test_invalidSourceName(name):
+    with pytest.raises(ValueError):
+        checkSourceName(name)
+
+
+def test_topicsArePrefixFree():
+    topics = [topicOf(), topicOf("cam"), topicOf("cam2"), topicOf("__DATA__"), b"__FRAME__"]
+    for topic, other in itertools.permutations(topics, 2):
+        assert not other.startswith(topic)
+
+
+def test_publishedTopics(startServer, context):
+    server = startServer(pubAddress="inproc://test-pub")
+    server.register("cam")
+    server.register("cam2")
+    sub = context.socket(zmq.SUB)
+    sub.setsockopt(zmq.LINGER, 0)
+    sub.connect("inproc://test-pub")
+    sub.setsockopt(zmq.SUBSCRIBE, topicOf("cam"))
+    time.sleep(0.1)  # the subscription reaches the publisher
+
+    server.setData({"main": 1})
+    server.setData({"shot": 1}, source="cam2")
+    server.setData({"shot": 2}, source="cam")
+    try:
+        assert sub.poll(1000)
+        topic, header, payload = sub.recv_multipart()
+        assert (topic, json.loads(header)["name"], json.loads(payload)) == (b"__SRC__/cam/", "cam",
+                                                                            {"shot": 2})
+        assert not sub.poll(100)  # neither the main data nor 'cam2'
+    finally:
+        sub.close(0)
+
+
+def test_routerDropsAnswersOfFullClients(startServer, context):
+    server = startServer(mode="router")
+    client = context.socket(zmq.DEALER)
+    client.setsockopt(zmq.LINGER, 0)
+    client.setsockopt(zmq.RCVHWM, 1)  # with the SNDHWM of the server: about 1000 answers queued
+    client.connect(server.address)
+    try:
+        for _ in range(1200):  # the answers are never read
+            client.send_multipart([b"", b"__PING__"])
+        deadline = time.monotonic() + 5
+        while server.stats()["requests"] < 1200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stats = server.stats()
+        assert stats["requests"] == 1200
+        assert 100 <= stats["droppedReplies"] < 1200
+    finally:
+        client.close(0)
+
+
+@pytest.mark.parametrize("mode", ["rep", "router"])
+def test_stopBeforeStart(mode, tcpAddress):
+    server = diagServer(address=tcpAddress, pubAddress="inproc://test-never-started", mode=mode)
+    server.stop()
+    assert server.socket.closed and server.pubSocket.closed and server._control.closed
+    assert server.context.closed  # created by the server
+    server.stop()  # nothing left to close
+    server = diagServer(address=tcpAddress, mode=mode)  # the port is free again
+    server.stop()
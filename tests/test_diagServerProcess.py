@@ -0,0 +1,59 @@
+'''
+Tests of diagServerProcess: the same requests as diagServer, answered by a
+spawned process.
+'''
+
+import numpy as np
+import pytest
+import zmq
+from visu.diagClient import diagClient
+from visu.diagServerProcess import diagServerProcess
+
+
+@pytest.fixture
+def serverProcess(tcpAddress):
+    server = diagServerProcess(address=tcpAddress, name="process", historyLength=5)
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_requests(serverProcess):
+    source = serverProcess.register("spectro")
+    serverProcess.setData({"image": np.arange(4, dtype=np.uint16)}, shotNumber=3)
+    source.setData({"peak": 1.5})
+    serverProcess.setFrame(np.eye(2, dtype=np.float32))
+    stats = serverProcess.stats()  # answered after the commands sent before
+    assert stats["setData"] == 2
+
+    client = diagClient(timeout=1., context=zmq.Context())
+    try:
+        endpoint = serverProcess.addressForClient
+        data = client.get(endpoint, codec="numpy")
+        np.testing.assert_array_equal(data["image"], np.arange(4))
+        assert client.get(endpoint, source="spectro") == {"peak": 1.5}
+        assert [item["shotNumber"] for item in client.history(endpoint, 1)] == [3]
+        np.testing.assert_array_equal(client.frame(endpoint), np.eye(2))
+        assert client._routes[endpoint] == endpoint  # other process: no inproc
+    finally:
+        client.close()
+        client.context.term()
+
+    assert (serverProcess.version, serverProcess.shotNumber) == (1, 3)
+    assert serverProcess.sources == ["spectro"]
+    with pytest.raises(ValueError):
+        serverProcess.register("spectro")
+    with pytest.raises(ValueError):
+        serverProcess.register("bad/name")
+
+
+def test_bindError(serverProcess):
+    with pytest.raises(zmq.ZMQError):
+        diagServerProcess(address=serverProcess.address)
+
+
+def test_stopped(serverProcess):
+    serverProcess.stop()
+    assert not serverProcess.is_alive()
+    serverProcess.setData({"a": 1})  # ignored
+    assert serverProcess.stats(timeout=0.1) is None
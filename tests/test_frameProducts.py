@@ -0,0 +1,52 @@
+'''
+Tests of the products computed once per frame (visu.frameProducts).
+'''
+
+import numpy as np
+from scipy.ndimage import gaussian_filter
+from visu.frameProducts import FrameProducts, getProduct
+
+
+def test_computedOncePerFrame():
+    products = FrameProducts()
+    frame = np.zeros((20, 20))
+    frame[5, 7] = 10
+    products.newFrame(frame)
+
+    smoothed = products.get("smoothed", sigma=2)
+    assert products.get("smoothed", sigma=2) is smoothed
+    np.testing.assert_allclose(smoothed, gaussian_filter(frame, 2))
+    assert products.get("argmax", smoothed) == (5, 7)  # product of a product
+    assert products.get("smoothed", sigma=3) is not smoothed  # other parameters
+    assert (products.computed, products.reused) == (3, 1)
+
+    products.newFrame(frame)
+    assert products.get("smoothed", sigma=2) is not smoothed
+    assert products.frameId == 2
+
+
+def test_memo():
+    products = FrameProducts()
+    products.newFrame(np.ones((4, 4)))
+    calls = []
+
+    def region():
+        calls.append(1)
+        return products.frame[:2, :2]
+
+    assert products.memo(("region", 1), region) is products.memo(("region", 1), region)
+    assert len(calls) == 1
+
+
+def test_getProductWithoutOwnerCache():
+
+    class Window:
+        pass
+
+    data = np.arange(12.).reshape(3, 4)
+    assert getProduct(Window(), "sum", data) == 66
+    window = Window()
+    window.products = FrameProducts()
+    window.products.newFrame(data)
+    assert getProduct(window, "max", data) == 11
+    assert window.products.computed == 1
@@ -0,0 +1,161 @@
+'''
+Tests of the processing of the frames without Qt (visu.imageProcessing).
+'''
+
+import numpy as np
+import pytest
+from visu.imageProcessing import (ImagePipeline, ProcessingParams, ellipseMask, fluence,
+                                  subtractBackground, applyFilter, roiRegion, measure,
+                                  workingDtype, saveFrame, tiffArray)
+from visu.imageReaders import readImage
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 4000, size=(64, 48), dtype=np.uint16)
+
+
+def test_ellipseMask():
+    mask = ellipseMask((50, 50), (20, 20, 10, 4))
+    i, j = np.nonzero(mask)
+    assert (i.min(), i.max(), j.min(), j.max()) == (20, 29, 20, 23)
+    assert mask.sum() == pytest.approx(np.pi * 5 * 2, rel=0.2)
+
+
+def test_ellipseMaskRotated():
+    # turned around the corner (x, y) as a pyqtgraph roi
+    mask = ellipseMask((50, 50), (20, 20, 10, 4, 90))
+    i, j = np.nonzero(mask)
+    assert (i.min(), i.max(), j.min(), j.max()) == (16, 19, 20, 29)
+    # 180 degrees: pixel i -> 2 * 20 - 1 - i
+    mask180 = ellipseMask((50, 50), (20, 20, 10, 4, 180))
+    mask0 = ellipseMask((50, 50), (20, 20, 10, 4))
+    np.testing.assert_array_equal(mask180[10:20, 16:20], mask0[20:30, 20:24][::-1, ::-1])
+    assert mask180.sum() == mask0.sum()
+
+
+@pytest.mark.parametrize("region", [(5, 5, 0, 4), (5, 5, 4, 0), (5, 5, -2, 3, 30)])
+def test_ellipseMaskEmpty(region):
+    assert not ellipseMask((20, 20), region).any()
+
+
+def test_fluence(frame):
+    region = (10, 10, 20, 16, 30)
+    data = fluence(frame.astype(np.float32), energy=2., pixelArea=0.5, region=region)
+    assert data.dtype == np.float32
+    assert data[ellipseMask(frame.shape, region)].sum() == pytest.approx(4000, rel=1e-5)
+    empty = np.zeros((8, 8), dtype=np.float32)
+    assert fluence(empty, energy=2.) is empty  # not normalised
+
+
+def test_subtractBackground():
+    data = np.array([[1, 5]], dtype=np.uint16)
+    np.testing.assert_array_equal(subtractBackground(data, np.array([[3, 3]], dtype=np.uint16)),
+                                  [[0, 2]])  # no wrap around
+    with pytest.raises(ValueError):
+        subtractBackground(data, np.zeros((2, 2)))
+
+
+def test_pipelineMatchesFunctions(frame):
+    bg = np.full(frame.shape, 100, dtype=np.uint16)
+    region = (10, 10, 20, 16, 30)
+    params = ProcessingParams(background=True, filter="gauss", sigma=2, fluence=True,
+                              energy=2., fluenceRegion=region, roi=("cercle", 5, 6, 20, 10),
+                              measure=True)
+    pipeline = ImagePipeline(params)
+    pipeline.setBackground(bg)
+    results = []
+    pipeline.subscribe(results.append)
+    result = pipeline.process(frame)
+
+    expected = subtractBackground(frame.astype(np.float32), bg.astype(np.float32))
+    expected = fluence(applyFilter(expected, "gauss", 2), 2., region=region)
+    assert results == [result]
+    assert result.background == "on"
+    np.testing.assert_allclose(result.data, expected, rtol=1e-4)
+    np.testing.assert_allclose(result.roi, roiRegion(expected, "cercle", 5, 6, 20, 10), rtol=1e-4)
+    assert result.measurements["xmax"] == measure(result.roi)["xmax"]
+
+
+def test_pipelineFluenceEmptyRegion(frame):
+    params = ProcessingParams(fluence=True, energy=1., fluenceRegion=(5, 5, 0, 0))
+    data = ImagePipeline(params).process(frame).data
+    np.testing.assert_array_equal(data, frame)  # not normalised by 0
+
+
+def test_pipelineBackgroundState(frame):
+    pipeline = ImagePipeline(ProcessingParams(background=True))
+    assert pipeline.process(frame).background == "missing"
+    pipeline.setBackground(np.zeros((2, 2)))
+    assert pipeline.process(frame).background == "error"
+
+
+def test_pipelineWithoutStepDoesNotCopy(frame):
+    pipeline = ImagePipeline()
+    result = pipeline.process(frame)
+    assert result.data is frame
+    assert not pipeline.isBuffer(result.data)
+
+
+def test_pipelineRingOfBuffers(frame):
+    pipeline = ImagePipeline(ProcessingParams(filter="median", sigma=3), ringSize=3)
+    raw = frame.copy()
+    datas = [pipeline.process(frame).data for _ in range(4)]
+    np.testing.assert_array_equal(frame, raw)  # the frame is not modified
+    assert all(pipeline.isBuffer(data) for data in datas)
+    # a result stays valid during the ringSize - 1 next frames
+    for i in range(1, 4):
+        assert not any(np.shares_memory(datas[i], previous) for previous in datas[max(i - 2, 0):i])
+    assert len({data.ctypes.data for data in datas}) <= 4  # ring and scratch reused
+
+    small = frame[:10, :10].copy()
+    data = pipeline.process(small).data  # new buffers for the new shape
+    np.testing.assert_allclose(data, applyFilter(small.astype(np.float32), "median", 3))
+    assert not any(np.shares_memory(data, previous) for previous in datas)
+
+
+@pytest.mark.parametrize("params, background, dtype", [
+    (ProcessingParams(), None, np.float32),
+    (ProcessingParams(dtype="float64"), None, np.float64),
+    (ProcessingParams(dtype="auto", filter="median", sigma=3), None, np.uint16),
+    (ProcessingParams(dtype="auto", background=True), np.zeros(1, np.uint8), np.uint16),
+    (ProcessingParams(dtype="auto", background=True), np.zeros(1, np.float32), np.float32),
+    (ProcessingParams(dtype="auto", background=True), np.zeros(1, np.int32), np.float32),
+    (ProcessingParams(dtype="auto", filter="gauss", sigma=1), None, np.float32),
+    (ProcessingParams(dtype="auto", fluence=True), None, np.float32),
+])
+def test_workingDtype(params, background, dtype):
+    assert workingDtype(np.uint16, params, background) == dtype
+
+
+def test_workingDtypeUnknown():
+    with pytest.raises(ValueError):
+        workingDtype(np.uint16, ProcessingParams(dtype="int8"))
+    assert workingDtype(np.float64, ProcessingParams(dtype="auto")) == np.float32
+
+
+def test_pipelineIntegerDtype(frame):
+    bg = np.full(frame.shape, 1000, dtype=np.uint16)
+    params = ProcessingParams(dtype="auto", background=True, filter="threshold", threshold=500)
+    pipeline = ImagePipeline(params)
+    pipeline.setBackground(bg)
+    data = pipeline.process(frame).data
+    assert data.dtype == np.uint16
+    expected = subtractBackground(frame, bg)
+    np.testing.assert_array_equal(data, np.where(expected < 500, 0, expected))
+    data = pipeline.process(frame, ProcessingParams(background=True)).data
+    assert data.dtype == np.float32  # new buffers for the new dtype
+
+
+@pytest.mark.parametrize("dtype", [np.uint16, np.float32, np.float64, np.int64])
+def test_saveFrame(tmp_path, frame, dtype):
+    data = (frame / 7).astype(dtype)
+    for tiff in (True, False):
+        fileName = saveFrame(data, str(tmp_path / f"frame_{tiff}"), tiff=tiff)
+        read = readImage(fileName)  # as displayed
+        if tiff:
+            assert read.dtype == tiffArray(data).dtype
+            np.testing.assert_array_equal(read, tiffArray(data))
+        else:  # the digits needed to read the dtype back exactly
+            np.testing.assert_array_equal(read.astype(dtype), data)
@@ -0,0 +1,98 @@
+'''
+Tests of the readers of the image files (visu.imageReaders): the frames are
+returned as displayed by SEE.
+'''
+
+import numpy as np
+import pytest
+from PIL import Image
+from visu import imageReaders
+from visu.imageReaders import (ImageHeader, ImageReader, openImage, readImage, readerFor,
+                               registerReader, extensions, fileFilter)
+from visu.imageProcessing import saveFrame
+from visu.orientation import DISPLAY_TO_FILE
+
+DISPLAYED = np.arange(12, dtype=np.uint16).reshape(3, 4)
+
+
+def test_txt(tmp_path):
+    fileName = saveFrame(DISPLAYED, str(tmp_path / "frame"), tiff=False)
+    source = openImage(fileName)
+    assert source.shape == (3, 4)  # saved and read as displayed
+    np.testing.assert_array_equal(source.data, DISPLAYED)
+
+    fileName = tmp_path / "comments.txt"
+    fileName.write_text("# camera VISU\n\n1 2 3\n  4 5 6\n# end\n")
+    source = openImage(fileName)
+    assert (source.shape, len(source)) == ((2, 3), 1)
+    np.testing.assert_array_equal(source.data, [[1, 2, 3], [4, 5, 6]])
+
+
+def test_tiff(tmp_path):
+    fileName = saveFrame(DISPLAYED, str(tmp_path / "frame"), tiff=True)
+    with Image.open(fileName) as img:  # stored rotated
+        np.testing.assert_array_equal(np.array(img), DISPLAY_TO_FILE.apply(DISPLAYED))
+    source = openImage(fileName)
+    assert (source.shape, source.dtype) == ((3, 4), np.uint16)
+    np.testing.assert_array_equal(source.data, DISPLAYED)
+
+
+def test_png(tmp_path):
+    fileName = tmp_path / "color.PNG"
+    Image.fromarray(np.zeros((5, 7, 3), dtype=np.uint8)).save(fileName)
+    source = openImage(fileName)
+    assert (source.shape, source.dtype, source.metadata["mode"]) == ((7, 5, 3), np.uint8, "RGB")
+    assert source.data.shape == (7, 5, 3)
+
+
+def test_npy(tmp_path):
+    np.save(tmp_path / "one.npy", DISPLAYED)
+    np.save(tmp_path / "stack.npy", np.stack([DISPLAYED, 2 * DISPLAYED]))
+    np.testing.assert_array_equal(readImage(tmp_path / "one.npy"), DISPLAYED)
+    source = openImage(tmp_path / "stack.npy")
+    assert (source.shape, len(source)) == ((3, 4), 2)
+    np.testing.assert_array_equal(source.frame(1), 2 * DISPLAYED)
+
+
+def test_sif(tmp_path):
+    fileName = tmp_path / "andor.sif"
+    stored = np.arange(12, dtype=np.float32).reshape(4, 3)
+    with open(fileName, "wb") as f:
+        f.write(b"Andor Technology Multi-Channel File\n65538 1\nline\nDV420\n3 4\n")
+        f.write(stored.tobytes())
+    source = openImage(fileName)
+    assert (source.shape, source.metadata["camera"]) == ((3, 4), "DV420")
+    np.testing.assert_array_equal(source.data, np.rot90(stored, 3))
+
+    (tmp_path / "bad.sif").write_bytes(b"not a sif\n")
+    with pytest.raises(ValueError):
+        openImage(tmp_path / "bad.sif").shape
+
+
+def test_unknownFormat():
+    with pytest.raises(ValueError):
+        openImage("frame.fits")
+
+
+def test_registerReader(tmp_path, monkeypatch):
+    monkeypatch.setattr(imageReaders, "_READERS", dict(imageReaders._READERS))
+
+    class ConstantReader(ImageReader):
+        extensions = ('.cst',)
+        name = 'Constant'
+        calls = 0
+
+        def probe(self, fileName):
+            return ImageHeader((4, 3), np.dtype(np.uint8))
+
+        def readFrame(self, fileName, index=0):
+            ConstantReader.calls += 1
+            return np.full((4, 3), index, dtype=np.uint8)
+
+    registerReader(ConstantReader())
+    assert ".cst" in extensions() and "*.cst" in fileFilter()
+    assert readerFor("FRAME.CST").name == "Constant"
+    source = openImage(tmp_path / "frame.cst")
+    assert source.shape == (3, 4)  # FILE_TO_DISPLAY by default
+    assert source.frame(2) is source.frame(2)  # last frame kept
+    assert ConstantReader.calls == 1
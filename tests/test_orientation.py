@@ -0,0 +1,48 @@
+'''
+Tests of the orientations of the images (visu.orientation) against the numpy
+flips and rotations used by SEE.
+'''
+
+import itertools
+import numpy as np
+import pytest
+from visu.orientation import (Orientation, ALL, IDENTITY, FILE_TO_DISPLAY, DISPLAY_TO_FILE)
+
+IMAGE = np.arange(12).reshape(3, 4)
+
+
+@pytest.mark.parametrize("flipUpDown, flipLeftRight, rotate",
+                         list(itertools.product([False, True], [False, True], range(4))))
+def test_fromSettings(flipUpDown, flipLeftRight, rotate):
+    expected = IMAGE
+    if flipUpDown:
+        expected = np.flipud(expected)
+    if flipLeftRight:
+        expected = np.fliplr(expected)
+    expected = np.rot90(expected, rotate)
+
+    orientation = Orientation.fromSettings(flipUpDown, flipLeftRight, rotate)
+    view = orientation.apply(IMAGE)
+    np.testing.assert_array_equal(view, expected)
+    assert np.shares_memory(view, IMAGE)  # a view, no copy
+    np.testing.assert_array_equal(orientation.inverse().apply(view), IMAGE)
+
+
+def test_compose():
+    for first, second in itertools.product(ALL, ALL):
+        np.testing.assert_array_equal(first.then(second).apply(IMAGE),
+                                      second.apply(first.apply(IMAGE)))
+    assert len(set(ALL)) == 8
+
+
+def test_fileOrientation():
+    np.testing.assert_array_equal(FILE_TO_DISPLAY.apply(IMAGE), np.rot90(IMAGE, 3))
+    np.testing.assert_array_equal(DISPLAY_TO_FILE.apply(IMAGE), np.rot90(IMAGE, 1))
+    assert FILE_TO_DISPLAY.then(DISPLAY_TO_FILE).isIdentity
+    assert IDENTITY.apply(IMAGE) is IMAGE
+
+
+def test_moreDimensions():
+    rgb = np.arange(24).reshape(2, 3, 4)  # only the first two axes are turned
+    np.testing.assert_array_equal(Orientation(1, True).apply(rgb), np.rot90(np.flipud(rgb), 1))
+    assert Orientation(5) == Orientation(1)
@@ -0,0 +1,71 @@
+'''
+Tests of the timing of the stages (visu.stageTimer).
+'''
+
+import json
+import threading
+import time
+from visu.stageTimer import StageTimer
+
+
+def test_summaryAndStatusText():
+    timer = StageTimer(window=3)
+    for seconds in (0.001, 0.002, 0.003, 0.004):
+        timer.record("filter", seconds)
+    timer.record("setImage", 0.010)
+    fitSpan = timer.register("spectro/fit")
+
+    summary = timer.summary()
+    assert summary["filter"] == {"count": 3, "p50_ms": 3.0, "p90_ms": 3.8, "p99_ms": 3.98,
+                                 "max_ms": 4.0, "last_ms": 4.0}  # last 3 durations
+    assert summary["spectro/fit"] == {"count": 0}
+    assert timer.statusText() == "setImage 10.0  filter 3.0 ms (p50)"
+    assert timer.statusText(stages=["filter"]) == "filter 3.0 ms (p50)"
+
+    with fitSpan():
+        pass
+    assert timer.summary()["spectro/fit"]["count"] == 1
+    timer.reset()
+    assert timer.stages == ["filter", "setImage", "spectro/fit"]
+    assert timer.statusText() == ""
+
+
+def test_nestedSpans():
+    timer = StageTimer()
+    with timer.span("render"):
+        with timer.span("setImage"):
+            time.sleep(0.002)
+        with timer.span("coupe"):
+            pass
+    with timer.span("server"):  # never contains a span: a leaf
+        pass
+    assert timer.stages == ["setImage", "coupe", "render", "server"]
+    assert timer.leafStages == ["setImage", "coupe", "server"]
+    assert timer.summary()["render"]["count"] == 1  # still timed
+    assert timer.statusText(nbStages=1).startswith("setImage")
+    assert "render" not in timer.statusText()
+    assert timer.statusText(stages=["render"]).startswith("render")
+
+    thread = threading.Thread(target=lambda: timer.span("fit").__enter__())
+    thread.start()  # a span left open in another thread
+    thread.join()
+    with timer.span("levels"):
+        pass
+    assert "levels" in timer.leafStages
+
+
+def test_disabled():
+    timer = StageTimer(enabled=False)
+    with timer.span("filter"):
+        pass
+    assert timer.stages == []
+
+
+def test_dump(tmp_path):
+    timer = StageTimer()
+    timer.record("filter", 0.0015)
+    fileName = timer.dump(str(tmp_path / "timing.json"), samples=True)
+    with open(fileName) as f:
+        content = json.load(f)
+    assert content["stages"]["filter"]["count"] == 1
+    assert content["samples_ms"] == {"filter": [1.5]}
@@ -0,0 +1,61 @@
+'''
+Tests of the filters computed by bands (visu.tiledFilter): the result must be
+identical to the scipy filter of the whole frame.
+'''
+
+import numpy as np
+import pytest
+from scipy.ndimage import gaussian_filter, median_filter
+from visu.tiledFilter import bands, tiledFilter, gaussianFilter, medianFilter, MIN_PIXELS
+
+
+@pytest.fixture(params=[np.uint16, np.float32])
+def frame(request):
+    rng = np.random.default_rng(2)
+    return rng.integers(0, 4000, size=(530, 600)).astype(request.param)
+
+
+def test_bands():
+    assert bands(10, 3) == [(0, 3), (3, 7), (7, 10)]
+    assert bands(2, 4) == [(0, 1), (1, 2)]  # no empty band
+
+
+@pytest.mark.parametrize("sigma", [3, (3, 1), (0.5, 4)])
+def test_gaussianFilter(frame, sigma):
+    np.testing.assert_array_equal(gaussianFilter(frame, sigma, workers=4),
+                                  gaussian_filter(frame, sigma))
+
+
+@pytest.mark.parametrize("size", [3, 4, 7])
+def test_medianFilter(frame, size):
+    output = np.empty_like(frame)
+    assert medianFilter(frame, size, output=output, workers=4) is output
+    np.testing.assert_array_equal(output, median_filter(frame, size=size))
+
+
+def test_noFilter(frame):
+    for result in (gaussianFilter(frame, 0), medianFilter(frame, 1)):
+        np.testing.assert_array_equal(result, frame)
+        assert not np.shares_memory(result, frame)
+
+
+def test_bandsUsed():
+    shapes = []
+
+    def filterFunc(block):
+        shapes.append(block.shape)
+        return block
+
+    data = np.zeros((600, MIN_PIXELS // 600 + 1))
+    tiledFilter(filterFunc, data, halo=10, workers=3)
+    assert sorted(shape[0] for shape in shapes) == [210, 210, 220]  # bands with their halo
+    shapes.clear()
+    tiledFilter(filterFunc, np.zeros((100, 100)), halo=10, workers=3)
+    assert shapes == [(100, 100)]  # small frame in one block
+
+
+def test_outputOverlap(frame):
+    with pytest.raises(ValueError):
+        gaussianFilter(frame, 2, output=frame)
+    with pytest.raises(ValueError):
+        medianFilter(frame, 3, output=frame[::-1])
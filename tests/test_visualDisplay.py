@@ -0,0 +1,108 @@
+'''
+Tests of the display of the camera frames by SEE (visu.visual): counters of
+the drawing of the last frame only and processing in a worker. Skipped
+without PyQt6 and the dependencies of the GUI.
+'''
+
+import time
+import numpy as np
+import pytest
+
+QtWidgets = pytest.importorskip("PyQt6.QtWidgets")
+QtCore = pytest.importorskip("PyQt6.QtCore")
+visual = pytest.importorskip("visu.visual")
+
+
+@pytest.fixture
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def makeSee(app, tmp_path, tcpAddress):
+    '''
+    Return a function creating a SEE window (arguments of SEE) with its own
+    ini file and a diagServer in a thread, closed at the end.
+    '''
+    windows = []
+
+    def make(**kwds):
+        conf = QtCore.QSettings(str(tmp_path / "confVisu.ini"), QtCore.QSettings.Format.IniFormat)
+        kwds.setdefault("workers", 0)
+        window = visual.SEE(conf=conf, server="thread", serverAddress=tcpAddress,
+                            fft=False, math=False, encercled=False, **kwds)
+        windows.append(window)
+        return window
+
+    yield make
+    for window in windows:
+        if window.serv is not None:
+            window.serv.stop()
+        window.deleteLater()
+
+
+def countCalls(window, name):
+    '''
+    Count the calls of the method 'name' of the window.
+    '''
+    calls = []
+    method = getattr(window, name)
+
+    def counted(*args):
+        calls.append(args)
+        return method(*args)
+
+    setattr(window, name, counted)
+    return calls
+
+
+@pytest.fixture
+def frames():
+    rng = np.random.default_rng(1)
+    return [rng.integers(0, 4000, size=(64, 48), dtype=np.uint16) for _ in range(5)]
+
+
+def test_coalesceDrawsTheLastFrame(app, makeSee, frames):
+    window = makeSee(coalesce=True)
+    displayed = []
+    window.signalDisplayed.connect(displayed.append)  # end of each analysis
+    analysed = countCalls(window, "Analyse")
+    rendered = countCalls(window, "Render")
+
+    for frame in frames:  # before the event loop runs
+        window.newDataReceived(frame)
+    assert window.displayStats() == {"received": 5, "rendered": 0, "dropped": 4}
+    assert (len(analysed), len(displayed), len(rendered)) == (5, 5, 0)
+
+    app.processEvents()
+    assert window.displayStats() == {"received": 5, "rendered": 1, "dropped": 4}
+    assert len(rendered) == 1
+    assert np.shares_memory(window.data, frames[-1])  # no processing step: view of the last frame
+
+
+def test_everyFrameDrawnByDefault(app, makeSee, frames):
+    window = makeSee()
+    assert not window.coalesceAct.isChecked()
+    rendered = countCalls(window, "Render")
+    for frame in frames:
+        window.newDataReceived(frame)
+    assert window.displayStats() == {"received": 5, "rendered": 5, "dropped": 0}
+    assert len(rendered) == 5
+
+
+def test_processInWorker(app, makeSee, frames):
+    window = makeSee(workers=1, processInWorker=True)
+    analysed = countCalls(window, "Analyse")
+    processed = countCalls(window, "analyseResult")
+    for frame in frames[:3]:
+        window.newDataReceived(frame)
+    deadline = time.monotonic() + 5
+    while window.dispatcher.delivered < 3 and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+    assert len(analysed) == 0  # not processed in the GUI thread
+    assert len(processed) == 3
+    stats = window.displayStats()
+    assert (stats["received"], stats["rendered"], stats["analysis"]["delivered"]) == (3, 3, 3)
+    assert not window.workerPipeline.isBuffer(window.data)  # copied for the GUI thread
+    window.dispatcher.shutdown(wait=True)
@@ -20,6 +20,9 @@ import pathlib
 import time
 import zmq
 import uuid
+from visu.defectMap import DefectMap, buildDefectMap
+from visu.imageReaders import readImage
+from visu.backgroundLibrary import BackgroundLibrary
 
 class OPTION(QWidget):
     
@@ -57,6 +60,9 @@ class OPTION(QWidget):
         self.pathBg = self.conf.value(self.name+"/pathBg")
         self.actionButton()
         self.dataBgExist = False
+        self._bgLibrary = None  # BackgroundLibrary of the auto save path
+        self.defectMap = None  # DefectMap used by 'Hot Pixel Removed'
+        self.loadDefectMap(self.conf.value(self.name+"/defectMap"), warning=False)
         self.rotateValue = 0
         self.modeTrig = False
 
@@ -124,6 +130,29 @@ class OPTION(QWidget):
         hbox5.addWidget(self.buttonFileBg)
         hbox5.addWidget(self.fileBgBox)
         vbox1.addLayout(hbox5)
+
+        hbox7 = QHBoxLayout()
+        self.bgShotsBox = QSpinBox()  # number of dark shots averaged by 'Snap Background'
+        self.bgShotsBox.setPrefix('Snap Background average: ')
+        self.bgShotsBox.setSuffix(' shots')
+        self.bgShotsBox.setMinimum(1)
+        self.bgShotsBox.setMaximum(10000)
+        self.bgShotsBox.setValue(int(self.conf.value(self.name+"/bgShots", 1)))
+        self.checkBoxBgAuto = QCheckBox('Auto background from library', self)
+        self.checkBoxBgAuto.setChecked(False)
+        hbox7.addWidget(self.bgShotsBox)
+        hbox7.addWidget(self.checkBoxBgAuto)
+        vbox1.addLayout(hbox7)
+
+        hbox6 = QHBoxLayout()
+        self.buttonDefectBuild = QPushButton('Defect Map From Darks')
+        self.buttonDefectLoad = QPushButton('Load Defect Map')
+        self.defectBox = QLineEdit('defect map not selected')
+        self.defectBox.setMaximumHeight(60)
+        hbox6.addWidget(self.buttonDefectBuild)
+        hbox6.addWidget(self.buttonDefectLoad)
+        hbox6.addWidget(self.defectBox)
+        vbox1.addLayout(hbox6)
         
         hMainLayout = QHBoxLayout()
         hMainLayout.addLayout(vbox1)
@@ -136,6 +165,9 @@ class OPTION(QWidget):
         self.nameBox.textChanged.connect(self.nameFileChanged)
         self.tirNumberBox.valueChanged.connect(self.TirNumberChange)
         self.buttonFileBg.clicked.connect(self.selectBg)
+        self.bgShotsBox.valueChanged.connect(self.bgShotsChanged)
+        self.buttonDefectBuild.clicked.connect(self.buildDefectMapF)
+        self.buttonDefectLoad.clicked.connect(self.selectDefectMap)
         # self.fileBgBox.textChanged.connect(self.bgTextChanged)
         self.checkBoxServer.stateChanged.connect(self.checkBoxServerChange)
 
@@ -168,7 +200,7 @@ class OPTION(QWidget):
         
         fname = QFileDialog.getOpenFileName(
             self, "Select a background file", self.pathBg, 
-        "Images (*.txt *.spe *.TIFF *.sif);;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
+        "Images (*.txt *.spe *.TIFF *.sif *.npy);;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF);;Background library (*.npy)")
         
         fichier = fname[0]
         self.loadBg(fichier)
@@ -176,34 +208,11 @@ class OPTION(QWidget):
     def loadBg(self, fichier):
         ext = os.path.splitext(fichier)[1]
         print(f"ext = {ext}")
-        self.fileBgBox.setText(fichier)
-        
         self.conf.setValue(self.name+"/pathBg", os.path.dirname(fichier))
-        
-        self.dataBgExist = True
-        if self.parent is not None:
-            self.parent.checkBoxBg.setChecked(True)
-            self.parent.BackgroundF()
 
-        if ext == '.txt':  # text file
-            self.dataBg = np.loadtxt(str(fichier))
-            self.dataBg = np.rot90(self.dataBg, 3)
-        elif ext == '.spe' or ext == '.SPE':  # SPE file
-            from winspec import SpeFile
-            dataSPE = SpeFile(fichier)
-            data1 = dataSPE.data[0]  # .transpose() # first frame
-            self.dataBg = data1  # np.flipud(data1)
-        elif ext == '.TIFF':  # tiff File
-            from PIL import Image
-            dat = Image.open(fichier)
-            dat = np.rot90(dat, 3)
-            self.dataBg = np.array(dat)
-        elif ext == '.sif':
-            from andor import SifFile
-            sifop = SifFile()
-            im = sifop.openA(fichier)
-            self.dataBg = np.rot90(im, 3)
-            
+        data = self.readImage(fichier)
+        if data is not None:
+            self.setBackground(data, fichier)
         else:
             self.dataBgExist = False
             if self.parent is not None:
@@ -213,11 +222,131 @@ class OPTION(QWidget):
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Icon.Critical)
             msg.setText("Wrong file format !")
-            msg.setInformativeText("The format of the file must be : .SPE  .TIFF .sif or .txt ")
+            msg.setInformativeText("The format of the file must be : .SPE  .TIFF .sif .npy or .txt ")
             msg.setWindowTitle("Warning ...")
             msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
             msg.exec()
 
+    def setBackground(self, data, fichier):
+        '''
+        Use 'data' as background and switch the background subtraction on.
+        '''
+        self.dataBg = data
+        self.dataBgExist = True
+        self.fileBgBox.setText(str(fichier))
+        if self.parent is not None:
+            self.parent.checkBoxBg.setChecked(True)
+            self.parent.BackgroundF()
+
+    def bgShotsChanged(self):
+        self.conf.setValue(self.name+"/bgShots", self.bgShotsBox.value())
+
+    def backgroundLibrary(self):
+        '''
+        Return the BackgroundLibrary of the 'backgrounds' directory of the
+        auto save path, of the background path if there is none, else of the
+        visu directory.
+        '''
+        base = None
+        for setting in ("/pathAutoSave", "/pathBg"):
+            value = self.conf.value(self.name+setting)
+            if value not in (None, "", "None"):
+                base = str(value)
+                break
+        if base is None:
+            base = str(pathlib.Path(__file__).parent)
+        directory = os.path.join(base, 'backgrounds')
+        if self._bgLibrary is None or self._bgLibrary.directory != directory:
+            self._bgLibrary = BackgroundLibrary(directory)
+        return self._bgLibrary
+
+    def matchBackground(self, key):
+        '''
+        Return the background of the library matching the BackgroundKey 'key'
+        if 'Auto background' is checked, else None.
+        '''
+        if not self.checkBoxBgAuto.isChecked():
+            return None
+        return self.backgroundLibrary().find(key)
+
+    def readImage(self, fichier):
+        '''
+        Read the first frame of an image file (see imageReaders) as
+        displayed, None if the format is unknown. The .npy files of the
+        background library are memory-mapped.
+        '''
+        try:
+            return readImage(str(fichier))
+        except ValueError:
+            return None
+
+    def buildDefectMapF(self):
+        '''
+        Build the defect map from dark frames (ex: the snapped backgrounds)
+        and save it as .npy.
+        '''
+        fnames = QFileDialog.getOpenFileNames(
+            self, "Select the dark files", self.pathBg,
+            "Images (*.txt *.spe *.TIFF *.sif)")[0]
+        if len(fnames) == 0:
+            return
+        darks = [self.readImage(fichier) for fichier in fnames]
+        darks = [dark for dark in darks if dark is not None]
+        try:
+            defects = buildDefectMap(darks)
+        except ValueError as e:  # no dark or different shapes
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Icon.Critical)
+            msg.setText("Defect map not built !")
+            msg.setInformativeText(str(e))
+            msg.setWindowTitle("Warning ...")
+            msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
+            msg.exec()
+            return
+        print(f"{len(defects)} defective pixels found in {len(darks)} darks")
+        fname = QFileDialog.getSaveFileName(
+            self, "Save the defect map", os.path.join(os.path.dirname(fnames[0]), 'defect_map.npy'),
+            "Defect map (*.npy)")
+        if fname[0] == '':
+            self.setDefectMap(defects, 'defect map not saved')
+            return
+        fichier = defects.save(fname[0])
+        print(fichier, 'saved')
+        self.setDefectMap(defects, fichier)
+
+    def selectDefectMap(self):
+        fname = QFileDialog.getOpenFileName(
+            self, "Select a defect map", self.pathBg, "Defect map (*.npy)")
+        if fname[0] != '':
+            self.loadDefectMap(fname[0])
+
+    def loadDefectMap(self, fichier, warning=True):
+        '''
+        Read a defect map saved by 'Defect Map From Darks'.
+        '''
+        if fichier is None or not os.path.isfile(str(fichier)):
+            return
+        try:
+            defects = DefectMap.load(str(fichier))
+        except ValueError as e:
+            print('defect map error:', e)
+            if warning:
+                msg = QMessageBox()
+                msg.setIcon(QMessageBox.Icon.Critical)
+                msg.setText("Wrong defect map !")
+                msg.setInformativeText(str(e))
+                msg.setWindowTitle("Warning ...")
+                msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
+                msg.exec()
+            return
+        self.setDefectMap(defects, str(fichier))
+
+    def setDefectMap(self, defects, fichier):
+        self.defectMap = defects
+        self.defectBox.setText(f"{fichier} ({len(defects)} pixels)")
+        if os.path.isfile(fichier):
+            self.conf.setValue(self.name+"/defectMap", fichier)
+
     def checkBoxServerChange(self):
         
         if self. checkBoxServer.isChecked():
@@ -9,22 +9,25 @@ modified  : 2025/06/12
 __version__='2025.09'
 __author__='julien Gautier'
 
+import importlib
 
-from visu import visual
-from visu import visualLight
-from visu.visualLight import SEELIGHT
-from visu.visual import SEE
-from visu.visual import runVisu
-from visu import andor
-from visu import WinCut
-from visu import winMeas
-from visu import winspec
-from visu import winSuppE
-from visu import winFFT
-from visu import winZoom
-from visu import winMath
-from visu import winPointing
-from visu import winHist
+# the windows (Qt, pyqtgraph) are imported at their first use, so the modules
+# without GUI (diagServer, diagClient, benchDiagServer...) run headless
+_MODULES = ('visual', 'visualLight', 'andor', 'WinCut', 'winMeas', 'winspec', 'winSuppE',
+            'winFFT', 'winZoom', 'winMath', 'winPointing', 'winHist')
+_OBJECTS = {'SEELIGHT': 'visualLight', 'SEE': 'visual', 'runVisu': 'visual'}
+
+
+def __getattr__(name):
+    if name in _MODULES:
+        return importlib.import_module(f'visu.{name}')
+    if name in _OBJECTS:
+        return getattr(importlib.import_module(f'visu.{_OBJECTS[name]}'), name)
+    raise AttributeError(f"module 'visu' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_MODULES) + list(_OBJECTS))
 # try:
 #     from visu import Win3D
 # except :
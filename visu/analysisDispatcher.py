@@ -0,0 +1,169 @@
+'''
+Run the analyses of a frame in a pool of worker threads.
+
+Each analysis is split in two parts:
+    - 'compute', which only reads the frame (numpy/scipy, no widget),
+      run in a worker thread
+    - 'deliver', which updates the widgets with the result of 'compute',
+      called in the GUI thread through a queued signal
+
+    dispatcher = AnalysisDispatcher(maxWorkers=4)
+    dispatcher.submit("pointing", winPointing.compute, winPointing.showResult, obje)
+
+The analyses with different names run concurrently. The jobs of the same
+analysis run one after the other, so their results are delivered in the order
+of the frames. At most 'maxWaiting' jobs wait for each analysis: when the
+analysis is slower than the camera the oldest waiting job is dropped, so the
+frames held by the jobs do not grow without limit. With 'latestOnly' the jobs
+waiting for an analysis are replaced by the new one (analyses only showing the
+last frame: fft, encercled...).
+
+With a 'timer' (see stageTimer) the computation of each analysis is timed
+in the stage "worker/<name>".
+'''
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6 import QtCore
+
+
+class AnalysisDispatcher(QtCore.QObject):
+
+    resultReady = QtCore.pyqtSignal(object, object)  # (deliver, result)
+
+    def __init__(self, maxWorkers: int | None = None, parent=None, timer=None,
+                 maxWaiting: int = 4):
+        '''
+        The dispatcher must be created in the GUI thread: the results are
+        emitted from the workers and received in the thread of the dispatcher.
+
+        Args:
+            maxWorkers: (int)
+                number of worker threads, by default the number of cpu (max 8).
+            parent: (QObject)
+                the Qt parent.
+            timer: (StageTimer)
+                times the computations, None for no timing.
+            maxWaiting: (int)
+                maximum number of jobs waiting for each analysis, the oldest
+                one is dropped when a new job arrives.
+        '''
+        super().__init__(parent)
+        if maxWorkers is None:
+            maxWorkers = min(8, os.cpu_count() or 1)
+        self.maxWorkers = maxWorkers
+        self.maxWaiting = max(1, maxWaiting)
+        self.timer = timer
+        self._executor = ThreadPoolExecutor(max_workers=maxWorkers,
+                                            thread_name_prefix="analysis")
+        self._lock = threading.Lock()
+        self._waiting = {}  # name -> deque of jobs not started
+        self._running = set()  # names of the analyses with a job in a worker
+        self._closed = False
+        # counters
+        self.submitted = 0
+        self.delivered = 0
+        self.dropped = 0  # jobs replaced by a newer one ('latestOnly' or queue full)
+        self.errors = 0
+        self.resultReady.connect(self._deliver)  # queued: emitted by the workers
+
+    def submit(self, name: str, compute, deliver, *args, latestOnly: bool = False) -> None:
+        '''
+        Run 'compute(*args)' in a worker and then 'deliver(result)' in the GUI thread.
+
+        Args:
+            name: (str)
+                the name of the analysis, the jobs of the same name are run in order.
+            compute: (callable)
+                the computation, must not use any widget.
+            deliver: (callable)
+                called with the result of 'compute' in the GUI thread.
+            latestOnly: (bool)
+                if True, the jobs of 'name' not started yet are dropped,
+                else only the oldest one if 'maxWaiting' jobs are waiting.
+        '''
+        job = (name, compute, deliver, args)
+        with self._lock:
+            if self._closed:
+                return
+            self.submitted += 1
+            if name in self._running:
+                waiting = self._waiting.setdefault(name, deque())
+                if latestOnly:
+                    self.dropped += len(waiting)
+                    waiting.clear()
+                elif len(waiting) >= self.maxWaiting:  # analysis late: oldest frame dropped
+                    waiting.popleft()
+                    self.dropped += 1
+                waiting.append(job)
+                return
+            self._running.add(name)
+        self._start(job)
+
+    def _start(self, job: tuple) -> None:
+        try:
+            self._executor.submit(self._run, job)
+        except RuntimeError:  # 'shutdown' called meanwhile
+            pass
+
+    def _run(self, job: tuple) -> None:
+        '''
+        Compute a job in a worker thread and start the next job of the same analysis.
+        '''
+        name, compute, deliver, args = job
+        t0 = time.perf_counter()
+        try:
+            result = compute(*args)
+        except Exception as e:  # the worker must start the next job anyway
+            with self._lock:
+                self.errors += 1
+            print(f"[analysis {name}] error:", e)
+        else:
+            if self.timer is not None and self.timer.enabled:
+                self.timer.record(f"worker/{name}", time.perf_counter() - t0)
+            self.resultReady.emit(deliver, result)
+
+        with self._lock:
+            waiting = self._waiting.get(name)
+            if waiting and not self._closed:
+                nextJob = waiting.popleft()
+            else:
+                nextJob = None
+                self._running.discard(name)
+        if nextJob is not None:
+            self._start(nextJob)
+
+    def _deliver(self, deliver, result) -> None:
+        '''
+        Give a result to the widgets, called in the GUI thread.
+        '''
+        self.delivered += 1
+        deliver(result)
+
+    def pending(self, name: str | None = None) -> int:
+        '''
+        Return the number of jobs running or waiting (for 'name' or for all analyses).
+        '''
+        with self._lock:
+            names = self._running if name is None else self._running & {name}
+            return sum(1 + len(self._waiting.get(n, ())) for n in names)
+
+    def stats(self) -> dict:
+        '''
+        Return the counters of the dispatcher.
+        '''
+        return {"workers": self.maxWorkers, "submitted": self.submitted,
+                "delivered": self.delivered, "dropped": self.dropped,
+                "errors": self.errors, "pending": self.pending()}
+
+    def shutdown(self, wait: bool = False) -> None:
+        '''
+        Stop the workers, the jobs not started are dropped.
+        '''
+        with self._lock:
+            self._closed = True
+            self._waiting.clear()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,98 @@
+'''
+Levels of the color scale from the percentiles of the image.
+
+The levels are the percentiles of a strided subsample of the image (about
+'maxSamples' pixels): their cost does not depend on the size of the sensor and
+a few cold, dead or hot pixels do not blow out the color scale.
+
+A small laser spot may fall between the samples, so the high level is raised
+to the brightest spot of the full frame: the maximum of the frame binned by
+'binning' x 'binning' blocks, each block giving its minimum (one pass over the
+frame). A spot of at least 2 * binning - 1 pixels of side is never clipped, an
+isolated hot pixel (or a pair) is ignored:
+
+    xmin, xmax = percentileLevels(data)                 # 0.1 % and 99.9 % or the spot
+    imh.setImage(data, autoLevels=False, levels=(xmin, xmax))
+
+With binning=None the levels are only the percentiles of the subsample.
+'''
+
+import numpy as np
+
+LOW = 0.1  # default percentile of the low level
+HIGH = 99.9  # default percentile of the high level
+BINNING = 2  # the high level keeps the spots of 2 * BINNING - 1 pixels or more
+MAX_SAMPLES = 1 << 16
+
+
+def subsample(data: np.ndarray, maxSamples: int = MAX_SAMPLES) -> np.ndarray:
+    '''
+    Return a strided view of 'data' with about 'maxSamples' pixels at most
+    (the same step along the two axes of an image).
+    '''
+    data = np.asarray(data)
+    if data.size <= maxSamples:
+        return data
+    if data.ndim >= 2:
+        step = int(np.ceil(np.sqrt(data.size / maxSamples)))
+        return data[::step, ::step]
+    return data.ravel()[::int(np.ceil(data.size / maxSamples))]
+
+
+def spotMaximum(data: np.ndarray, binning: int = BINNING) -> float:
+    '''
+    Return the maximum of the image binned by 'binning' x 'binning' blocks
+    (along the first two axes), each block giving its minimum: a spot of at
+    least 2 * binning - 1 pixels of side always fills a block and is kept,
+    an isolated hot pixel is ignored. The nan are ignored, -inf if the image
+    is smaller than a block.
+    '''
+    data = np.asarray(data)
+    axes = min(data.ndim, 2)
+    if data.size == 0 or min(data.shape[:axes]) < binning:
+        return -np.inf
+    ends = [size // binning * binning for size in data.shape[:axes]]
+    blockMin = None
+    for offsets in np.ndindex(*(binning,) * axes):
+        block = data[tuple(slice(offset, end, binning) for offset, end in zip(offsets, ends))]
+        if blockMin is None:
+            blockMin = block.copy()
+        else:
+            np.fmin(blockMin, block, out=blockMin)
+    if blockMin.dtype.kind == "f":
+        return float(np.nanmax(blockMin))
+    return float(blockMin.max())
+
+
+def percentileLevels(data: np.ndarray, low: float = LOW, high: float = HIGH,
+                     maxSamples: int = MAX_SAMPLES, binning: int | None = BINNING) -> tuple:
+    '''
+    Return the levels (xmin, xmax) of the image, xmax > xmin.
+
+    Args:
+        data: (np.ndarray)
+            the image.
+        low: (float)
+            percentile (0 to 100) of the subsample for the low level.
+        high: (float)
+            percentile (0 to 100) of the subsample for the high level.
+        maxSamples: (int)
+            number of pixels of the subsample.
+        binning: (int)
+            binning of the full image giving the brightest spot kept below the
+            high level (see 'spotMaximum'), None for the percentile only.
+    '''
+    data = np.asarray(data)
+    sample = subsample(data, maxSamples)
+    if sample.dtype.kind == "f":
+        sample = sample[np.isfinite(sample)]
+    if sample.size == 0:
+        return 0., 1.
+    levelLow, levelHigh = (float(level) for level in np.percentile(sample, [low, high]))
+    if binning is not None:
+        spotLevel = spotMaximum(data, binning)
+        if np.isfinite(spotLevel):  # not a spot of inf
+            levelHigh = max(levelHigh, spotLevel)
+    if levelHigh <= levelLow:
+        levelHigh = levelLow + 1
+    return levelLow, levelHigh
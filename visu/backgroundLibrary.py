@@ -0,0 +1,269 @@
+'''
+Library of the backgrounds (darks) of the cameras.
+
+A background is the running mean of N dark shots accumulated in float32
+(Welford algorithm, with the standard deviation if asked), so it does not add
+the shot noise of a single frame to every analysis:
+
+    dark = RunningBackground(std=True)
+    for frame in darks:
+        dark.add(frame)
+
+The backgrounds are saved in a directory as .npy files (mean and std) with an
+index 'library.json', keyed by camera, frame shape, camera ROI and exposure.
+They are read back memory-mapped (no text parsing, no copy) and the matching
+background of a frame is picked automatically:
+
+    library = BackgroundLibrary(directory)
+    key = BackgroundKey("VISU", frame.shape, exposure=10)
+    library.save(key, dark)
+    bg = library.find(key)          # memory-mapped mean, None if no match
+'''
+
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, asdict
+import numpy as np
+
+INDEX = "library.json"
+
+
+@dataclass(frozen=True)
+class BackgroundKey:
+    '''
+    Acquisition settings a background is valid for.
+
+    Args:
+        camera: (str)
+            name of the camera (the name of the SEE window).
+        shape: (tuple)
+            shape of the frames as displayed.
+        roi: (tuple)
+            region of the sensor read by the camera, None for the full sensor.
+        exposure: (float)
+            exposure time (in the unit of the camera), None if unknown.
+    '''
+    camera: str
+    shape: tuple
+    roi: tuple | None = None
+    exposure: float | None = None
+
+    def __post_init__(self):
+        object.__setattr__(self, "shape", tuple(int(s) for s in self.shape))
+        if self.roi is not None:
+            object.__setattr__(self, "roi", tuple(int(r) for r in self.roi))
+        if self.exposure is not None:
+            object.__setattr__(self, "exposure", float(self.exposure))
+
+    def fileName(self) -> str:
+        '''
+        Return the name of the files of the background (without the suffix).
+        '''
+        name = f"bg_{self.camera}_{'x'.join(map(str, self.shape))}"
+        if self.roi is not None:
+            name += "_roi" + "_".join(map(str, self.roi))
+        if self.exposure is not None:
+            name += f"_exp{self.exposure:g}"
+        return re.sub(r"[^\w.-]", "_", name)
+
+    @classmethod
+    def fromDict(cls, values: dict) -> "BackgroundKey":
+        return cls(values["camera"], values["shape"], values.get("roi"), values.get("exposure"))
+
+
+class RunningBackground:
+
+    def __init__(self, std: bool = True):
+        '''
+        Running mean (and standard deviation) of dark frames in float32.
+
+        Args:
+            std: (bool)
+                also accumulate the variance to give the standard deviation.
+        '''
+        self.withStd = std
+        self._count = 0
+        self._mean = None
+        self._m2 = None  # sum of the squared differences to the mean
+        self._delta = None  # buffers of 'add'
+        self._delta2 = None
+
+    @property
+    def count(self) -> int:
+        '''
+        property that return the number of frames accumulated.
+        '''
+        return self._count
+
+    @property
+    def shape(self) -> tuple | None:
+        '''
+        property that return the shape of the frames, None before the first frame.
+        '''
+        return None if self._mean is None else self._mean.shape
+
+    @property
+    def mean(self) -> np.ndarray | None:
+        '''
+        property that return the mean of the frames (float32).
+        '''
+        return self._mean
+
+    @property
+    def std(self) -> np.ndarray | None:
+        '''
+        property that return the standard deviation of the frames (float32),
+        None without 'std' or before 2 frames.
+        '''
+        if self._m2 is None or self._count < 2:
+            return None
+        return np.sqrt(self._m2 / np.float32(self._count - 1))
+
+    def add(self, frame: np.ndarray) -> int:
+        '''
+        Add a frame to the mean (in place, without temporary frame) and
+        return the number of frames.
+        Raise ValueError if the shape is not the shape of the first frame.
+        '''
+        frame = np.asarray(frame)
+        if self._mean is None:
+            self._mean = np.zeros(frame.shape, dtype=np.float32)
+            self._delta = np.empty(frame.shape, dtype=np.float32)
+            if self.withStd:
+                self._m2 = np.zeros(frame.shape, dtype=np.float32)
+                self._delta2 = np.empty(frame.shape, dtype=np.float32)
+        elif frame.shape != self._mean.shape:
+            raise ValueError(f"dark shape {frame.shape} != background shape {self._mean.shape}")
+        self._count += 1
+        # Welford: mean += (x - mean) / n ; m2 += (x - old mean) * (x - new mean)
+        np.subtract(frame, self._mean, out=self._delta, casting="unsafe")
+        if self._m2 is None:
+            self._delta /= np.float32(self._count)
+            self._mean += self._delta
+        else:
+            np.divide(self._delta, np.float32(self._count), out=self._delta2)
+            self._mean += self._delta2
+            np.subtract(frame, self._mean, out=self._delta2, casting="unsafe")
+            self._delta *= self._delta2
+            self._m2 += self._delta
+        return self._count
+
+
+class BackgroundLibrary:
+
+    def __init__(self, directory: str):
+        '''
+        Backgrounds saved in 'directory' (created at the first 'save').
+        '''
+        self.directory = str(directory)
+        self._lock = threading.Lock()
+        self._loaded = {}  # key -> (mean, std) memory-mapped
+
+    def _indexFile(self) -> str:
+        return os.path.join(self.directory, INDEX)
+
+    def entries(self) -> list:
+        '''
+        Return the entries of the index: dictionaries with the fields of the
+        key and 'count', 'date', 'mean' and 'std' (file names).
+        '''
+        try:
+            with open(self._indexFile()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def keys(self) -> list:
+        '''
+        Return the keys of the saved backgrounds.
+        '''
+        return [BackgroundKey.fromDict(entry) for entry in self.entries()]
+
+    def save(self, key: BackgroundKey, background) -> str:
+        '''
+        Save a background (RunningBackground or array) for 'key', replacing the
+        previous one, and return the file of the mean.
+        '''
+        if isinstance(background, RunningBackground):
+            mean, std, count = background.mean, background.std, background.count
+        else:
+            mean, std, count = np.asarray(background, dtype=np.float32), None, 1
+        if mean is None:
+            raise ValueError("empty background")
+        if tuple(mean.shape) != key.shape:
+            raise ValueError(f"background shape {mean.shape} != key shape {key.shape}")
+        os.makedirs(self.directory, exist_ok=True)
+        date = time.strftime("%Y_%m_%d_%H_%M_%S")
+        # new files at each save (unique even within a second): the previous
+        # ones may still be memory-mapped
+        stem = f"{key.fileName()}_{date}_{uuid.uuid4().hex[:8]}"
+        entry = dict(asdict(key), count=count, date=date, mean=stem + "_mean.npy", std=None)
+        with self._lock:
+            np.save(os.path.join(self.directory, entry["mean"]), mean.astype(np.float32, copy=False))
+            if std is not None:
+                entry["std"] = stem + "_std.npy"
+                np.save(os.path.join(self.directory, entry["std"]), std.astype(np.float32, copy=False))
+            entries = []
+            for previous in self.entries():
+                if BackgroundKey.fromDict(previous) != key:
+                    entries.append(previous)
+                    continue
+                for fileName in (previous.get("mean"), previous.get("std")):
+                    if fileName and fileName not in (entry["mean"], entry["std"]):
+                        try:
+                            os.remove(os.path.join(self.directory, fileName))
+                        except OSError:  # still mapped (Windows): left on disk
+                            pass
+            entries.append(entry)
+            with open(self._indexFile(), "w") as f:
+                json.dump(entries, f, indent=1)
+            self._loaded.pop(key, None)
+        return os.path.join(self.directory, entry["mean"])
+
+    def load(self, key: BackgroundKey) -> tuple:
+        '''
+        Return the (mean, std) memory-mapped of 'key', std is None if it was
+        not accumulated. Raise KeyError if there is no background for 'key'.
+        '''
+        with self._lock:
+            if key in self._loaded:
+                return self._loaded[key]
+            for entry in self.entries():
+                if BackgroundKey.fromDict(entry) == key:
+                    break
+            else:
+                raise KeyError(key)
+            mean = np.load(os.path.join(self.directory, entry["mean"]), mmap_mode="r")
+            std = None
+            if entry.get("std"):
+                std = np.load(os.path.join(self.directory, entry["std"]), mmap_mode="r")
+            self._loaded[key] = (mean, std)
+            return mean, std
+
+    def match(self, key: BackgroundKey) -> BackgroundKey | None:
+        '''
+        Return the key of the saved background to use for frames of 'key':
+        same camera, shape and ROI, the same exposure or else a background
+        without exposure. None if there is none.
+        '''
+        candidates = [saved for saved in self.keys()
+                      if (saved.camera, saved.shape, saved.roi) == (key.camera, key.shape, key.roi)]
+        for exposure in (key.exposure, None):
+            for saved in candidates:
+                if saved.exposure == exposure:
+                    return saved
+        return None
+
+    def find(self, key: BackgroundKey) -> np.ndarray | None:
+        '''
+        Return the memory-mapped mean of the background matching 'key', None
+        if there is none.
+        '''
+        saved = self.match(key)
+        if saved is None:
+            return None
+        return self.load(saved)[0]
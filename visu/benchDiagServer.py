@@ -0,0 +1,238 @@
+'''
+Benchmark of diagServer throughput and latency.
+
+The server is started in this process and driven by local clients:
+    - 'req' clients: threads sending '__GET__' (or '__FRAME__') in a loop
+    - 'sub' clients: SUB sockets receiving what 'setData' / 'setFrame' publish
+
+for each combination of transport (tcp, ipc, inproc), payload (small dict,
+1-D spectrum, full frame) and number of clients. Each run prints one json line
+with requests/s (or messages/s), latency percentiles in ms and the process CPU
+time per request in us (server and clients together). The 'sub' clients keep
+at most '--hwm' messages in their queue, the messages dropped by zmq when a
+client is too slow are reported in 'dropped'.
+
+Only numpy and pyzmq are needed (the 'visu' windows are not imported).
+
+    python -m visu.benchDiagServer --transport tcp ipc --payload small frame --clients 1 5
+    python -m visu.benchDiagServer --pattern sub --output bench_output.txt
+'''
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+import zmq
+from visu.diagServer import diagServer, topicOf
+
+
+def makePayload(kind: str, shotNumber: int = 0):
+    '''
+    Return the data given to the server for a payload kind:
+    (dictionary, frame or None).
+    '''
+    if kind == "small":
+        return {"Std energy": 12.3, "Mean energy": 150.2, "Charge": 35.1,
+                "Shot number": shotNumber}, None
+    if kind == "spectrum":
+        energy = np.linspace(20, 400, 2000, dtype=np.float32)
+        spectrum = np.exp(-(energy - 150)**2 / 800).astype(np.float32)
+        return {"Shot number": shotNumber, "energy": energy,
+                "integrated_spectrum": spectrum}, None
+    if kind == "frame":
+        frame = np.random.randint(0, 4096, (2048, 2048), dtype=np.uint16)
+        return {"Shot number": shotNumber}, frame
+    raise ValueError(f"unknown payload '{kind}'")
+
+
+def endpoints(transport: str, port: int) -> tuple:
+    '''
+    Return the (server, publisher) bind addresses for a transport.
+    '''
+    if transport == "tcp":
+        return f"tcp://127.0.0.1:{port}", f"tcp://127.0.0.1:{port + 1}"
+    if transport == "ipc":
+        return (f"ipc:///tmp/benchDiagServer-{os.getpid()}-{port}",
+                f"ipc:///tmp/benchDiagServer-{os.getpid()}-{port}-pub")
+    if transport == "inproc":
+        return f"inproc://benchDiagServer-{port}", f"inproc://benchDiagServer-{port}-pub"
+    raise ValueError(f"unknown transport '{transport}'")
+
+
+def _percentiles(latencies: list) -> dict:
+    if len(latencies) == 0:
+        return {"p50_ms": None, "p99_ms": None}
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {"p50_ms": round(float(p50), 4), "p99_ms": round(float(p99), 4)}
+
+
+def benchReq(server: diagServer, address: str, nbClients: int, duration: float,
+             message: str) -> dict:
+    '''
+    Run 'nbClients' REQ clients sending 'message' during 'duration' s.
+    '''
+    latencies = [[] for _ in range(nbClients)]
+    received = [0] * nbClients
+    start = threading.Barrier(nbClients + 1)
+    stop = threading.Event()
+
+    def client(index):
+        sock = server.context.socket(zmq.REQ)
+        sock.setsockopt(zmq.LINGER, 0)
+        sock.connect(address)
+        start.wait()
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            sock.send_string(message)
+            frames = sock.recv_multipart(copy=False)
+            latencies[index].append(time.perf_counter() - t0)
+            received[index] += sum(len(frame) for frame in frames)
+        sock.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(nbClients)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    cpu, elapsed = time.process_time() - cpu0, time.perf_counter() - t0
+
+    allLatencies = [lat for clientLatencies in latencies for lat in clientLatencies]
+    count = len(allLatencies)
+    return dict(requests=count,
+                rate=round(count / elapsed, 1),
+                **_percentiles(allLatencies),
+                cpu_us_per_request=round(cpu / max(count, 1) * 1e6, 2),
+                mbytes_per_s=round(sum(received) / elapsed / 1e6, 2))
+
+
+def benchSub(server: diagServer, address: str, nbClients: int, duration: float,
+             payload: str, hwm: int = 1000) -> dict:
+    '''
+    Publish as fast as possible during 'duration' s to 'nbClients' SUB clients
+    keeping at most 'hwm' messages each (the others are dropped by zmq).
+    The latency is measured from the timestamp of the published header.
+    '''
+    topic = b"__FRAME__" if payload == "frame" else topicOf()
+    subs = []
+    for _ in range(nbClients):
+        sub = server.context.socket(zmq.SUB)
+        sub.setsockopt(zmq.LINGER, 0)
+        sub.setsockopt(zmq.RCVHWM, hwm)
+        sub.subscribe(topic)
+        sub.connect(address)
+        subs.append(sub)
+    time.sleep(0.3) # let the subscriptions reach the publisher
+
+    latencies = []
+    counts = [0] * nbClients
+    stop = threading.Event()
+
+    def listen():
+        poller = zmq.Poller()
+        for sub in subs:
+            poller.register(sub, zmq.POLLIN)
+        while not stop.is_set() or poller.poll(0):
+            for sub, _ in poller.poll(100):
+                frames = sub.recv_multipart(copy=False)
+                header = json.loads(frames[1].bytes)
+                latencies.append(time.time() - header["timestamp"])
+                counts[subs.index(sub)] += 1
+
+    listener = threading.Thread(target=listen)
+    listener.start()
+    data, frame = makePayload(payload)
+    sent = 0
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    while time.perf_counter() - t0 < duration:
+        sent += 1
+        if frame is not None:
+            server.setFrame(frame, shotNumber=sent)
+        else:
+            server.setData(data, shotNumber=sent)
+    elapsed = time.perf_counter() - t0
+    time.sleep(0.2) # drain
+    stop.set()
+    listener.join()
+    cpu = time.process_time() - cpu0
+    for sub in subs:
+        sub.close()
+
+    received = sum(counts)
+    return dict(published=sent,
+                received=received,
+                dropped=sent * nbClients - received,
+                rate=round(sent / elapsed, 1),
+                **_percentiles(latencies),
+                cpu_us_per_request=round(cpu / max(received, 1) * 1e6, 2))
+
+
+def run(args) -> list:
+    '''
+    Run all the combinations and write one json line per run.
+    '''
+    output = open(args.output, "a") if args.output else sys.stdout
+    results = []
+    port = args.port
+    for transport in args.transport:
+        for payload in args.payload:
+            for nbClients in args.clients:
+                address, pubAddress = endpoints(transport, port)
+                port += 2
+                data, frame = makePayload(payload)
+                server = diagServer(address=address, pubAddress=pubAddress,
+                                    data=data, mode=args.mode,
+                                    name="benchmark", historyLength=0)
+                server.pubSocket.setsockopt(zmq.SNDHWM, args.hwm)
+                if frame is not None:
+                    server.setFrame(frame)
+                server.start()
+                try:
+                    if args.pattern == "req":
+                        if payload == "frame":
+                            message = "__FRAME__"
+                        elif args.codec == "json":
+                            message = "__GET__"
+                        else:
+                            message = f"__GET__ codec={args.codec}"
+                        result = benchReq(server, address, nbClients,
+                                          args.duration, message)
+                    else:
+                        result = benchSub(server, pubAddress, nbClients,
+                                          args.duration, payload, args.hwm)
+                finally:
+                    server.stop()
+
+                result = dict(pattern=args.pattern, mode=args.mode,
+                              transport=transport, payload=payload,
+                              codec=args.codec, clients=nbClients, **result)
+                results.append(result)
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+    if output is not sys.stdout:
+        output.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="diagServer benchmark")
+    parser.add_argument("--pattern", choices=["req", "sub"], default="req")
+    parser.add_argument("--mode", choices=["rep", "router"], default="router")
+    parser.add_argument("--transport", nargs="+", default=["tcp", "ipc", "inproc"],
+                        choices=["tcp", "ipc", "inproc"])
+    parser.add_argument("--payload", nargs="+", default=["small", "spectrum", "frame"],
+                        choices=["small", "spectrum", "frame"])
+    parser.add_argument("--codec", default="json", choices=["json", "numpy"])
+    parser.add_argument("--clients", nargs="+", type=int, default=[1, 5, 20])
+    parser.add_argument("--duration", type=float, default=2., help="s per run")
+    parser.add_argument("--hwm", type=int, default=1000,
+                        help="messages queued per subscriber before dropping (sub pattern)")
+    parser.add_argument("--port", type=int, default=15300, help="first tcp port")
+    parser.add_argument("--output", default=None, help="append json lines to this file")
+    run(parser.parse_args())
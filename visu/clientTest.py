@@ -1,4 +1,5 @@
 import zmq
+import json
 
 context = zmq.Context()
 socket = context.socket(zmq.REQ)
@@ -9,3 +10,15 @@ socket.send_string("__GET__")
 
 reply = socket.recv_string()
 print("Server answer:", reply)
+
+# ask the publisher address and listen to the published dictionaries
+socket.send_string("__PUBLISHER__")
+pubAddress = socket.recv_string()
+
+if pubAddress:
+    sub = context.socket(zmq.SUB)
+    sub.connect(pubAddress)
+    sub.setsockopt_string(zmq.SUBSCRIBE, "__DATA__/")
+    for i in range(3):
+        topic, header, data = sub.recv_multipart()
+        print("Published:", json.loads(header), json.loads(data))
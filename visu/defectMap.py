@@ -0,0 +1,160 @@
+'''
+Map of the defective pixels (hot, dead or stuck) of a camera.
+
+The map is built once from a series of dark frames (ex: the backgrounds saved
+by 'Snap Background') and kept as the list of the defective pixels. At each
+frame only these pixels are replaced by the median of their valid neighbours:
+the cost scales with the number of defects, not with the size of the sensor.
+
+    defects = buildDefectMap(darks, nSigma=6)
+    defects.save("defect_map.npy")
+    defects = DefectMap.load("defect_map.npy")
+    defects.correct(data)        # in place
+
+The file is a .npy int32 array: the first row is the frame shape, the next
+rows the (x, y) of the defective pixels.
+'''
+
+import numpy as np
+from scipy.ndimage import median_filter
+
+# the 8 neighbours of a pixel
+_OFFSETS = np.array([(-1, -1), (-1, 0), (-1, 1), (0, -1),
+                     (0, 1), (1, -1), (1, 0), (1, 1)])
+
+
+class DefectMap:
+
+    def __init__(self, pixels, shape: tuple):
+        '''
+        Defective pixels of frames of 'shape'.
+
+        Args:
+            pixels: (np.ndarray)
+                (x, y) of the defective pixels, shape (n, 2).
+            shape: (tuple)
+                shape of the frames.
+        '''
+        self._shape = tuple(int(s) for s in shape)
+        self._pixels = np.asarray(pixels, dtype=np.int32).reshape(-1, 2)
+        if len(self._pixels) and (self._pixels.min() < 0
+                                  or (self._pixels >= np.array(self._shape)).any()):
+            raise ValueError(f"defective pixels outside of the frame shape {self._shape}")
+
+        # neighbours of each defect, the defective neighbours are not used
+        x, y = self._pixels[:, 0], self._pixels[:, 1]
+        nx = x[:, None] + _OFFSETS[:, 0]
+        ny = y[:, None] + _OFFSETS[:, 1]
+        valid = (nx >= 0) & (nx < self._shape[0]) & (ny >= 0) & (ny < self._shape[1])
+        nx = np.clip(nx, 0, self._shape[0] - 1)
+        ny = np.clip(ny, 0, self._shape[1] - 1)
+        defective = np.zeros(self._shape, dtype=bool)
+        defective[x, y] = True
+        valid &= ~defective[nx, ny]
+
+        # defects grouped by number of valid neighbours: each group is a
+        # (x, y, neighbours x, neighbours y) with (n, count) neighbour arrays.
+        # The pixels without valid neighbour (large clusters) are not corrected
+        count = valid.sum(axis=1)
+        self.uncorrected = int((count == 0).sum())
+        self._groups = []
+        for nb in range(1, len(_OFFSETS) + 1):
+            rows = np.flatnonzero(count == nb)
+            if len(rows) == 0:
+                continue
+            keep = valid[rows]
+            self._groups.append((x[rows], y[rows],
+                                 nx[rows][keep].reshape(-1, nb),
+                                 ny[rows][keep].reshape(-1, nb)))
+
+    @property
+    def shape(self) -> tuple:
+        '''
+        property to avoid 'shape' modification.
+        '''
+        return self._shape
+
+    @property
+    def pixels(self) -> np.ndarray:
+        '''
+        property that return the (x, y) of the defective pixels.
+        '''
+        return self._pixels
+
+    def __len__(self) -> int:
+        return len(self._pixels)
+
+    def correct(self, data: np.ndarray) -> np.ndarray:
+        '''
+        Replace in place the defective pixels of 'data' by the median of their
+        valid neighbours and return 'data'.
+        Raise ValueError if the shape of 'data' is not the shape of the map.
+        '''
+        if data.shape != self._shape:
+            raise ValueError(f"defect map shape {self._shape} != image shape {data.shape}")
+        # all the medians are read before writing: a corrected pixel is
+        # never used as a neighbour
+        medians = [np.median(data[nx, ny], axis=1) for _, _, nx, ny in self._groups]
+        for (x, y, _, _), median in zip(self._groups, medians):
+            data[x, y] = median
+        return data
+
+    def save(self, fileName: str) -> str:
+        '''
+        Save the map in a .npy file (the extension is added if missing).
+        '''
+        if not fileName.endswith('.npy'):
+            fileName += '.npy'
+        np.save(fileName, np.vstack([np.array(self._shape, dtype=np.int32)[None],
+                                     self._pixels]))
+        return fileName
+
+    @classmethod
+    def load(cls, fileName: str) -> "DefectMap":
+        '''
+        Read a map saved by 'save'.
+        '''
+        content = np.load(fileName)
+        if content.ndim != 2 or content.shape[1] != 2 or len(content) == 0:
+            raise ValueError(f"{fileName} is not a defect map")
+        return cls(content[1:], content[0])
+
+
+def buildDefectMap(darks, nSigma: float = 6., stuck: bool = True,
+                   size: int = 5) -> DefectMap:
+    '''
+    Find the defective pixels of a series of dark frames.
+
+    A pixel is hot (dead) when its mean over the series is above (below) the
+    local median of the mean frame by more than 'nSigma' robust standard
+    deviations. A pixel is stuck when its value never changes in the series
+    while the other pixels are noisy.
+
+    Args:
+        darks: (list or np.ndarray)
+            the dark frames, a list of 2D arrays or a 3D array.
+        nSigma: (float)
+            threshold in robust standard deviations (median absolute deviation).
+        stuck: (bool)
+            also find the stuck pixels (needs 2 frames or more).
+        size: (int)
+            size of the median filter giving the local level of the dark.
+    '''
+    stack = np.asarray(darks, dtype=np.float32)
+    if stack.ndim == 2:
+        stack = stack[None]
+    if stack.ndim != 3 or len(stack) == 0:
+        raise ValueError("darks must be a list of 2D frames")
+
+    mean = stack.mean(axis=0)
+    diff = mean - median_filter(mean, size=size)
+    sigma = 1.4826 * np.median(np.abs(diff - np.median(diff)))
+    if sigma == 0:
+        sigma = diff.std() or 1.
+    mask = np.abs(diff) > nSigma * sigma
+
+    if stuck and len(stack) > 1:
+        std = stack.std(axis=0)
+        if np.median(std) > 0:
+            mask |= std == 0
+    return DefectMap(np.argwhere(mask), mean.shape)
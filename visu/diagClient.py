@@ -0,0 +1,525 @@
+'''
+Clients of diagServer.
+
+'diagClient' keeps one zmq context and a pool of REQ sockets per endpoint:
+a request that times out closes its socket (a REQ socket waiting for an answer
+can not be reused) and is retried with a backoff. 'gather' sends the same
+request to many servers at once, so the collection time is the slowest
+answer instead of the sum of all answers.
+
+'asyncDiagClient' offers the same requests for asyncio code.
+
+    client = diagClient(timeout=0.5)
+    data = client.get("tcp://10.0.1.57:1230")
+    allData = client.getAll(["tcp://10.0.1.57:1230", "tcp://10.0.1.58:1230"])
+'''
+
+import json
+import time
+import threading
+import asyncio
+import zmq
+import zmq.asyncio
+from visu.diagCodec import getCodec
+from visu.diagServer import frameFromMessage, selectAddress
+
+
+def _decodeData(frames: list, codec: str) -> dict:
+    '''
+    Decode the answer of '__GET__'.
+    Raise ValueError if the server rejected the request (unknown source,
+    codec or option).
+    '''
+    if frames[0] == b"unable to understand the demande":
+        raise ValueError(f"the server rejected the request (source or codec '{codec}')")
+    return getCodec(codec).decode(frames)
+
+
+def _decodeAll(answers: dict, codec: str) -> dict:
+    '''
+    Decode the answers of 'gather' to '__GET__' endpoint by endpoint:
+    None for a server that did not answer, rejected the request or sent an
+    answer that can not be decoded, so the other servers are kept.
+    '''
+    results = {}
+    for endpoint, frames in answers.items():
+        try:
+            results[endpoint] = None if isinstance(frames, Exception) else _decodeData(frames, codec)
+        except (ValueError, KeyError, IndexError, TypeError):
+            results[endpoint] = None
+    return results
+
+
+def _decodeIfNewer(frames: list, codec: str) -> tuple:
+    '''
+    Decode the answer of '__GET_IF_NEWER__': (version, data or None).
+    '''
+    if len(frames) < 2:
+        raise ValueError(frames[0].decode(errors="replace"))
+    version = int(frames[0])
+    if frames[1] == b"__NOT_MODIFIED__":
+        return version, None
+    return version, getCodec(codec).decode(frames[1:])
+
+
+def _getMessage(codec: str, source: str | None) -> str:
+    '''
+    Build the '__GET__' message for a codec and a named source.
+    '''
+    message = "__GET__" if source is None else f"__GET__ {source}"
+    if codec != "json":
+        message += f" codec={codec}"
+    return message
+
+
+def _ifNewerMessage(version: int, codec: str, source: str | None) -> str:
+    '''
+    Build the '__GET_IF_NEWER__' message for a codec and a named source.
+    '''
+    message = f"__GET_IF_NEWER__ {version} codec={codec}"
+    if source is not None:
+        message += f" source={source}"
+    return message
+
+
+def _historyMessage(first: int | None, last: int | None) -> str:
+    '''
+    Build the '__HISTORY__' message: last <first> shots if 'last' is None.
+    '''
+    if last is None:
+        return f"__HISTORY__ {first}"
+    return f"__HISTORY__ {first} {last}"
+
+
+class diagClient:
+
+    def __init__(self,
+                 timeout: float = 1.,
+                 retries: int = 2,
+                 backoff: float = 0.05,
+                 preferLocal: bool = True,
+                 probeInterval: float = 30.,
+                 context: zmq.Context | None = None):
+        '''
+        Client of one or many diagServer.
+
+        Args:
+            timeout: (float)
+                time in s to wait for an answer.
+
+            retries: (int)
+                number of new attempts after a timeout.
+
+            backoff: (float)
+                wait before the first retry in s, doubled at each retry.
+
+            preferLocal: (bool)
+                if True, the client asks '__ENDPOINTS__' the first time it uses
+                an endpoint and switches to the ipc address of the server when it
+                runs on the same machine, or to its inproc address when the server
+                uses the same context. If the local address does not answer, the
+                client goes back to the endpoint.
+
+            probeInterval: (float)
+                time in s before asking '__ENDPOINTS__' again to a server that
+                did not answer it.
+
+            context: (zmq.Context)
+                the zmq context. If None, the global context is used
+                (it must be the server context to use inproc endpoints).
+        '''
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.preferLocal = preferLocal
+        self.probeInterval = probeInterval
+        self.context = context if context is not None else zmq.Context.instance()
+        self._lock = threading.Lock() # the pool can be used from many threads
+        self._pool = {}   # address -> list of idle REQ sockets
+        self._routes = {} # endpoint -> address really used
+        self._probeFailed = {} # endpoint -> time of the last '__ENDPOINTS__' without answer
+
+    def _address(self, endpoint: str) -> str:
+        '''
+        Return the address used for 'endpoint', the local one if possible.
+        '''
+        if self.preferLocal:
+            self._resolve([endpoint])
+        with self._lock:
+            return self._routes.get(endpoint, endpoint)
+
+    def _resolve(self, endpoints: list) -> None:
+        '''
+        Ask '__ENDPOINTS__' in parallel to the servers not resolved yet and
+        keep the fastest address of each one (see 'selectAddress').
+        A server that does not answer is not asked again before 'probeInterval'.
+        '''
+        now = time.monotonic()
+        with self._lock:
+            unknown = [endpoint for endpoint in endpoints if endpoint not in self._routes
+                       and now - self._probeFailed.get(endpoint, -self.probeInterval)
+                       >= self.probeInterval]
+        if not unknown:
+            return
+        answers = self._parallel({endpoint: endpoint for endpoint in unknown},
+                                 "__ENDPOINTS__", self.timeout)
+        for endpoint in unknown:
+            if endpoint not in answers:
+                with self._lock:
+                    self._probeFailed[endpoint] = time.monotonic()
+                continue
+            try:
+                address = selectAddress(json.loads(answers[endpoint][0]),
+                                        context=self.context) or endpoint
+            except ValueError:
+                address = endpoint # old server without '__ENDPOINTS__'
+            with self._lock:
+                self._routes[endpoint] = address
+                self._probeFailed.pop(endpoint, None)
+
+    def _dropRoute(self, endpoint: str) -> None:
+        '''
+        Use the endpoint itself from now on: its local address did not answer.
+        '''
+        with self._lock:
+            self._routes[endpoint] = endpoint
+
+    def _acquire(self, address: str) -> zmq.Socket:
+        '''
+        Take an idle socket connected to 'address' or create one.
+        '''
+        with self._lock:
+            sockets = self._pool.get(address)
+            if sockets:
+                return sockets.pop()
+        sock = self.context.socket(zmq.REQ)
+        sock.setsockopt(zmq.LINGER, 0)
+        sock.connect(address)
+        return sock
+
+    def _release(self, address: str, sock: zmq.Socket) -> None:
+        '''
+        Give back a socket ready for a new request.
+        '''
+        with self._lock:
+            self._pool.setdefault(address, []).append(sock)
+
+    def _request(self, address: str, message: str, timeout: float) -> list:
+        '''
+        Send one request without retry. Raise TimeoutError if no answer.
+        '''
+        sock = self._acquire(address)
+        try:
+            sock.send_string(message)
+            if sock.poll(int(timeout * 1000)):
+                frames = sock.recv_multipart()
+                self._release(address, sock)
+                return frames
+        except zmq.ZMQError:
+            pass
+        sock.close(0) # a REQ socket without answer can not send again: reset it
+        raise TimeoutError(f"no answer from {address} to '{message}'")
+
+    def request(self, endpoint: str, message: str,
+                timeout: float | None = None, retries: int | None = None) -> list:
+        '''
+        Send 'message' to the server and return the frames of the answer.
+        Raise TimeoutError if the server does not answer after the retries.
+        '''
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        address = self._address(endpoint)
+        for attempt in range(retries + 1):
+            try:
+                return self._request(address, message, timeout)
+            except TimeoutError:
+                if address != endpoint: # the local address may be unusable
+                    self._dropRoute(endpoint)
+                    address = endpoint
+                if attempt == retries:
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+
+    def get(self, endpoint: str, codec: str = "json", source: str | None = None) -> dict:
+        '''
+        Return the dictionary of the server, or of one of its named sources.
+        '''
+        return _decodeData(self.request(endpoint, _getMessage(codec, source)), codec)
+
+    def getIfNewer(self, endpoint: str, version: int, codec: str = "json",
+                   source: str | None = None) -> tuple:
+        '''
+        Return (version, dictionary) if the server has data newer than
+        'version', else (version, None).
+        '''
+        message = _ifNewerMessage(version, codec, source)
+        return _decodeIfNewer(self.request(endpoint, message), codec)
+
+    def getSources(self, endpoint: str) -> dict:
+        '''
+        Return all the sources of a gateway server in one request:
+        name -> {'shotNumber', 'version', 'timestamp', 'data'}.
+        '''
+        return json.loads((self.request(endpoint, "__GET_ALL__"))[0])
+
+    def frame(self, endpoint: str):
+        '''
+        Return the last frame of the server (np.ndarray) or None.
+        '''
+        header, buffer = self.request(endpoint, "__FRAME__")
+        return frameFromMessage(header, buffer)
+
+    def history(self, endpoint: str, first: int, last: int | None = None) -> list:
+        '''
+        Return the last 'first' shots, or the shots from 'first' to 'last'.
+        '''
+        return json.loads(self.request(endpoint, _historyMessage(first, last))[0])
+
+    def stats(self, endpoint: str) -> dict:
+        '''
+        Return the counters of the server.
+        '''
+        return json.loads(self.request(endpoint, "__STATS__")[0])
+
+    def ping(self, endpoint: str, timeout: float | None = None) -> bool:
+        '''
+        Return True if the server answers '__PONG__'.
+        '''
+        try:
+            return self.request(endpoint, "__PING__", timeout, retries=0)[0] == b"__PONG__"
+        except TimeoutError:
+            return False
+
+    def _parallel(self, addresses: dict, message: str, timeout: float) -> dict:
+        '''
+        Send 'message' on one socket per server and poll all the sockets
+        together until 'timeout'.
+
+        Args:
+            addresses: (dict)
+                endpoint -> address to use.
+
+        Returns:
+            a dictionary endpoint -> frames for the servers that answered.
+        '''
+        results = {}
+        poller = zmq.Poller()
+        sent = {}
+        for endpoint, address in addresses.items():
+            sock = self._acquire(address)
+            try:
+                sock.send_string(message)
+            except zmq.ZMQError:
+                sock.close(0)
+                continue
+            sent[sock] = (endpoint, address)
+            poller.register(sock, zmq.POLLIN)
+
+        deadline = time.monotonic() + timeout
+        while sent and time.monotonic() < deadline:
+            remaining = max(deadline - time.monotonic(), 0)
+            for sock, _ in poller.poll(int(remaining * 1000)):
+                endpoint, address = sent.pop(sock)
+                poller.unregister(sock)
+                results[endpoint] = sock.recv_multipart()
+                self._release(address, sock)
+        for sock in sent: # no answer: reset the sockets
+            sock.close(0)
+        return results
+
+    def gather(self, endpoints: list, message: str = "__GET__",
+               timeout: float | None = None) -> dict:
+        '''
+        Send 'message' to all the servers at once and wait for all the answers.
+
+        Returns:
+            a dictionary endpoint -> frames of the answer, or a TimeoutError
+            for the servers that did not answer after the retries.
+        '''
+        timeout = self.timeout if timeout is None else timeout
+        pending = list(dict.fromkeys(endpoints))
+        if self.preferLocal:
+            self._resolve(pending)
+        results = {}
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff * 2**(attempt - 1))
+            with self._lock:
+                addresses = {endpoint: self._routes.get(endpoint, endpoint)
+                             for endpoint in pending}
+            results.update(self._parallel(addresses, message, timeout))
+            pending = [endpoint for endpoint in pending if endpoint not in results]
+            for endpoint in pending: # the local address may be unusable
+                if addresses[endpoint] != endpoint:
+                    self._dropRoute(endpoint)
+            if not pending:
+                break
+
+        for endpoint in pending:
+            results[endpoint] = TimeoutError(f"no answer from {endpoint} to '{message}'")
+        return {endpoint: results[endpoint] for endpoint in dict.fromkeys(endpoints)}
+
+    def getAll(self, endpoints: list, codec: str = "json",
+               timeout: float | None = None) -> dict:
+        '''
+        Return the dictionaries of many servers, queried in parallel.
+        The value is None for the servers that did not answer, rejected the
+        request or sent an answer that can not be decoded.
+        '''
+        message = "__GET__" if codec == "json" else f"__GET__ codec={codec}"
+        return _decodeAll(self.gather(endpoints, message, timeout), codec)
+
+    def close(self) -> None:
+        '''
+        Close all the sockets of the pool.
+        '''
+        with self._lock:
+            for sockets in self._pool.values():
+                for sock in sockets:
+                    sock.close(0)
+            self._pool.clear()
+
+
+class asyncDiagClient:
+
+    def __init__(self,
+                 timeout: float = 1.,
+                 retries: int = 2,
+                 backoff: float = 0.05,
+                 context: zmq.asyncio.Context | None = None):
+        '''
+        asyncio client of one or many diagServer, same requests as 'diagClient':
+            client = asyncDiagClient()
+            data = await client.get("tcp://10.0.1.57:1230")
+            allData = await client.getAll(endpoints)
+
+        Args:
+            timeout: (float)
+                time in s to wait for an answer.
+
+            retries: (int)
+                number of new attempts after a timeout.
+
+            backoff: (float)
+                wait before the first retry in s, doubled at each retry.
+
+            context: (zmq.asyncio.Context)
+                the zmq context. If None, the global asyncio context is used.
+        '''
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.context = context if context is not None else zmq.asyncio.Context.instance()
+        self._pool = {} # endpoint -> list of idle REQ sockets
+
+    def _acquire(self, endpoint: str) -> zmq.asyncio.Socket:
+        sockets = self._pool.get(endpoint)
+        if sockets:
+            return sockets.pop()
+        sock = self.context.socket(zmq.REQ)
+        sock.setsockopt(zmq.LINGER, 0)
+        sock.connect(endpoint)
+        return sock
+
+    async def request(self, endpoint: str, message: str,
+                      timeout: float | None = None, retries: int | None = None) -> list:
+        '''
+        Send 'message' to the server and return the frames of the answer.
+        Raise TimeoutError if the server does not answer after the retries.
+        '''
+        timeout = self.timeout if timeout is None else timeout
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            sock = self._acquire(endpoint)
+            try:
+                await sock.send_string(message)
+                frames = await asyncio.wait_for(sock.recv_multipart(), timeout)
+                self._pool.setdefault(endpoint, []).append(sock)
+                return frames
+            except (asyncio.TimeoutError, zmq.ZMQError):
+                sock.close(0) # a REQ socket without answer can not send again: reset it
+            if attempt < retries:
+                await asyncio.sleep(self.backoff * 2**attempt)
+        raise TimeoutError(f"no answer from {endpoint} to '{message}'")
+
+    async def get(self, endpoint: str, codec: str = "json", source: str | None = None) -> dict:
+        '''
+        Return the dictionary of the server, or of one of its named sources.
+        '''
+        return _decodeData(await self.request(endpoint, _getMessage(codec, source)), codec)
+
+    async def getIfNewer(self, endpoint: str, version: int, codec: str = "json",
+                         source: str | None = None) -> tuple:
+        '''
+        Return (version, dictionary) if the server has data newer than
+        'version', else (version, None).
+        '''
+        message = _ifNewerMessage(version, codec, source)
+        return _decodeIfNewer(await self.request(endpoint, message), codec)
+
+    async def getSources(self, endpoint: str) -> dict:
+        '''
+        Return all the sources of a gateway server in one request:
+        name -> {'shotNumber', 'version', 'timestamp', 'data'}.
+        '''
+        return json.loads((await self.request(endpoint, "__GET_ALL__"))[0])
+
+    async def frame(self, endpoint: str):
+        '''
+        Return the last frame of the server (np.ndarray) or None.
+        '''
+        header, buffer = await self.request(endpoint, "__FRAME__")
+        return frameFromMessage(header, buffer)
+
+    async def history(self, endpoint: str, first: int, last: int | None = None) -> list:
+        '''
+        Return the last 'first' shots, or the shots from 'first' to 'last'.
+        '''
+        return json.loads((await self.request(endpoint, _historyMessage(first, last)))[0])
+
+    async def stats(self, endpoint: str) -> dict:
+        '''
+        Return the counters of the server.
+        '''
+        return json.loads((await self.request(endpoint, "__STATS__"))[0])
+
+    async def gather(self, endpoints: list, message: str = "__GET__",
+                     timeout: float | None = None) -> dict:
+        '''
+        Send 'message' to all the servers concurrently.
+
+        Returns:
+            a dictionary endpoint -> frames of the answer, or a TimeoutError
+            for the servers that did not answer after the retries.
+        '''
+        endpoints = list(dict.fromkeys(endpoints))
+        answers = await asyncio.gather(*[self.request(endpoint, message, timeout)
+                                         for endpoint in endpoints],
+                                       return_exceptions=True)
+        return dict(zip(endpoints, answers))
+
+    async def getAll(self, endpoints: list, codec: str = "json",
+                     timeout: float | None = None) -> dict:
+        '''
+        Return the dictionaries of many servers, queried concurrently.
+        The value is None for the servers that did not answer, rejected the
+        request or sent an answer that can not be decoded.
+        '''
+        message = "__GET__" if codec == "json" else f"__GET__ codec={codec}"
+        return _decodeAll(await self.gather(endpoints, message, timeout), codec)
+
+    def close(self) -> None:
+        '''
+        Close all the sockets of the pool.
+        '''
+        for sockets in self._pool.values():
+            for sock in sockets:
+                sock.close(0)
+        self._pool.clear()
+
+
+if __name__ == "__main__":
+    client = diagClient(timeout=0.5)
+    print("Server answer:", client.get("tcp://localhost:1230"))
+    print("Server stats:", client.stats("tcp://localhost:1230"))
+    client.close()
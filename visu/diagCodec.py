@@ -0,0 +1,106 @@
+'''
+Codecs used by diagServer to encode the transmitted dictionaries.
+
+A codec turns a dictionary into a list of zmq frames and back:
+    'json':  one frame, numpy scalars are converted to python numbers and
+             numpy arrays to lists (readable by any client).
+    'numpy': a json header followed by one raw frame per numpy array, so the
+             arrays are sent with their dtype and shape, without text conversion.
+
+The client chooses the codec per request, ex: '__GET__ codec=numpy'.
+New codecs can be added with 'registerCodec'.
+'''
+
+import json
+import numpy as np
+
+
+def _jsonDefault(obj):
+    '''
+    Convert the numpy objects not handled by 'json.dumps'.
+    '''
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JsonCodec:
+    '''
+    Dictionary encoded as a single json frame.
+    '''
+    name = "json"
+
+    def encode(self, data: dict) -> list:
+        return [json.dumps(data, default=_jsonDefault).encode()]
+
+    def decode(self, frames: list) -> dict:
+        return json.loads(bytes(frames[0]))
+
+
+class NumpyCodec:
+    '''
+    Dictionary encoded as a json header and one raw frame per numpy array.
+    In the header, each array is replaced by:
+        {"__ndarray__": <index of the frame>, "dtype": <dtype>, "shape": <shape>}
+    where the index starts at 1 (frame 0 is the header).
+    '''
+    name = "numpy"
+
+    def encode(self, data: dict) -> list:
+        buffers = []
+
+        def replace(obj):
+            if isinstance(obj, np.ndarray):
+                array = np.ascontiguousarray(obj)
+                buffers.append(array)
+                return {"__ndarray__": len(buffers),
+                        "dtype": array.dtype.str,
+                        "shape": array.shape}
+            if isinstance(obj, dict):
+                return {key: replace(value) for key, value in obj.items()}
+            if isinstance(obj, (list, tuple)):
+                return [replace(value) for value in obj]
+            return obj
+
+        header = json.dumps(replace(data), default=_jsonDefault).encode()
+        return [header] + buffers
+
+    def decode(self, frames: list) -> dict:
+
+        def rebuild(obj):
+            if isinstance(obj, dict):
+                if "__ndarray__" in obj:
+                    array = np.frombuffer(frames[obj["__ndarray__"]],
+                                          dtype=np.dtype(obj["dtype"]))
+                    return array.reshape(obj["shape"])
+                return {key: rebuild(value) for key, value in obj.items()}
+            if isinstance(obj, list):
+                return [rebuild(value) for value in obj]
+            return obj
+
+        return rebuild(json.loads(bytes(frames[0])))
+
+
+CODECS = {}
+
+
+def registerCodec(codec) -> None:
+    '''
+    Add a codec, an object with a 'name' attribute and the methods
+    'encode(data) -> list of frames' and 'decode(frames) -> data'.
+    '''
+    CODECS[codec.name] = codec
+
+
+def getCodec(name: str):
+    '''
+    Return the codec registered with 'name'.
+    Raise KeyError if the codec does not exist.
+    '''
+    return CODECS[name]
+
+
+registerCodec(JsonCodec())
+registerCodec(NumpyCodec())
@@ -1,13 +1,220 @@
 import json
 import zmq
+import numpy as np
 import threading
 import time
 import os
+import socket
 import configparser
+from typing import NamedTuple
+from collections import OrderedDict, deque
+from visu.diagCodec import getCodec
 
 cfg = configparser.ConfigParser()
 
 
+def _copyData(obj) -> tuple:
+    '''
+    Copy the containers (dict, list, tuple) of the data and estimate its size.
+    The arrays are not copied.
+
+    Returns:
+        (copy, size in bytes): the size is the 'nbytes' of the arrays, the
+        length of the strings and 8 bytes for the other values.
+    '''
+    if isinstance(obj, dict):
+        copy, size = {}, 0
+        for key, value in obj.items():
+            copy[key], valueSize = _copyData(value)
+            size += len(str(key)) + valueSize
+        return copy, size
+    if isinstance(obj, (list, tuple)):
+        items = [_copyData(value) for value in obj]
+        copy = [item[0] for item in items]
+        return (copy if isinstance(obj, list) else tuple(copy)), sum(item[1] for item in items)
+    if isinstance(obj, np.ndarray):
+        return obj, obj.nbytes
+    if isinstance(obj, (str, bytes)):
+        return obj, len(obj)
+    return obj, 8
+
+
+class Snapshot(NamedTuple):
+    '''
+    Immutable state of the server data, built once by 'setData'.
+
+    Args:
+        version: (int)
+            increased by one at each 'setData'.
+        shotNumber: (int)
+            the shot number of the data.
+        timestamp: (float)
+            time of the 'setData'.
+        data: (dict)
+            the transmitted dictionary (copy of the dictionaries and lists
+            given to 'setData', the arrays are shared).
+        nbytes: (int)
+            approximate size of the data, used to bound the history.
+        encodings: (dict)
+            frames of the dictionary for each codec already used (see diagCodec).
+    '''
+    version: int
+    shotNumber: int
+    timestamp: float
+    data: dict
+    nbytes: int
+    encodings: dict
+
+    @classmethod
+    def build(cls, data: dict, version: int, shotNumber: int) -> "Snapshot":
+        '''
+        Copy the dictionary and return the snapshot. Nothing is encoded yet:
+        each codec encodes the snapshot when it is first asked (see 'encoded').
+        '''
+        data, nbytes = _copyData(data)
+        return cls(version, shotNumber, time.time(), data, nbytes, {})
+
+    @property
+    def payload(self) -> bytes:
+        '''
+        property that return the json encoded dictionary (encoded once).
+        '''
+        return self.encoded("json")[0]
+
+    def encoded(self, codec: str = "json") -> list:
+        '''
+        Return the frames of the dictionary encoded with 'codec'.
+        Each codec is used at most once per snapshot.
+        Raise KeyError if the codec does not exist.
+        '''
+        frames = self.encodings.get(codec)
+        if frames is None:
+            frames = getCodec(codec).encode(self.data)
+            self.encodings[codec] = frames
+        return frames
+
+
+class ServerStats:
+    '''
+    Lightweight counters of a diagServer, read with 'diagServer.stats()'
+    or with the '__STATS__' request.
+
+    Args:
+        window: (float)
+            duration in s used to compute the request rates.
+        samples: (int)
+            number of latencies / encode times kept for the percentiles.
+    '''
+
+    def __init__(self, window: float = 10., samples: int = 1000):
+        self._lock = threading.Lock() # updated by the server and 'setData' threads
+        self.window = window
+        self.samples = samples
+        self.startTime = time.time()
+        self.lastSetData = None
+        self.setDataCount = 0
+        self.requestCount = 0
+        self.droppedReplies = 0
+        self.bytesOut = 0
+        self.bytesPublished = 0
+        self._encodeTimes = deque(maxlen=samples)
+        self._commands = {} # command -> [count, request times, latencies]
+        self._clients = {}  # ROUTER identity -> time of the last request
+
+    def addRequest(self, command: str, latency: float, nbytes: int,
+                   identity: bytes | None = None) -> None:
+        '''
+        Count a request answered by the server.
+        '''
+        now = time.time()
+        with self._lock:
+            self.requestCount += 1
+            self.bytesOut += nbytes
+            if command not in self._commands:
+                self._commands[command] = [0, deque(maxlen=self.samples),
+                                           deque(maxlen=self.samples)]
+            counter = self._commands[command]
+            counter[0] += 1
+            counter[1].append(now)
+            counter[2].append(latency)
+            if identity is not None:
+                self._clients[identity] = now
+
+    def addSetData(self) -> None:
+        '''
+        Count a 'setData'.
+        '''
+        with self._lock:
+            self.setDataCount += 1
+            self.lastSetData = time.time()
+
+    def addEncode(self, encodeTime: float) -> None:
+        '''
+        Count the time used to encode a snapshot with a codec.
+        '''
+        with self._lock:
+            self._encodeTimes.append(encodeTime)
+
+    def addPublished(self, nbytes: int) -> None:
+        '''
+        Count the bytes sent on the publisher.
+        '''
+        with self._lock:
+            self.bytesPublished += nbytes
+
+    def addDropped(self) -> None:
+        '''
+        Count an answer dropped because the client did not read it.
+        '''
+        with self._lock:
+            self.droppedReplies += 1
+
+    @staticmethod
+    def _percentiles(values) -> dict:
+        '''
+        Percentiles in ms of a list of durations in s.
+        '''
+        if len(values) == 0:
+            return {}
+        p50, p90, p99 = np.percentile(values, [50, 90, 99]) * 1000
+        return {"p50": round(p50, 4), "p90": round(p90, 4), "p99": round(p99, 4),
+                "max": round(max(values) * 1000, 4)}
+
+    def asDict(self, clients: bool = True) -> dict:
+        '''
+        Return the counters as a json serializable dictionary.
+
+        Args:
+            clients: (bool)
+                False if the server can not identify its clients (REP socket).
+        '''
+        now = time.time()
+        window = min(self.window, max(now - self.startTime, 1e-9))
+        with self._lock:
+            commands = {
+                command: {
+                    "count": count,
+                    "rate": sum(1 for t in times if now - t <= window) / window,
+                    "latency_ms": self._percentiles(list(latencies))
+                }
+                for command, (count, times, latencies) in self._commands.items()
+            }
+            encodeTimes = list(self._encodeTimes)
+            activeClients = sum(1 for t in self._clients.values() if now - t <= 60)
+            return {
+                "uptime": now - self.startTime,
+                "requests": self.requestCount,
+                "commands": commands,
+                "bytesOut": self.bytesOut,
+                "bytesPublished": self.bytesPublished,
+                "droppedReplies": self.droppedReplies,
+                "clients": activeClients if clients else None,
+                "setData": self.setDataCount,
+                "sinceLastSetData": None if self.lastSetData is None else now - self.lastSetData,
+                "encode_ms": self._percentiles(encodeTimes)
+            }
+
+
 class diagServer(threading.Thread):
 
     def __init__(self,
@@ -15,11 +222,70 @@ class diagServer(threading.Thread):
                  address: str = "tcp://*:1110",
                  host: str = "localhost",
                  data: dict | None = None, 
-                 name: str = "default"):
+                 name: str = "default",
+                 pubAddress: str | None = None,
+                 mode: str = "rep",
+                 historyLength: int = 100,
+                 historyMaxBytes: int = 64 * 1024**2,
+                 verbose: bool = False,
+                 localAddress: str | None = None,
+                 localPubAddress: str | None = None,
+                 context: zmq.Context | None = None):
         '''
         Visu server made to transmit a dictionnay 'data' to any client sending '__GET__'
         to the server.
 
+        If 'pubAddress' is given, the server also binds a PUB socket and publishes
+        every new dictionary given to 'setData', so clients can subscribe instead of
+        polling '__GET__'. Each publication is a 3 parts message:
+            [b'__DATA__/', header, dictionary]
+        where 'header' is a json dictionary with the keys 'name', 'shotNumber',
+        'version' and 'timestamp', and 'dictionary' the json encoded data.
+
+        'setData' copies the dictionary into an immutable 'Snapshot' with a version
+        number. All requests are answered from this snapshot, and a client can send
+        '__GET_IF_NEWER__ <version>' to receive the data only if it changed.
+        '__GET__' and '__GET_IF_NEWER__' accept a 'codec=<name>' option to choose how
+        the dictionary is encoded (see diagCodec): 'json' (default) or 'numpy', which
+        sends numpy arrays as raw frames. Each codec encodes a snapshot at most once,
+        when it is first needed: if all the clients use 'numpy', the json is never
+        built. The arrays of the dictionary are not copied, they must not be
+        modified after 'setData'.
+
+        With mode='router', the server uses a ROUTER socket instead of REP:
+        requests from many clients (REQ or DEALER) are interleaved and answered
+        from the snapshot without blocking, so a slow client does not stall the
+        others. In both modes 'stop' goes through an inproc control pipe.
+
+        The last snapshots are kept in a ring buffer keyed by shot number (at most
+        'historyLength' shots and about 'historyMaxBytes' of data), so a client
+        that missed some shots can get them back in one reply with '__HISTORY__'.
+
+        Request rates, latencies, encode times and bytes sent are counted in a
+        'ServerStats', available with the 'stats' method or the '__STATS__' request.
+
+        For clients running on the same machine, the sockets can also be bound to a
+        local endpoint ('localAddress', 'localPubAddress'): 'ipc://<path>' (unix socket)
+        or 'inproc://<name>' (same process, clients must use the server 'context').
+        '__ENDPOINTS__' returns all the endpoints with the server hostname, pid and
+        context, and 'selectAddress' picks the fastest one usable by the client.
+
+        Many diagnostics can share the same server (gateway): 'register' adds a
+        named source with its own snapshot, updated with 'setData(data, source=name)'
+        or the returned 'diagSource'. The clients choose the source with
+        '__GET__ <name>' (or the 'source=<name>' option of '__GET_IF_NEWER__'
+        and '__VERSION__') and get all the sources in one reply with '__GET_ALL__'.
+        The sources are published on the topic '__SRC__/<name>/' (see 'topicOf'):
+        no topic is a prefix of another one, so a subscriber of the main data or
+        of one source only receives what it asked for ('__SRC__/' for all the sources).
+
+        Raw images can be given with 'setFrame'. They are sent to clients sending
+        '__FRAME__' (and published on the '__FRAME__' topic) as 2 parts:
+            [header, buffer]
+        where 'header' is a json dictionary with 'dtype', 'shape', 'strides',
+        'shotNumber' and 'timestamp', and 'buffer' the raw bytes of the array, sent
+        without copy. Use 'frameFromMessage' to rebuild the array on the client side.
+
         To start the server, create an instance of the server and use the 'start' method
         to assing its own thread:
             serv = diagServer()
@@ -45,16 +311,85 @@ class diagServer(threading.Thread):
             
             name: (str)
                 the name gave to the server.
+
+            pubAddress: (str)
+                the publisher address, ex: 'tcp://*:1111'.
+                if None (default) no publisher is created.
+
+            mode: (str)
+                'rep' (default) or 'router'.
+
+            historyLength: (int)
+                maximum number of shots kept in the history. 0 to disable it.
+
+            historyMaxBytes: (int)
+                maximum size of the data kept in the history (see 'Snapshot.nbytes').
+
+            verbose: (bool)
+                if True, print every received message.
+
+            localAddress: (str)
+                additional address of the server for local clients,
+                ex: 'ipc:///tmp/visu-spectro' or 'inproc://visu-spectro'.
+
+            localPubAddress: (str)
+                additional address of the publisher for local clients.
+
+            context: (zmq.Context)
+                the zmq context to use, needed to share inproc endpoints
+                with clients. If None, the server creates its own context.
         '''
         
         super().__init__() # heritage from Thread
         self._address = address
         self.name = name
         self._host = host
-        self._data = data or {}
-        self.context = zmq.Context()
-        self.socket = self.context.socket(zmq.REP)
+        self.verbose = verbose
+        self._stats = ServerStats()
+        self._snapshot = Snapshot.build(data or {}, version=0, shotNumber=0)
+        self._sources = {} # name -> Snapshot of the registered sources
+        self._dataLock = threading.Lock() # 'setData' may be called from any thread
+        self._history = OrderedDict() # shotNumber -> Snapshot, oldest first
+        self._historyBytes = 0
+        self.historyLength = historyLength
+        self.historyMaxBytes = historyMaxBytes
+        self._ownContext = context is None # only close the context we created
+        self.context = context if context is not None else zmq.Context()
+        if mode not in ("rep", "router"):
+            raise ValueError(f"unknown mode '{mode}', use 'rep' or 'router'")
+        self._mode = mode
+        if mode == "router":
+            self.socket = self.context.socket(zmq.ROUTER)
+            # raise instead of silently dropping the answers to a client
+            # whose queue is full or which is gone (counted in the stats)
+            self.socket.setsockopt(zmq.ROUTER_MANDATORY, 1)
+        else:
+            self.socket = self.context.socket(zmq.REP)
+        self.socket.setsockopt(zmq.LINGER, 0)
         self.socket.bind(self._address)
+        self._localAddress = localAddress
+        if localAddress is not None:
+            self.socket.bind(localAddress)
+
+        # control pipe used by 'stop' to wake up the server thread
+        controlAddress = f"inproc://diagServer-control-{id(self)}"
+        self._control = self.context.socket(zmq.PAIR)
+        self._control.bind(controlAddress)
+        self._controlClient = self.context.socket(zmq.PAIR)
+        self._controlClient.connect(controlAddress)
+
+        self._pubAddress = pubAddress
+        self.pubSocket = None
+        if pubAddress is not None:
+            self.pubSocket = self.context.socket(zmq.PUB)
+            self.pubSocket.bind(self._pubAddress)
+        self._localPubAddress = localPubAddress
+        if localPubAddress is not None:
+            if self.pubSocket is None:
+                self.pubSocket = self.context.socket(zmq.PUB)
+            self.pubSocket.bind(localPubAddress)
+        self._pubLock = threading.Lock() # the publisher is used from the caller threads
+        self._frame = None # (header, array) of the last frame
 
         self._parent = parent
         if parent is not None:
@@ -70,6 +405,34 @@ class diagServer(threading.Thread):
         '''
         return self._address
 
+    @property
+    def mode(self) -> str:
+        '''
+        property to avoid 'mode' modification.
+        '''
+        return self._mode
+
+    @property
+    def pubAddress(self) -> str | None:
+        '''
+        property to avoid 'pubAddress' modification.
+        '''
+        return self._pubAddress
+
+    @property
+    def localAddress(self) -> str | None:
+        '''
+        property to avoid 'localAddress' modification.
+        '''
+        return self._localAddress
+
+    @property
+    def localPubAddress(self) -> str | None:
+        '''
+        property to avoid 'localPubAddress' modification.
+        '''
+        return self._localPubAddress
+
     @property
     def host(self):
         '''
@@ -83,7 +446,21 @@ class diagServer(threading.Thread):
         property to avoid 'data' direct modification.
         To modify the 'data', use 'setData'.
         '''
-        return self._data
+        return self._snapshot.data
+
+    @property
+    def snapshot(self) -> Snapshot:
+        '''
+        property that return the last snapshot built by 'setData'.
+        '''
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        '''
+        property that return the version of the data.
+        '''
+        return self._snapshot.version
     
     @property
     def running(self):
@@ -92,14 +469,53 @@ class diagServer(threading.Thread):
         '''
         return self._running
 
+    @property
+    def shotNumber(self) -> int:
+        '''
+        property that return the shot number of the last 'setData'.
+        '''
+        return self._snapshot.shotNumber
+
     @property
     def addressForClient(self):
         '''
         property that return the 'address' for the client.
         'tcp://<IP server>:port'
         '''
-        proto, rest = self.address.split("://")
-        host, port = rest.split(":")
+        return self._clientAddress(self.address)
+
+    @property
+    def pubAddressForClient(self) -> str:
+        '''
+        property that return the 'pubAddress' for the client,
+        or an empty string if there is no publisher.
+        '''
+        if self.pubAddress is None:
+            return self.localPubAddress or ""
+        return self._clientAddress(self.pubAddress)
+
+    @property
+    def endpoints(self) -> dict:
+        '''
+        property that return all the addresses for the clients, with the
+        hostname, pid and zmq context of the server (see 'selectAddress'):
+            {'hostname': ..., 'pid': ..., 'context': ..., 'rep': [addresses], 'pub': [addresses]}
+        '''
+        rep = [self._clientAddress(address)
+               for address in (self.address, self.localAddress) if address is not None]
+        pub = [self._clientAddress(address)
+               for address in (self.pubAddress, self.localPubAddress) if address is not None]
+        return {"hostname": socket.gethostname(), "pid": os.getpid(),
+                "context": self.context.underlying, "rep": rep, "pub": pub}
+
+    def _clientAddress(self, address: str) -> str:
+        '''
+        Convert a bind address to the address a client has to connect to.
+        '''
+        proto, rest = address.split("://", 1)
+        if proto in ("ipc", "inproc"): # local endpoints are the same for the client
+            return address
+        host, port = rest.rsplit(":", 1)
 
         if host == "*":         # if the server is listening everywhere
             host = self.host    # use the server host refered in the class
@@ -119,11 +535,300 @@ class diagServer(threading.Thread):
 
 
 
-    def setData(self, newData: dict) -> None:
+    def register(self, name: str, data: dict | None = None) -> "diagSource":
+        '''
+        Add a named source of data to the server.
+
+        Args:
+            name: (str)
+                the name used by the clients, ex: '__GET__ spectro1'.
+                It can not contain spaces, '=' or '/'.
+
+            data: (dict)
+                the first dictionary of the source.
+
+        Returns:
+            a 'diagSource' to update the data of this source.
+        '''
+        checkSourceName(name)
+        with self._dataLock:
+            if name in self._sources:
+                raise ValueError(f"source '{name}' already registered")
+            self._sources[name] = Snapshot.build(data or {}, version=0, shotNumber=0)
+        return diagSource(self, name)
+
+    def unregister(self, name: str) -> None:
+        '''
+        Remove a named source of data.
+        '''
+        with self._dataLock:
+            self._sources.pop(name, None)
+
+    @property
+    def sources(self) -> list:
+        '''
+        property that return the names of the registered sources.
+        '''
+        return list(self._sources)
+
+    def _snapshotOf(self, source: str | None) -> Snapshot:
+        '''
+        Return the snapshot of a source (the main data if None).
+        Raise KeyError if the source is not registered.
+        '''
+        if source is None:
+            return self._snapshot
+        return self._sources[source]
+
+    def setData(self, newData: dict, shotNumber: int | None = None,
+                source: str | None = None) -> None:
         '''
         Set a new dictionary to transmit.
+        If a publisher exists, the dictionary is also published to the subscribers.
+
+        Args:
+            newData: (dict)
+                the dictionnary to transmit.
+
+            shotNumber: (int)
+                the shot number of the data. If None, the previous
+                shot number is incremented.
+
+            source: (str)
+                the name of a registered source (see 'register').
+                If None, the main data of the server is set.
+                Only the main data is kept in the history.
+        '''
+        with self._dataLock:
+            previous = self._snapshotOf(source)
+            if shotNumber is None:
+                shotNumber = previous.shotNumber + 1
+            snapshot = Snapshot.build(newData, previous.version + 1, shotNumber)
+            self._stats.addSetData()
+            # single assignment, seen at once by the server thread
+            if source is None:
+                self._snapshot = snapshot
+                self._addToHistory(snapshot)
+            else:
+                self._sources[source] = snapshot
+
+        if self.pubSocket is not None:
+            self._publish(snapshot, source)
+
+    def stats(self) -> dict:
+        '''
+        Return the counters of the server (see 'ServerStats.asDict').
+        '''
+        return self._stats.asDict(clients=self.mode == "router")
+
+    def _encoded(self, snapshot: Snapshot, codec: str = "json") -> list:
+        '''
+        Return the frames of a snapshot encoded with 'codec' and count the
+        encoding time the first time.
+        Raise KeyError if the codec does not exist.
+        '''
+        frames = snapshot.encodings.get(codec)
+        if frames is None:
+            t0 = time.perf_counter()
+            frames = snapshot.encoded(codec)
+            self._stats.addEncode(time.perf_counter() - t0)
+        return frames
+
+    def _addToHistory(self, snapshot: Snapshot) -> None:
+        '''
+        Add a snapshot to the history and drop the oldest shots when the
+        history is too long or too big. Called with '_dataLock' held.
+        '''
+        if self.historyLength <= 0:
+            return
+        old = self._history.pop(snapshot.shotNumber, None) # same shot sent again
+        if old is not None:
+            self._historyBytes -= old.nbytes
+        self._history[snapshot.shotNumber] = snapshot
+        self._historyBytes += snapshot.nbytes
+
+        while len(self._history) > 1 and (len(self._history) > self.historyLength
+                                          or self._historyBytes > self.historyMaxBytes):
+            _, old = self._history.popitem(last=False)
+            self._historyBytes -= old.nbytes
+
+    def history(self, first: int | None = None, last: int | None = None) -> list:
+        '''
+        Return the snapshots of the history, oldest first.
+
+        Args:
+            first: (int)
+                first shot number. If None, start at the oldest shot.
+            last: (int)
+                last shot number (included). If None, end at the newest shot.
+        '''
+        with self._dataLock:
+            snapshots = list(self._history.values())
+        return [snap for snap in snapshots
+                if (first is None or snap.shotNumber >= first)
+                and (last is None or snap.shotNumber <= last)]
+
+    def _historyPayload(self, snapshots: list) -> bytes:
+        '''
+        Build the json list sent on '__HISTORY__' from the snapshots, each
+        dictionary is encoded in json at most once.
+        '''
+        items = [b'{"shotNumber": %d, "version": %d, "timestamp": %r, "data": %s}'
+                 % (snap.shotNumber, snap.version, snap.timestamp, self._encoded(snap)[0])
+                 for snap in snapshots]
+        return b"[" + b", ".join(items) + b"]"
+
+    def _allSourcesPayload(self) -> bytes:
+        '''
+        Build the json dictionary sent on '__GET_ALL__' from the json
+        encoded snapshots: {name: {'shotNumber', 'version', 'timestamp', 'data'}}.
+        The main data is included (with the server name) once it has been set.
+        '''
+        snapshots = list(self._sources.items())
+        if self._snapshot.version > 0 or not snapshots:
+            snapshots.insert(0, (self.name, self._snapshot))
+        items = [b'%s: {"shotNumber": %d, "version": %d, "timestamp": %r, "data": %s}'
+                 % (json.dumps(name).encode(), snap.shotNumber, snap.version,
+                    snap.timestamp, self._encoded(snap)[0])
+                 for name, snap in snapshots]
+        return b"{" + b", ".join(items) + b"}"
+
+    def setFrame(self, frame: np.ndarray, shotNumber: int | None = None) -> None:
+        '''
+        Set a new raw frame to transmit on '__FRAME__'.
+        The array is sent without copy: it must not be modified afterwards.
+        If a publisher exists, the frame is also published to the subscribers.
+
+        Args:
+            frame: (np.ndarray)
+                the image to transmit.
+
+            shotNumber: (int)
+                the shot number of the frame. If None, the shot number
+                of the last 'setData' is used.
+        '''
+        if not (frame.flags.c_contiguous or frame.flags.f_contiguous):
+            frame = np.ascontiguousarray(frame) # zmq needs a single buffer
+        if shotNumber is None:
+            shotNumber = self._snapshot.shotNumber
+
+        header = json.dumps({
+            "dtype": frame.dtype.str,
+            "shape": frame.shape,
+            "strides": frame.strides,
+            "shotNumber": shotNumber,
+            "timestamp": time.time()
+        }).encode()
+        self._frame = (header, frame) # single assignment, seen at once by the server thread
+
+        if self.pubSocket is not None:
+            with self._pubLock:
+                if not self.pubSocket.closed:
+                    self.pubSocket.send_multipart([b"__FRAME__", header, frame],
+                                                  copy=False)
+                    self._stats.addPublished(len(header) + frame.nbytes)
+
+    def _publish(self, snapshot: Snapshot, source: str | None = None) -> None:
+        '''
+        Publish the snapshot on the PUB socket with its header,
+        on the topic of the main data or of the source (see 'topicOf').
+        '''
+        topic = topicOf(source)
+        header = {
+            "name": self.name if source is None else source,
+            "shotNumber": snapshot.shotNumber,
+            "version": snapshot.version,
+            "timestamp": snapshot.timestamp
+        }
+        with self._pubLock:
+            if self.pubSocket is None or self.pubSocket.closed:
+                return
+            header = json.dumps(header).encode()
+            payload = self._encoded(snapshot)[0]
+            self.pubSocket.send_multipart([topic, header, payload])
+            self._stats.addPublished(len(header) + len(payload))
+
+    def _reply(self, message: str) -> list:
         '''
-        self._data = newData
+        Build the answer to a client message.
+        The answer is taken from the current snapshot, so it never waits for
+        the data producer.
+
+        Args:
+            message: (str)
+                the message received from the client.
+
+        Returns:
+            the list of frames to send back.
+        '''
+        command, args, options = _parseMessage(message)
+        try:
+            # send the dictionnary on message '__GET__'
+            if command == "__GET__":
+                source = options.get("source", args[0] if args else None)
+                snapshot = self._snapshotOf(source) # same snapshot for the whole request
+                return self._encoded(snapshot, options.get("codec", "json"))
+
+            elif command == "__GET_IF_NEWER__":
+                source = options.get("source", args[1] if len(args) > 1 else None)
+                snapshot = self._snapshotOf(source)
+                clientVersion = int(args[0])
+                version = str(snapshot.version).encode()
+                if snapshot.version > clientVersion:
+                    return [version] + self._encoded(snapshot, options.get("codec", "json"))
+                return [version, b"__NOT_MODIFIED__"]
+
+            elif command == "__HISTORY__":
+                args = [int(arg) for arg in args]
+                if len(args) == 1:
+                    snapshots = self.history()[-args[0]:] if args[0] > 0 else []
+                elif len(args) == 2:
+                    snapshots = self.history(args[0], args[1])
+                else:
+                    return [b"unable to understand the demande"]
+                return [self._historyPayload(snapshots)]
+
+            elif command == "__VERSION__":
+                source = options.get("source", args[0] if args else None)
+                return [str(self._snapshotOf(source).version).encode()]
+
+        except (IndexError, ValueError, KeyError): # missing or wrong argument
+            return [b"unable to understand the demande"]
+
+        if command == "__GET_ALL__":
+            return [self._allSourcesPayload()]
+
+        elif command == "__SOURCES__":
+            return [json.dumps(self.sources).encode()]
+
+        elif command == "__FRAME__":
+            frame = self._frame
+            if frame is None:
+                return [b"{}", b""]
+            return list(frame)
+
+        elif command == "__STATS__":
+            return [json.dumps(self.stats()).encode()]
+
+        elif command == "__NAME__":
+            return [self.name.encode()]
+
+        elif command == "__DEVICE__":
+            return [b"__CAMERA__"]
+
+        elif command == "__FREEDOM__":
+            return [b"0"]
+
+        elif command == "__PUBLISHER__":
+            return [self.pubAddressForClient.encode()]
+
+        elif command == "__ENDPOINTS__":
+            return [json.dumps(self.endpoints).encode()]
+
+        elif command == "__PING__":
+            return [b"__PONG__"]
+
+        return [b"unable to understand the demande"]
 
     def run(self) -> None:
         '''
@@ -131,86 +836,314 @@ class diagServer(threading.Thread):
         The server is waiting to receive messages from clients.
         keywords are:
             '__GET__': transmit the dictionary
+                         ('__GET__ codec=numpy' to choose the codec)
+            '__GET__ <name>': transmit the dictionary of a registered source
+            '__GET_ALL__': transmit all the sources as a json dictionary
+                         name -> {'shotNumber', 'version', 'timestamp', 'data'}
+            '__SOURCES__': transmit the names of the registered sources
             '__STOP__': stop the server
             '__NAME'__: transmit the name attribute
             '__PING__': answer '__PONG__'
             '__DEVICE__': answer  'diagnostics'
             '__FREEDOM__' : degree of freedom. 0 for a camera.
+            '__PUBLISHER__': answer the publisher address ('' if none)
+            '__FRAME__': transmit the last frame as [header, buffer]
+                         ([b'{}', b''] if there is no frame)
+            '__VERSION__ [<name>]': transmit the version of the dictionary
+            '__GET_IF_NEWER__ <version> [<name>]': transmit [version, dictionary] if the
+                         dictionary is newer than <version>, else
+                         [version, b'__NOT_MODIFIED__']
+            '__HISTORY__ <n>': transmit the last <n> shots of the history
+            '__HISTORY__ <from> <to>': transmit the shots from <from> to <to> (included)
+                         the history is a json list of dictionaries with keys
+                         'shotNumber', 'version', 'timestamp' and 'data'
+            '__STATS__': transmit the counters of the server as json
+            '__ENDPOINTS__': transmit the addresses of the server as json
         '''
-        print(f"[diagServer {self.name}] Running on {self.address}")
+        print(f"[diagServer {self.name}] Running on {self.address} ({self.mode})")
+
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        poller.register(self._control, zmq.POLLIN)
 
         while self._running.is_set():
             
             try:
-                
-                if self.socket.poll(100): # poll for 100 ms
-                    message = self.socket.recv_string()
-                    print(f"[diagServer] Received: '{message}'")
-                    
-                    # stop the thread on message '__STOP__'
-                    if message == "__STOP__":
-                        self.socket.send_string("stopping") # interrupt the loop
-                        break
-                    
-                    # send the dictionnary on message '__GET__'
-                    elif message == "__GET__":
-                        response = json.dumps(self.data)
-                        self.socket.send_string(response)
-                    
-                    elif message == "__NAME__":
-                        self.socket.send_string(self.name)
-                    
-                    elif message == "__DEVICE__":
-                        self.socket.send_string("__CAMERA__")
-                    
-                    elif message == "__FREEDOM__":
-                        self.socket.send_string("0")
-                    
-                    elif message == "__PING__":
-                        self.socket.send_string("__PONG__")
-                    
-                    else :
-                        self.socket.send_string("unable to understand the demande")
+                events = dict(poller.poll())
 
-                else:
-                    time.sleep(0.01) # wait 10 ms
+                if self._control in events: # message from 'stop'
+                    self._control.recv()
+                    break
+
+                if self.socket in events:
+                    if self.mode == "router":
+                        stop = self._serveRouter()
+                    else:
+                        stop = self._serveRep()
+                    if stop:
+                        break
 
             except zmq.error.ContextTerminated:
                 break
 
+        self._close()
+
+    def _close(self) -> None:
+        '''
+        Close the sockets, and the context if the server created it.
+        Called by the server thread at its end, or by 'stop' if the server
+        was never started.
+        '''
+        if self.socket.closed:
+            return
         print(f"[diagServer {self.name}] Closing socket...")
         self.socket.close(0) # close the server
-        self.context.term() # close the context
+        self._control.close(0)
+        self._controlClient.close(0)
+        with self._pubLock:
+            if self.pubSocket is not None:
+                self.pubSocket.close(0) # close the publisher
+        if self._ownContext:
+            self.context.term() # close the context
         print(f"[diagServer {self.name}] Stopped")
 
+    def _serveRep(self) -> bool:
+        '''
+        Answer one request on the REP socket.
+        Return True if the server has to stop.
+        '''
+        message = self.socket.recv().decode(errors="replace")
+        t0 = time.perf_counter()
+        if self.verbose:
+            print(f"[diagServer] Received: '{message}'")
+
+        # stop the thread on message '__STOP__'
+        if message == "__STOP__":
+            self.socket.send_string("stopping") # interrupt the loop
+            return True
+
+        reply = self._reply(message)
+        self.socket.send_multipart(reply, copy=False)
+        self._stats.addRequest(_command(message), time.perf_counter() - t0,
+                               _nbytes(reply))
+        return False
+
+    def _serveRouter(self) -> bool:
+        '''
+        Answer all the pending requests on the ROUTER socket.
+        The answers are sent without blocking: if a client does not read
+        its answers, they are dropped instead of stalling the other clients.
+        Return True if the server has to stop.
+        '''
+        while True:
+            try:
+                frames = self.socket.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return False
+
+            # envelope: identity (+ empty delimiter for REQ clients)
+            if b"" in frames:
+                split = frames.index(b"") + 1
+            else:
+                split = 1 # DEALER client without delimiter
+            envelope, request = frames[:split], frames[split:]
+            message = request[0].decode(errors="replace") if request else ""
+            t0 = time.perf_counter()
+            if self.verbose:
+                print(f"[diagServer] Received: '{message}'")
+
+            if message == "__STOP__":
+                reply = [b"stopping"]
+            else:
+                reply = self._reply(message)
+
+            try:
+                self.socket.send_multipart(envelope + reply, zmq.NOBLOCK, copy=False)
+            except zmq.Again:
+                self._stats.addDropped() # client queue full: drop the answer
+            except zmq.ZMQError as e:
+                if e.errno != zmq.EHOSTUNREACH:
+                    raise
+                self._stats.addDropped() # client disconnected
+            self._stats.addRequest(_command(message), time.perf_counter() - t0,
+                                   _nbytes(reply), identity=envelope[0])
+
+            if message == "__STOP__":
+                return True
+
     def stop(self) -> None:
         """
         Proper way to stop the thread where the server is running.
-        The function send a '__STOP__' message to the server,
-        which then close itself. To do so, the function create
-        a client that will send the message, wait for the server to
-        stop and then close itself.
+        The function send a message to the server thread through an
+        inproc control pipe, then wait for the server to stop.
+        If the server was never started, its sockets are closed here.
         """
         print("[diagServer] Stopping...")
 
-        # create a client ZMQ
-        ctx = zmq.Context()
-        sock = ctx.socket(zmq.REQ)
-        print(self.address)
-        sock.connect(self.addressForClient)
+        if not self._controlClient.closed: # else the server is already closed
+            try:
+                self._controlClient.send(b"__STOP__", zmq.NOBLOCK)
+            except zmq.ZMQError as e:
+                print(f"[diagServer {self.name}] Stop error:", e)
 
-        try:
-            # try to send '__STOP__' to the server
-            sock.send_string("__STOP__")
-            sock.recv_string()  # response is mandatory in REP
-        except Exception as e:
-            print(f"[diagServer {self.name}] Stop error:", e)
+        self._running.clear() # update the flag
+        if self.is_alive():
+            self.join() # wait until the thrad terminates
+        elif self.ident is None: # never started: no thread to close the sockets
+            self._close()
 
-        sock.close(0) # close the client
-        ctx.term() # close the client context
+class diagSource:
 
-        self._running.clear() # update the flag
-        self.join() # wait until the thrad terminates
+    def __init__(self, server, name: str):
+        '''
+        Handle on a named source of a server, returned by 'register'.
+
+            spectro = serv.register("spectro1")
+            spectro.setData(newData)
+
+        Args:
+            server: (diagServer or diagServerProcess)
+                the server hosting the source.
+            name: (str)
+                the name of the source.
+        '''
+        self._server = server
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        '''
+        property to avoid 'name' modification.
+        '''
+        return self._name
+
+    def setData(self, newData: dict, shotNumber: int | None = None) -> None:
+        '''
+        Set a new dictionary for this source (see 'diagServer.setData').
+        '''
+        self._server.setData(newData, shotNumber, source=self._name)
+
+
+def checkSourceName(name: str) -> None:
+    '''
+    Raise ValueError if 'name' can not be the name of a source: it is used
+    in the messages (no spaces or '=') and in the topics (no '/').
+    '''
+    if not name or len(name.split()) != 1 or "=" in name or "/" in name:
+        raise ValueError(f"invalid source name '{name}'")
+
+
+def topicOf(source: str | None = None) -> bytes:
+    '''
+    Return the PUB topic of the main data (source None) or of a named source:
+    b'__DATA__/' or b'__SRC__/<name>/'. A SUB socket subscribing to one topic
+    does not receive the others.
+    '''
+    if source is None:
+        return b"__DATA__/"
+    return b"__SRC__/" + source.encode() + b"/"
+
+
+def isLocalHost(host: str) -> bool:
+    '''
+    Return True if 'host' (name or IP) is this machine.
+    '''
+    if host in ("", "*", "localhost", "127.0.0.1", "::1"):
+        return True
+    try:
+        hostIp = socket.gethostbyname(host)
+        if hostIp.startswith("127."):
+            return True
+        return hostIp in socket.gethostbyname_ex(socket.gethostname())[2]
+    except OSError:
+        return False
+
+
+def selectAddress(endpoints: dict, kind: str = "rep",
+                  context: zmq.Context | None = None) -> str:
+    '''
+    Choose the fastest address usable by this client from the answer of
+    '__ENDPOINTS__': inproc if the server uses the same zmq context (so the
+    same process), ipc if it is on the same machine, else the network address.
+
+    Args:
+        endpoints: (dict)
+            the decoded answer of '__ENDPOINTS__' (or 'diagServer.endpoints').
+        kind: (str)
+            'rep' for the request socket, 'pub' for the publisher.
+        context: (zmq.Context)
+            the context of the client sockets. If None, inproc is never chosen:
+            an inproc address only works inside the context that binds it.
+
+    Returns:
+        the address, or '' if the server has no such socket.
+    '''
+    addresses = endpoints.get(kind, [])
+    sameHost = endpoints.get("hostname") == socket.gethostname()
+    sameContext = (context is not None and sameHost
+                   and endpoints.get("pid") == os.getpid()
+                   and endpoints.get("context") == context.underlying)
+    for address in addresses:
+        if address.startswith("inproc://") and sameContext:
+            return address
+    for address in addresses:
+        if address.startswith("ipc://") and sameHost:
+            return address
+    for address in addresses:
+        if not address.startswith(("inproc://", "ipc://")):
+            return address
+    return ""
+
+
+def _parseMessage(message: str) -> tuple:
+    '''
+    Split a client message into command, arguments and options:
+        '__GET_IF_NEWER__ 12 codec=numpy' -> ('__GET_IF_NEWER__', ['12'], {'codec': 'numpy'})
+    '''
+    command, *tokens = message.split() or [""]
+    args = [token for token in tokens if "=" not in token]
+    options = dict(token.split("=", 1) for token in tokens if "=" in token)
+    return command, args, options
+
+
+def _command(message: str) -> str:
+    '''
+    Name of the command of a message, used as key of the statistics.
+    '''
+    command = message.split(" ", 1)[0]
+    if command.startswith("__") and command.endswith("__"):
+        return command
+    return "unknown"
+
+
+def _nbytes(frames: list) -> int:
+    '''
+    Size in bytes of a list of frames (bytes or arrays).
+    '''
+    return sum(memoryview(frame).nbytes for frame in frames)
+
+
+def frameFromMessage(header: bytes, buffer) -> np.ndarray | None:
+    '''
+    Rebuild the array sent by the server on '__FRAME__' (request or topic).
+    The array shares the memory of the received message (read only).
+
+    Args:
+        header: (bytes)
+            the json header of the message.
+        buffer:
+            the raw data of the message (bytes, memoryview or zmq.Frame).
+
+    Returns:
+        the array, or None if the server has no frame.
+    '''
+    header = json.loads(header)
+    if not header:
+        return None
+    return np.ndarray(shape=header["shape"],
+                      dtype=np.dtype(header["dtype"]),
+                      buffer=buffer,
+                      strides=header["strides"])
 
 
 if __name__ == "__main__":
@@ -228,13 +1161,16 @@ if __name__ == "__main__":
     # print(f"port = {port}")
     # print(f"address = {address}")
     address = "tcp://*:1230"
+    pubAddress = "tcp://*:1231"
     host = ""
     data = {"hello": "world", "x": 42}
-    server = diagServer(address=address, host=host, data=data, name="scooby-doo")
+    server = diagServer(address=address, host=host, data=data, name="scooby-doo",
+                        pubAddress=pubAddress)
     server.start()
 
     try:
         while True:
             time.sleep(1)
+            server.setData({"hello": "world", "x": 42, "time": time.time()})
     except KeyboardInterrupt:
         server.stop()
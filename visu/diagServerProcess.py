@@ -0,0 +1,388 @@
+'''
+diagServer running in its own process.
+
+The GUI process only sends the new data through a pipe: the encoding of the
+dictionaries and the answers to the clients are done in the server process,
+so the requests are answered promptly even when the GUI thread holds the GIL
+for a long analysis.
+'''
+
+import multiprocessing
+import threading
+import numpy as np
+import zmq
+from visu.diagServer import diagServer, diagSource, checkSourceName
+
+
+def _serve(conn, kwargs: dict) -> None:
+    '''
+    Main function of the server process.
+    Build the server, report the endpoints (or the bind error) and apply the
+    commands received on 'conn' until '__STOP__' or the end of the parent.
+    '''
+    try:
+        server = diagServer(**kwargs)
+    except (zmq.ZMQError, ValueError) as e:
+        conn.send(("error", type(e).__name__, getattr(e, "errno", None), str(e)))
+        conn.close()
+        return
+    conn.send(("ready", {"addressForClient": server.addressForClient,
+                         "pubAddressForClient": server.pubAddressForClient,
+                         "endpoints": server.endpoints}))
+
+    while True:
+        try:
+            command, *args = conn.recv()
+        except (EOFError, OSError): # the parent process is gone
+            command, args = "__STOP__", []
+
+        try:
+            if command == "setData":
+                server.setData(*args)
+            elif command == "setFrame":
+                dtype, shape, shotNumber = args
+                buffer = conn.recv_bytes()
+                frame = np.frombuffer(buffer, dtype=np.dtype(dtype)).reshape(shape)
+                server.setFrame(frame, shotNumber)
+            elif command == "register":
+                server.register(*args)
+            elif command == "unregister":
+                server.unregister(*args)
+            elif command == "stats":
+                conn.send(server.stats())
+            elif command == "start":
+                server.start()
+            elif command == "__STOP__":
+                if server.is_alive():
+                    server.stop()
+                break
+        except (TypeError, ValueError, KeyError) as e:
+            print(f"[diagServer {server.name}] {command} error:", e)
+
+    conn.close()
+
+
+class diagServerProcess:
+
+    def __init__(self,
+                 parent = None,
+                 address: str = "tcp://*:1110",
+                 host: str = "localhost",
+                 data: dict | None = None,
+                 name: str = "default",
+                 pubAddress: str | None = None,
+                 mode: str = "rep",
+                 historyLength: int = 100,
+                 historyMaxBytes: int = 64 * 1024**2,
+                 verbose: bool = False,
+                 localAddress: str | None = None,
+                 localPubAddress: str | None = None,
+                 startTimeout: float = 30.):
+        '''
+        Same server as 'diagServer' (same arguments and 'start', 'setData',
+        'setFrame', 'stop' methods) but running in a separate process, started
+        with 'spawn' so nothing of the GUI (Qt, threads) is inherited.
+
+        The process is created here and the sockets are bound before returning,
+        so a bind error is raised by the constructor as with 'diagServer'.
+        'setData' pickles the dictionary through a pipe and 'setFrame' sends the
+        raw buffer of the array; the encoding is done in the server process.
+
+        Local clients should use an 'ipc://' 'localAddress': an 'inproc://'
+        address is only reachable inside the server process.
+
+        Args:
+            parent: parent,
+                kept for compatibility with 'diagServer', not sent to the process.
+
+            startTimeout: (float)
+                maximum time in s to wait for the process to bind its sockets.
+
+            see 'diagServer' for the other arguments.
+        '''
+        self._address = address
+        self.name = name
+        self._host = host
+        self._mode = mode
+        self._pubAddress = pubAddress
+        self._localAddress = localAddress
+        self._localPubAddress = localPubAddress
+        self._parent = parent
+        self._data = data or {}
+        self._version = 0
+        self._shotNumber = 0
+        self._sourceShots = {} # name -> last shot number of the registered sources
+        self._lock = threading.Lock() # the pipe is used from any thread
+
+        kwargs = dict(address=address, host=host, data=data, name=name,
+                      pubAddress=pubAddress, mode=mode, historyLength=historyLength,
+                      historyMaxBytes=historyMaxBytes, verbose=verbose,
+                      localAddress=localAddress, localPubAddress=localPubAddress)
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, childConn = ctx.Pipe()
+        self._process = ctx.Process(target=_serve, args=(childConn, kwargs),
+                                    name=f"diagServer-{name}", daemon=True)
+        self._process.start()
+        childConn.close()
+
+        if not self._conn.poll(startTimeout):
+            self._process.terminate()
+            raise TimeoutError(f"[diagServer {name}] the server process did not start")
+        answer = self._conn.recv()
+        if answer[0] == "error":
+            self._process.join()
+            _, errorType, errno, message = answer
+            if errorType == "ZMQError":
+                raise zmq.ZMQError(errno, message)
+            raise ValueError(message)
+        self._info = answer[1]
+
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def address(self) -> str:
+        '''
+        property to avoid 'address' modification.
+        '''
+        return self._address
+
+    @property
+    def mode(self) -> str:
+        '''
+        property to avoid 'mode' modification.
+        '''
+        return self._mode
+
+    @property
+    def pubAddress(self) -> str | None:
+        '''
+        property to avoid 'pubAddress' modification.
+        '''
+        return self._pubAddress
+
+    @property
+    def localAddress(self) -> str | None:
+        '''
+        property to avoid 'localAddress' modification.
+        '''
+        return self._localAddress
+
+    @property
+    def localPubAddress(self) -> str | None:
+        '''
+        property to avoid 'localPubAddress' modification.
+        '''
+        return self._localPubAddress
+
+    @property
+    def host(self):
+        '''
+        property to avoid 'host' modification.
+        '''
+        return self._host
+
+    @property
+    def data(self) -> dict:
+        '''
+        property that return the last dictionary given to 'setData'.
+        '''
+        return self._data
+
+    @property
+    def version(self) -> int:
+        '''
+        property that return the version of the data.
+        '''
+        return self._version
+
+    @property
+    def shotNumber(self) -> int:
+        '''
+        property that return the shot number of the last 'setData'.
+        '''
+        return self._shotNumber
+
+    @property
+    def running(self):
+        '''
+        property to avoid 'running' modification.
+        '''
+        return self._running
+
+    @property
+    def pid(self) -> int:
+        '''
+        property that return the pid of the server process.
+        '''
+        return self._process.pid
+
+    @property
+    def addressForClient(self) -> str:
+        '''
+        property that return the 'address' for the client.
+        '''
+        return self._info["addressForClient"]
+
+    @property
+    def pubAddressForClient(self) -> str:
+        '''
+        property that return the 'pubAddress' for the client.
+        '''
+        return self._info["pubAddressForClient"]
+
+    @property
+    def endpoints(self) -> dict:
+        '''
+        property that return all the addresses for the clients
+        (the pid is the one of the server process).
+        '''
+        return self._info["endpoints"]
+
+    def _send(self, *message) -> None:
+        '''
+        Send a command to the server process, ignored if it is stopped.
+        '''
+        if not self._process.is_alive():
+            return
+        try:
+            self._conn.send(message)
+        except (BrokenPipeError, OSError) as e:
+            print(f"[diagServer {self.name}] Process error:", e)
+
+    def start(self) -> None:
+        '''
+        Start the server loop in the server process.
+        '''
+        with self._lock:
+            self._send("start")
+
+    def is_alive(self) -> bool:
+        '''
+        Return True while the server process runs.
+        '''
+        return self._process.is_alive()
+
+    def register(self, name: str, data: dict | None = None) -> diagSource:
+        '''
+        Add a named source of data to the server (see 'diagServer.register').
+        '''
+        checkSourceName(name)
+        with self._lock:
+            if name in self._sourceShots:
+                raise ValueError(f"source '{name}' already registered")
+            self._sourceShots[name] = 0
+            self._send("register", name, data)
+        return diagSource(self, name)
+
+    def unregister(self, name: str) -> None:
+        '''
+        Remove a named source of data.
+        '''
+        with self._lock:
+            self._sourceShots.pop(name, None)
+            self._send("unregister", name)
+
+    @property
+    def sources(self) -> list:
+        '''
+        property that return the names of the registered sources.
+        '''
+        return list(self._sourceShots)
+
+    def setData(self, newData: dict, shotNumber: int | None = None,
+                source: str | None = None) -> None:
+        '''
+        Send a new dictionary to the server process (see 'diagServer.setData').
+
+        Args:
+            newData: (dict)
+                the dictionnary to transmit.
+
+            shotNumber: (int)
+                the shot number of the data. If None, the previous
+                shot number is incremented.
+
+            source: (str)
+                the name of a registered source, None for the main data.
+        '''
+        with self._lock:
+            if source is not None:
+                if shotNumber is None:
+                    shotNumber = self._sourceShots[source] + 1
+                self._sourceShots[source] = shotNumber
+            else:
+                if shotNumber is None:
+                    shotNumber = self._shotNumber + 1
+                self._data = newData
+                self._shotNumber = shotNumber
+                self._version += 1
+            self._send("setData", newData, shotNumber, source)
+
+    def setFrame(self, frame: np.ndarray, shotNumber: int | None = None) -> None:
+        '''
+        Send a new raw frame to the server process (see 'diagServer.setFrame').
+        The array is copied into the pipe, it can be modified afterwards.
+
+        Args:
+            frame: (np.ndarray)
+                the image to transmit.
+
+            shotNumber: (int)
+                the shot number of the frame. If None, the shot number of
+                the last 'setData' is used.
+        '''
+        frame = np.ascontiguousarray(frame)
+        if shotNumber is None:
+            shotNumber = self._shotNumber
+        with self._lock:
+            if not self._process.is_alive():
+                return
+            self._send("setFrame", frame.dtype.str, frame.shape, shotNumber)
+            self._conn.send_bytes(memoryview(frame).cast("B"))
+
+    def stats(self, timeout: float = 1.) -> dict | None:
+        '''
+        Return the counters of the server (see 'ServerStats.asDict'),
+        or None if the server process does not answer within 'timeout' s.
+        '''
+        with self._lock:
+            if not self._process.is_alive(): # stopped: the pipe may be closed
+                return None
+            while self._conn.poll(0): # late answer of a previous call
+                self._conn.recv()
+            self._send("stats")
+            if self._process.is_alive() and self._conn.poll(timeout):
+                return self._conn.recv()
+        return None
+
+    def stop(self, timeout: float = 5.) -> None:
+        '''
+        Stop the server and wait for the end of the process
+        (killed after 'timeout' s).
+        '''
+        print("[diagServer] Stopping...")
+        with self._lock:
+            self._send("__STOP__")
+        self._running.clear()
+        self._process.join(timeout)
+        if self._process.is_alive():
+            print(f"[diagServer {self.name}] Process killed")
+            self._process.terminate()
+            self._process.join()
+        self._conn.close()
+
+
+if __name__ == "__main__":
+    import time
+    server = diagServerProcess(address="tcp://*:1230", pubAddress="tcp://*:1231",
+                               host="", data={"hello": "world", "x": 42},
+                               name="scooby-doo")
+    server.start()
+
+    try:
+        while True:
+            time.sleep(1)
+            server.setData({"hello": "world", "x": 42, "time": time.time()})
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,141 @@
+'''
+Products derived from a frame, computed at most once per frame.
+
+Several windows need the same quantities of the same image (smoothed image,
+position of the maximum, ROI region...). 'FrameProducts' keeps them until the
+next frame: the first window asking a product computes it, the others get the
+same object.
+
+    products = FrameProducts()
+    products.newFrame(data)                            # at each new frame
+    dataF = products.get("smoothed", sigma=5)          # gaussian filter of the frame
+    xmax, ymax = products.get("argmax", dataF)         # computed once on dataF
+    cut = products.memo(("region", roiKey), lambda: roi.getArrayRegion(data, imh))
+
+Products are requested on the frame or on another product (an array returned
+by 'get' or 'memo'), which builds the dependency graph: a product of a product
+is keyed by the identity of its input, kept alive until the next frame.
+
+The products can be requested from the analysis workers (see
+'analysisDispatcher'): two threads asking the same missing product may both
+compute it, the cache itself is protected by a lock.
+'''
+
+import threading
+import numpy as np
+from scipy import ndimage
+from scipy.ndimage import gaussian_filter
+from visu.autoLevels import percentileLevels
+
+
+def _smoothed(data: np.ndarray, sigma: float = 5) -> np.ndarray:
+    return gaussian_filter(data, sigma)
+
+
+def _argmax(data: np.ndarray) -> tuple:
+    return np.unravel_index(data.argmax(), data.shape)
+
+
+def _centerOfMass(data: np.ndarray) -> tuple:
+    return ndimage.center_of_mass(data)
+
+
+PRODUCERS = {
+    "smoothed": _smoothed,          # gaussian filter, param: sigma
+    "argmax": _argmax,              # (x, y) of the maximum
+    "centerOfMass": _centerOfMass,  # (x, y) of the center of mass
+    "max": lambda data: data.max(),
+    "mean": lambda data: data.mean(),
+    "sum": lambda data: data.sum(),
+    "levels": percentileLevels,     # (xmin, xmax) of the color scale, params: low, high, binning
+}
+
+
+class FrameProducts:
+
+    def __init__(self):
+        '''
+        Lazy cache of the products of the current frame.
+        '''
+        self._frame = None
+        self._frameId = 0
+        self._cache = {}  # key -> (input array kept alive, product)
+        self._lock = threading.Lock()
+        self.computed = 0  # number of products computed (the others are reused)
+        self.reused = 0
+
+    @property
+    def frame(self) -> np.ndarray | None:
+        '''
+        property that return the current frame.
+        '''
+        return self._frame
+
+    @property
+    def frameId(self) -> int:
+        '''
+        property that return the number of the current frame.
+        '''
+        return self._frameId
+
+    def newFrame(self, frame: np.ndarray) -> None:
+        '''
+        Set the new frame and forget the products of the previous one.
+        '''
+        with self._lock:
+            self._frame = frame
+            self._frameId += 1
+            self._cache.clear()
+
+    def memo(self, key, func, data: np.ndarray | None = None):
+        '''
+        Return func() computed once for 'key' on 'data' in this frame.
+
+        Args:
+            key: (hashable)
+                the name and parameters of the product.
+            func: (callable)
+                compute the product, called without argument.
+            data: (np.ndarray)
+                the input of the product, the frame if None.
+        '''
+        data = self._frame if data is None else data
+        fullKey = (key, id(data))
+        with self._lock:
+            cached = self._cache.get(fullKey)
+            if cached is not None and cached[0] is data:
+                self.reused += 1
+                return cached[1]
+        value = func()
+        with self._lock:
+            self._cache[fullKey] = (data, value)
+            self.computed += 1
+        return value
+
+    def get(self, name: str, data: np.ndarray | None = None, **params):
+        '''
+        Return the product 'name' (see PRODUCERS) of 'data' (the frame if None).
+
+        Args:
+            name: (str)
+                the name of the product.
+            data: (np.ndarray)
+                the frame, a region or another product of the frame.
+            params:
+                the parameters of the producer, ex: sigma=5.
+        '''
+        data = self._frame if data is None else data
+        producer = PRODUCERS[name]
+        key = (name, tuple(sorted(params.items())))
+        return self.memo(key, lambda: producer(data, **params), data)
+
+
+def getProduct(owner, name: str, data: np.ndarray, **params):
+    '''
+    Return the product 'name' of 'data' from the 'products' of 'owner'
+    (a SEE window), or compute it if 'owner' has no products.
+    '''
+    products = getattr(owner, "products", None)
+    if products is None:
+        return PRODUCERS[name](data, **params)
+    return products.get(name, data, **params)
@@ -0,0 +1,526 @@
+'''
+Processing of the camera frames without Qt.
+
+The per-frame processing of SEE (background subtraction, gauss/median/threshold
+filters, hot pixel removal, fluence normalisation, ROI, measurements and
+autosave) is done by an 'ImagePipeline' from a 'ProcessingParams', so the same
+processing can run in a worker thread or in a process without display:
+
+    pipeline = ImagePipeline(ProcessingParams(filter="gauss", sigma=2))
+    pipeline.setBackground(bg)
+    pipeline.subscribe(callback)    # called with each FrameResult
+    result = pipeline.process(frame)
+
+The arrays are indexed as displayed by pyqtgraph: data[x, y].
+
+When a processing step is active, the frame is processed in buffers
+allocated once for the frame shape and reused (a ring of 'ringSize' images):
+the operations are done in place, without temporary full frames. The buffers
+have the working dtype of 'ProcessingParams.dtype': float32 by default (half
+the memory of float64), or the integer dtype of the camera when the active
+steps are exact on integers ('auto').
+
+With a 'timer' (see stageTimer) the background subtraction, the filter, the
+defect correction and the autosave are timed ("background", "filter",
+"defects", "autosave").
+'''
+
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+import numpy as np
+from scipy import ndimage
+from PIL import Image
+from visu.tiledFilter import gaussianFilter, medianFilter
+from visu.orientation import DISPLAY_TO_FILE
+
+
+@dataclass(frozen=True)
+class ProcessingParams:
+    '''
+    Parameters of the processing of one frame.
+
+    Args:
+        background: (bool)
+            subtract the background given to the pipeline.
+        filter: (str)
+            'origin' (no filter), 'gauss', 'median' or 'threshold'.
+        sigma: (float)
+            sigma of the gauss filter, size of the median filter.
+        threshold: (float)
+            values under the threshold are set to 0 with the 'threshold' filter.
+        removeHotPixel: (bool)
+            replace the pixels of the defect map given to the pipeline by the
+            median of their neighbours (see defectMap), without defect map
+            the pixels at the maximum by the mean of the image.
+        fluence: (bool)
+            normalise the image to the 'energy' in the 'fluenceRegion'.
+        energy: (float)
+            energy in mJ in the 'fluenceRegion'.
+        pixelArea: (float)
+            area of a pixel in cm2 (1 to have the fluence in mJ/pixel2).
+        fluenceRegion: (tuple)
+            (x, y, width, height, angle) of the ellipse used for the fluence
+            (pos, size and angle in degrees of the pyqtgraph EllipseROI),
+            None for the full image.
+        roi: (tuple)
+            ('rect' or 'cercle', x, y, width, height) region extracted in
+            'FrameResult.roi', None for no region.
+        measure: (bool)
+            compute the measurements (see 'measure') on the roi or the image.
+        autoSave: (str)
+            file name without extension to save the processed image, None to not save.
+        saveTiff: (bool)
+            save as TIFF, else as txt.
+        dtype: (str)
+            working dtype of the processed image: 'float32', 'float64' or
+            'auto' (the integer dtype of the frame if the steps are lossless
+            on integers, see 'workingDtype', else float32).
+    '''
+    background: bool = False
+    filter: str = "origin"
+    sigma: float = 0
+    threshold: float = 0
+    removeHotPixel: bool = False
+    fluence: bool = False
+    energy: float = 0
+    pixelArea: float = 1.
+    fluenceRegion: tuple | None = None
+    roi: tuple | None = None
+    measure: bool = False
+    autoSave: str | None = None
+    saveTiff: bool = True
+    dtype: str = "float32"
+
+
+@dataclass
+class FrameResult:
+    '''
+    Result of the processing of one frame.
+
+    Args:
+        raw: (np.ndarray)
+            the frame given to the pipeline.
+        data: (np.ndarray)
+            the processed image (in the working dtype, see 'workingDtype'),
+            or 'raw' itself if no processing step is active. The buffer is reused 'ringSize' frames later:
+            copy it to keep it longer.
+        background: (str)
+            'off', 'on', 'missing' (no background given) or 'error'
+            (background with a wrong shape), the image is not subtracted
+            in the last two cases.
+        roi: (np.ndarray)
+            the region of 'ProcessingParams.roi'.
+        measurements: (dict)
+            the measurements of the roi or the image.
+        savedFile: (str)
+            the file written by the autosave.
+    '''
+    raw: np.ndarray
+    data: np.ndarray
+    background: str = "off"
+    roi: np.ndarray | None = None
+    measurements: dict | None = None
+    savedFile: str | None = None
+
+
+def workingDtype(frameDtype, params: ProcessingParams, background: np.ndarray | None = None) -> np.dtype:
+    '''
+    Return the dtype of the processing of a frame of 'frameDtype' with 'params'.
+
+    With params.dtype 'auto' an integer frame stays integer when the active
+    steps are exact on integers: background subtraction with an integer
+    background (saturated at 0), median and threshold filters. The gauss
+    filter, the hot pixels and the fluence need float32.
+    '''
+    if params.dtype in ("float32", "float64"):
+        return np.dtype(params.dtype)
+    if params.dtype != "auto":
+        raise ValueError(f"working dtype must be 'float32', 'float64' or 'auto', not {params.dtype!r}")
+    frameDtype = np.dtype(frameDtype)
+    if frameDtype.kind not in "iu":
+        return np.dtype(np.float32)
+    lossless = (params.filter in ("origin", "median", "threshold")
+                and not params.removeHotPixel and not params.fluence)
+    if params.background and background is not None:
+        bgDtype = np.asarray(background).dtype
+        lossless = lossless and bgDtype.kind in "iu" and np.can_cast(bgDtype, frameDtype)
+    return frameDtype if lossless else np.dtype(np.float32)
+
+
+def subtractBackground(data: np.ndarray, bg: np.ndarray) -> np.ndarray:
+    '''
+    Subtract the background, negative values are set to 0 (no wrap around
+    of the unsigned integers).
+    Raise ValueError if the shapes are different.
+    '''
+    if np.shape(bg) != np.shape(data):
+        raise ValueError(f"background shape {np.shape(bg)} != image shape {np.shape(data)}")
+    return np.maximum(data, bg) - bg
+
+
+def applyFilter(data: np.ndarray, filter: str, sigma: float = 0,
+                threshold: float = 0) -> np.ndarray:
+    '''
+    Apply the 'gauss', 'median' or 'threshold' filter ('origin': no filter).
+    '''
+    if filter == "gauss":
+        return gaussianFilter(data, sigma)
+    if filter == "median":
+        return medianFilter(data, sigma)
+    if filter == "threshold":  # 0 under the threshold
+        return np.where(data < threshold, 0, data)
+    return data
+
+
+def removeHotPixel(data: np.ndarray) -> np.ndarray:
+    '''
+    Replace the pixels equal to the maximum by the mean of the image.
+    '''
+    return np.where(data == data.max(), data.mean(), data)
+
+
+def ellipseMask(shape: tuple, region: tuple) -> np.ndarray:
+    '''
+    Boolean mask of the pixels inside the ellipse inscribed in
+    region = (x, y, width, height) or (x, y, width, height, angle): the
+    rectangle at (x, y) turned by 'angle' degrees around (x, y), as a
+    rotated pyqtgraph ROI. The mask is empty if the width or height is 0.
+    '''
+    x, y, width, height, *angle = region
+    if width <= 0 or height <= 0:
+        return np.zeros(shape[:2], dtype=bool)
+    i, j = np.ogrid[:shape[0], :shape[1]]
+    di, dj = i + 0.5 - x, j + 0.5 - y  # pixel centres from the corner of the roi
+    if angle and angle[0]:
+        # coordinates in the frame of the roi (rotation by -angle)
+        cos, sin = np.cos(np.radians(angle[0])), np.sin(np.radians(angle[0]))
+        di, dj = cos * di + sin * dj, cos * dj - sin * di
+    return (((di - width / 2) / (width / 2))**2
+            + ((dj - height / 2) / (height / 2))**2) <= 1
+
+
+def roiRegion(data: np.ndarray, kind: str, x: float, y: float,
+              width: float, height: float) -> np.ndarray:
+    '''
+    Return the region of a 'rect' or 'cercle' roi: the bounding box of the roi
+    in the image, with the pixels outside of the ellipse set to 0 for 'cercle'
+    (as 'getArrayRegion' of the pyqtgraph rois).
+    '''
+    x0, y0 = max(int(round(x)), 0), max(int(round(y)), 0)
+    x1 = min(int(round(x + width)), data.shape[0])
+    y1 = min(int(round(y + height)), data.shape[1])
+    region = data[x0:x1, y0:y1]
+    if kind == "cercle":
+        mask = ellipseMask(region.shape, (x - x0, y - y0, width, height))
+        region = np.where(mask, region, 0)
+    return region
+
+
+def fluence(data: np.ndarray, energy: float, pixelArea: float = 1.,
+            region: tuple | None = None) -> np.ndarray:
+    '''
+    Normalise the image to a fluence in mJ/(pixelArea unit): the sum of the
+    image in the ellipse 'region' (full image if None) is 'energy'.
+    The image is returned unchanged if its sum in the region is 0.
+    '''
+    if region is None:
+        enrgTot = data.sum()
+    else:
+        enrgTot = data[ellipseMask(data.shape, region)].sum()
+    if enrgTot == 0:
+        return data
+    if data.dtype == np.float64:
+        return 1000 * (data * energy / enrgTot) / pixelArea
+    return data * np.float32(1000 * energy / enrgTot / pixelArea)
+
+
+def measure(data: np.ndarray) -> dict:
+    '''
+    Return the max, min, sum, mean, position of the max and center of mass
+    of the image (as shown by the measurement window).
+    '''
+    xmax, ymax = np.unravel_index(data.argmax(), data.shape)
+    xcmass, ycmass = ndimage.center_of_mass(data)
+    return {"max": float(data.max()),
+            "min": float(data.min()),
+            "sum": float(data.sum()),
+            "mean": float(data.mean()),
+            "xmax": int(xmax),
+            "ymax": int(ymax),
+            "xcmass": float(xcmass),
+            "ycmass": float(ycmass),
+            "shape": data.shape}
+
+
+def autoSaveName(path: str, name: str, number: int, date: bool = False) -> str:
+    '''
+    Return the autosave file name (without extension): <path>/<name>_<number>
+    with the number on 4 digits, followed by the date if 'date'.
+    '''
+    num = "%04i" % number
+    if date:
+        return f"{path}/{name}_{num}_{time.strftime('%Y_%m_%d_%H_%M_%S')}"
+    return f"{path}/{name}_{num}"
+
+
+def tiffArray(data: np.ndarray) -> np.ndarray:
+    '''
+    Return the image in a dtype of the TIFF files written by PIL: the
+    8/16 bits integers and int32 are kept, the floats are saved in float32
+    and the other integers in int32 if their values fit, else in float32.
+    '''
+    if data.dtype in (np.uint8, np.uint16, np.int16, np.int32, np.float32):
+        return data
+    if data.dtype.kind in "iu" and data.size:
+        info = np.iinfo(np.int32)
+        if info.min <= data.min() and data.max() <= info.max:
+            return data.astype(np.int32)
+    return data.astype(np.float32)
+
+
+def saveFrame(data: np.ndarray, fileName: str, tiff: bool = True) -> str:
+    '''
+    Save the image as <fileName>.TIFF (rotated as displayed, see 'tiffArray'
+    for the dtype) or <fileName>.txt (integers written as integers, float32
+    with the 9 digits needed to read it back exactly) and return the name of
+    the file written.
+    '''
+    if tiff:
+        img_PIL = Image.fromarray(tiffArray(DISPLAY_TO_FILE.apply(data)))
+        img_PIL.save(fileName + '.TIFF', format='TIFF')
+        return fileName + '.TIFF'
+    if data.dtype.kind in "iub":
+        fmt = '%d'
+    elif data.dtype == np.float32:
+        fmt = '%.9g'
+    else:
+        fmt = '%.18e'  # default of np.savetxt
+    np.savetxt(fileName + '.txt', data, fmt=fmt)
+    return fileName + '.txt'
+
+
+def displayArray(data: np.ndarray) -> np.ndarray:
+    '''
+    Return the image as given to pyqtgraph: the integer and float images are
+    displayed without conversion, the others (ex: bool) in float32.
+    '''
+    data = np.asarray(data)
+    if data.dtype.kind in "iuf":
+        return data
+    return data.astype(np.float32)
+
+
+class ImagePipeline:
+
+    def __init__(self, params: ProcessingParams | None = None, ringSize: int = 4,
+                 timer=None):
+        '''
+        Processing of the frames with the parameters 'params'.
+        The pipeline does not use Qt: it can run in any thread, but 'process'
+        must not be called from two threads at the same time. The callbacks
+        given to 'subscribe' are called in the thread calling 'process'.
+
+        Args:
+            params: (ProcessingParams)
+                the default parameters, can be replaced with 'setParams' or
+                given to each 'process' call.
+            ringSize: (int)
+                number of images (in the working dtype) reused for the results,
+                a result stays valid during the 'ringSize' - 1 next frames.
+            timer: (StageTimer)
+                times the stages of the processing, None for no timing.
+        '''
+        self.params = params or ProcessingParams()
+        self.ringSize = ringSize
+        self.timer = timer
+        self._background = None
+        self._backgroundAs = {}  # dtype -> background in the working dtype
+        self._defects = None  # DefectMap used by 'removeHotPixel'
+        self._listeners = []
+        # buffers allocated for the frame shape, see '_allocate'
+        self._shape = None
+        self._dtype = None
+        self._ring = []
+        self._ringIndex = 0
+        self._scratch = None  # output of the filters, swapped with the ring buffer
+        self._mask = None
+        self._ellipse = (None, None)  # (region, mask) of the fluence
+
+    @property
+    def background(self) -> np.ndarray | None:
+        '''
+        property that return the background subtracted when 'params.background' is True.
+        '''
+        return self._background
+
+    def setBackground(self, bg: np.ndarray | None) -> None:
+        '''
+        Set the background (None to remove it).
+        '''
+        if bg is not self._background:
+            self._background = bg
+            self._backgroundAs = {}
+
+    @property
+    def defectMap(self):
+        '''
+        property that return the defect map used when 'params.removeHotPixel' is True.
+        '''
+        return self._defects
+
+    def setDefectMap(self, defects) -> None:
+        '''
+        Set the DefectMap of the camera (None to remove it).
+        '''
+        self._defects = defects
+
+    def setParams(self, params: ProcessingParams) -> None:
+        '''
+        Replace the default parameters.
+        '''
+        self.params = params
+
+    def subscribe(self, callback) -> None:
+        '''
+        Call 'callback(result)' after each processed frame.
+        '''
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _allocate(self, shape: tuple, dtype: np.dtype) -> None:
+        '''
+        (Re)allocate the buffers when the frame shape or the working dtype changes.
+        '''
+        if shape == self._shape and dtype == self._dtype:
+            return
+        if shape != self._shape:
+            self._ellipse = (None, None)
+        self._shape = shape
+        self._dtype = dtype
+        self._ring = [np.empty(shape, dtype=dtype) for _ in range(self.ringSize)]
+        self._ringIndex = 0
+        self._scratch = np.empty(shape, dtype=dtype)
+        self._mask = np.empty(shape, dtype=bool)
+
+    def _backgroundIn(self, dtype: np.dtype) -> np.ndarray:
+        '''
+        Background converted once to the working dtype.
+        '''
+        bg = self._backgroundAs.get(dtype)
+        if bg is None:
+            bg = self._backgroundAs[dtype] = np.asarray(self._background, dtype=dtype)
+        return bg
+
+    def isBuffer(self, array: np.ndarray) -> bool:
+        '''
+        Return True if 'array' is (a view of) a buffer of the pipeline, which
+        will be overwritten by a next frame: copy it to keep it longer.
+        '''
+        buffers = self._ring if self._scratch is None else self._ring + [self._scratch]
+        return any(np.may_share_memory(array, buffer) for buffer in buffers)
+
+    def _span(self, name: str):
+        '''
+        Span of the stage 'name' in the timer (nothing without timer).
+        '''
+        return nullcontext() if self.timer is None else self.timer.span(name)
+
+    def _ellipseMask(self, region: tuple) -> np.ndarray:
+        '''
+        Mask of the fluence region, computed again only if the region changes.
+        '''
+        if self._ellipse[0] != region:
+            self._ellipse = (region, ellipseMask(self._shape, region))
+        return self._ellipse[1]
+
+    def _preprocess(self, frame: np.ndarray, params: ProcessingParams) -> tuple:
+        '''
+        Background, filter, hot pixels and fluence in place in a ring buffer.
+        Return (image, background state).
+        '''
+        self._allocate(frame.shape, workingDtype(frame.dtype, params, self._background))
+        index = self._ringIndex
+        self._ringIndex = (index + 1) % self.ringSize
+        data = self._ring[index]
+        np.copyto(data, frame, casting="unsafe")
+
+        bgState = "off"
+        if params.background:
+            if self._background is None:
+                bgState = "missing"
+            elif np.shape(self._background) != frame.shape:
+                bgState = "error"
+            else:
+                bg = self._backgroundIn(data.dtype)
+                with self._span("background"):
+                    # max(data, bg) - bg: negative values at 0 without
+                    # wrap around of the unsigned integers
+                    np.maximum(data, bg, out=data)
+                    np.subtract(data, bg, out=data)
+                bgState = "on"
+
+        if params.filter in ("gauss", "median"):
+            with self._span("filter"):
+                if params.filter == "gauss":
+                    gaussianFilter(data, params.sigma, output=self._scratch)
+                else:
+                    medianFilter(data, params.sigma, output=self._scratch)
+            # the filtered image becomes the ring buffer, the old one the scratch
+            data, self._scratch = self._scratch, data
+            self._ring[index] = data
+        elif params.filter == "threshold":  # 0 under the threshold
+            with self._span("filter"):
+                np.less(data, params.threshold, out=self._mask)
+                np.copyto(data, 0, where=self._mask)
+
+        if params.removeHotPixel:
+            if self._defects is not None and self._defects.shape == data.shape:
+                with self._span("defects"):
+                    self._defects.correct(data)
+            else:
+                np.equal(data, data.max(), out=self._mask)
+                np.copyto(data, data.mean(), where=self._mask)
+
+        if params.fluence:
+            if params.fluenceRegion is None:
+                enrgTot = data.sum()
+            else:
+                enrgTot = data.sum(where=self._ellipseMask(params.fluenceRegion))
+            if enrgTot != 0:  # empty region: not normalised
+                np.multiply(data, data.dtype.type(1000 * params.energy / enrgTot / params.pixelArea),
+                            out=data)
+        return data, bgState
+
+    def process(self, frame: np.ndarray, params: ProcessingParams | None = None) -> FrameResult:
+        '''
+        Process one frame and return the result.
+
+        Args:
+            frame: (np.ndarray)
+                the raw image, it is not modified.
+            params: (ProcessingParams)
+                the parameters for this frame, 'self.params' if None.
+        '''
+        params = params or self.params
+        if (params.background or params.filter != "origin"
+                or params.removeHotPixel or params.fluence):
+            data, bgState = self._preprocess(frame, params)
+        else:  # nothing to do: no copy
+            data, bgState = frame, "off"
+
+        result = FrameResult(raw=frame, data=data, background=bgState)
+        if params.roi is not None:
+            result.roi = roiRegion(data, *params.roi)
+        if params.measure:
+            result.measurements = measure(result.roi if result.roi is not None else data)
+        if params.autoSave is not None:
+            with self._span("autosave"):
+                result.savedFile = saveFrame(data, params.autoSave, params.saveTiff)
+
+        for callback in list(self._listeners):
+            callback(result)
+        return result
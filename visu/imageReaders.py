@@ -0,0 +1,356 @@
+'''
+Readers of the image files, chosen by the extension of the file.
+
+Each format has a reader giving the header of the file (shape, dtype, number
+of frames, metadata) without decoding the image, and the frames one by one.
+The windows open the files with 'openImage', which returns an 'ImageSource':
+
+    source = openImage(fileName)       # ValueError if the format is unknown
+    source.shape, source.dtype          # read from the header only
+    data = source.frame(0)             # decoded when asked, as displayed
+    data = readImage(fileName)          # first frame
+
+The frames are returned as displayed by SEE: the formats stored rotated (TIFF,
+png, jpeg and sif) are turned with FILE_TO_DISPLAY as a view. The txt files
+are written as displayed by every saver of visu (autosave, 'Save', snap
+background) and read without rotation.
+
+A new format (or a faster reader of a format) is added with 'registerReader':
+
+    class FitsReader(ImageReader):
+        extensions = ('.fits',)
+        name = 'FITS file'
+        def probe(self, fileName): ...
+        def readFrame(self, fileName, index=0): ...
+
+    registerReader(FitsReader())
+'''
+
+import os
+from dataclasses import dataclass, field
+import numpy as np
+from PIL import Image
+from visu.orientation import IDENTITY, FILE_TO_DISPLAY
+from visu.winspec import SpeFile
+
+
+@dataclass(frozen=True)
+class ImageHeader:
+    '''
+    Description of an image file read from its header.
+
+    Args:
+        shape: (tuple)
+            shape of a frame as displayed.
+        dtype: (np.dtype)
+            dtype of the frames.
+        frames: (int)
+            number of frames in the file.
+        metadata: (dict)
+            other informations of the header (camera, gain...).
+    '''
+    shape: tuple
+    dtype: np.dtype
+    frames: int = 1
+    metadata: dict = field(default_factory=dict)
+
+
+def _orientedShape(orientation, shape: tuple) -> tuple:
+    '''
+    Shape of an array of 'shape' after 'orientation' (no memory used).
+    '''
+    return orientation.apply(np.broadcast_to(np.int8(0), tuple(shape))).shape
+
+
+class ImageReader:
+    '''
+    Reader of a file format: 'probe' reads the header, 'readFrame' a frame
+    as stored in the file, both turned to the display by 'orientation'.
+    '''
+    extensions = ()
+    name = ''
+    orientation = FILE_TO_DISPLAY
+
+    def probe(self, fileName: str) -> ImageHeader:
+        '''
+        Return the header of the file (shape as stored in the file).
+        '''
+        raise NotImplementedError
+
+    def readFrame(self, fileName: str, index: int = 0) -> np.ndarray:
+        '''
+        Return the frame 'index' as stored in the file.
+        '''
+        raise NotImplementedError
+
+    def header(self, fileName: str) -> ImageHeader:
+        '''
+        Return the header of the file with the shape as displayed.
+        '''
+        header = self.probe(fileName)
+        return ImageHeader(_orientedShape(self.orientation, header.shape), np.dtype(header.dtype),
+                           header.frames, header.metadata)
+
+    def frame(self, fileName: str, index: int = 0) -> np.ndarray:
+        '''
+        Return the frame 'index' as displayed.
+        '''
+        return self.orientation.apply(self.readFrame(fileName, index))
+
+
+class TxtReader(ImageReader):
+    extensions = ('.txt',)
+    name = 'Text File'
+    orientation = IDENTITY  # saved as displayed (see imageProcessing.saveFrame)
+
+    def probe(self, fileName):
+        # columns of the first row, the other rows are only counted
+        rows, columns = 0, 0
+        with open(fileName, 'rb') as f:
+            for line in f:
+                line = line.lstrip()
+                if not line or line.startswith(b'#'):  # skipped by np.loadtxt
+                    continue
+                if rows == 0:
+                    columns = len(line.split())
+                rows += 1
+        return ImageHeader((rows, columns), np.dtype(np.float64))
+
+    def readFrame(self, fileName, index=0):
+        return np.loadtxt(fileName)
+
+
+class PillowReader(ImageReader):
+    extensions = ('.tiff', '.tif', '.png', '.jpg', '.jpeg')
+    name = 'TIFF file'
+
+    # dtype of the PIL modes, the others are read to find it
+    MODES = {'1': np.bool_, 'L': np.uint8, 'P': np.uint8, 'RGB': np.uint8, 'RGBA': np.uint8,
+             'I;16': np.uint16, 'I;16B': np.uint16, 'I;16L': np.uint16,
+             'I;16S': np.int16, 'I': np.int32, 'F': np.float32}
+    BANDS = {'RGB': 3, 'RGBA': 4}
+
+    def probe(self, fileName):
+        # PIL reads the header only until the pixels are asked
+        with Image.open(fileName) as img:
+            width, height = img.size
+            shape = (height, width)
+            if img.mode in self.BANDS:
+                shape += (self.BANDS[img.mode],)
+            dtype = self.MODES.get(img.mode)
+            if dtype is None:
+                dtype = np.array(img).dtype
+            metadata = {key: value for key, value in img.info.items()
+                        if isinstance(value, (str, int, float))}
+            metadata["mode"] = img.mode
+            return ImageHeader(shape, np.dtype(dtype), getattr(img, "n_frames", 1), metadata)
+
+    def readFrame(self, fileName, index=0):
+        with Image.open(fileName) as img:
+            if index:
+                img.seek(index)
+            return np.array(img)
+
+
+class SpeReader(ImageReader):
+    extensions = ('.spe',)
+    name = 'Ropper File'
+    orientation = IDENTITY  # SpeFile gives the frames as displayed
+
+    def probe(self, fileName):
+        spe = SpeFile(fileName)  # reads the header only
+        header = spe.header
+        return ImageHeader((header.xdim, header.ydim), np.dtype(SpeFile._datatype_map[header.datatype]),
+                           header.NumFrames,
+                           {"gain": spe.gain, "adc": spe.adc, "adc_rate": spe.adc_rate,
+                            "readout_time": spe.readout_time})
+
+    def readFrame(self, fileName, index=0):
+        # only the frame asked is read, with the orientation of SpeFile.data
+        spe = SpeFile(fileName)
+        header = spe.header
+        if not 0 <= index < header.NumFrames:
+            raise IndexError(f"frame {index} not in {fileName} ({header.NumFrames} frames)")
+        dtype = np.dtype(SpeFile._datatype_map[header.datatype])
+        count = header.xdim * header.ydim
+        with open(fileName, mode='rb') as f:
+            f.seek(4100 + index * count * dtype.itemsize)  # after the header of 4100 bytes
+            data = np.fromfile(f, dtype=dtype, count=count)
+        data = data.reshape((header.ydim, header.xdim)).T
+        if (spe.reversed is True) != (spe.adc == '100 KHz'):  # flipped as SpeFile
+            data = data[::-1, :]
+        return data
+
+
+class SifReader(ImageReader):
+    extensions = ('.sif',)
+    name = 'Andor File'
+
+    def probe(self, fileName):
+        # the first lines of the file, as read by SifFile.openA
+        with open(fileName, 'rb') as sif:
+            if sif.readline().strip() != b"Andor Technology Multi-Channel File":
+                raise ValueError(f"{fileName} is not an Andor SIF file")
+            for i in range(2):
+                sif.readline()
+            camera = sif.readline().strip().decode(errors='replace')
+            size = sif.readline().split()
+        return ImageHeader((int(size[1]), int(size[0])), np.dtype(np.float32), 1,
+                           {"camera": camera})
+
+    def readFrame(self, fileName, index=0):
+        # same image as SifFile.openA: the float32 at the end of the file,
+        # read without loading the rest of the file
+        shape = self.probe(fileName).shape
+        count = int(np.prod(shape))
+        with open(fileName, 'rb') as sif:
+            sif.seek(-4 * count, os.SEEK_END)
+            data = np.fromfile(sif, dtype=np.float32, count=count)
+        return data.reshape(shape)
+
+
+class NpyReader(ImageReader):
+    extensions = ('.npy',)
+    name = 'Background library'
+    orientation = IDENTITY  # saved as displayed (see backgroundLibrary)
+
+    def probe(self, fileName):
+        data = np.load(fileName, mmap_mode='r')  # the header, the values stay on disk
+        shape, frames = data.shape, 1
+        if data.ndim == 3:
+            shape, frames = data.shape[1:], data.shape[0]
+        return ImageHeader(shape, data.dtype, frames)
+
+    def readFrame(self, fileName, index=0):
+        data = np.load(fileName, mmap_mode='r')
+        return data[index] if data.ndim == 3 else data
+
+
+_READERS = {}  # extension (lower case) -> reader
+
+
+def registerReader(reader: ImageReader, extensions=None) -> None:
+    '''
+    Use 'reader' for the files with 'extensions' (reader.extensions if None),
+    replacing the previous reader of these extensions.
+    '''
+    for ext in extensions or reader.extensions:
+        _READERS[ext.lower()] = reader
+
+
+def readerFor(fileName: str) -> ImageReader:
+    '''
+    Return the reader of the file, raise ValueError if the format is unknown.
+    '''
+    ext = os.path.splitext(str(fileName))[1].lower()
+    reader = _READERS.get(ext)
+    if reader is None:
+        raise ValueError(f"unknown image format '{ext}', the format must be: "
+                         + ' '.join(sorted(_READERS)))
+    return reader
+
+
+def extensions() -> list:
+    '''
+    Return the extensions of the registered readers.
+    '''
+    return sorted(_READERS)
+
+
+def fileFilter() -> str:
+    '''
+    Return the filter of the file dialogs with all the registered formats.
+    '''
+    patterns = ' '.join('*' + ext for ext in extensions())
+    return f"Images ({patterns})"
+
+
+class ImageSource:
+
+    def __init__(self, fileName: str, reader: ImageReader | None = None):
+        '''
+        An image file: the header is read at the first use of 'header' (or
+        shape, dtype...), a frame when 'frame' is called. The last frame read
+        is kept.
+
+        Args:
+            fileName: (str)
+                the file.
+            reader: (ImageReader)
+                the reader of the file, chosen with the extension if None.
+        '''
+        self.fileName = str(fileName)
+        self.reader = reader if reader is not None else readerFor(self.fileName)
+        self._header = None
+        self._frame = (None, None)  # (index, frame)
+
+    @property
+    def header(self) -> ImageHeader:
+        '''
+        property that return the header of the file (read once).
+        '''
+        if self._header is None:
+            self._header = self.reader.header(self.fileName)
+        return self._header
+
+    @property
+    def shape(self) -> tuple:
+        '''
+        property that return the shape of a frame as displayed.
+        '''
+        return self.header.shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        '''
+        property that return the dtype of the frames.
+        '''
+        return self.header.dtype
+
+    @property
+    def metadata(self) -> dict:
+        '''
+        property that return the metadata of the header.
+        '''
+        return self.header.metadata
+
+    def __len__(self) -> int:
+        return self.header.frames
+
+    def frame(self, index: int = 0) -> np.ndarray:
+        '''
+        Return the frame 'index' as displayed.
+        '''
+        if self._frame[0] != index:
+            self._frame = (index, self.reader.frame(self.fileName, index))
+        return self._frame[1]
+
+    @property
+    def data(self) -> np.ndarray:
+        '''
+        property that return the first frame.
+        '''
+        return self.frame(0)
+
+    def __repr__(self) -> str:
+        return f"ImageSource({self.fileName!r}, {self.reader.name})"
+
+
+def openImage(fileName: str) -> ImageSource:
+    '''
+    Return the ImageSource of the file (nothing is read yet).
+    Raise ValueError if the format is unknown.
+    '''
+    return ImageSource(fileName)
+
+
+def readImage(fileName: str, index: int = 0) -> np.ndarray:
+    '''
+    Return the frame 'index' of the file as displayed.
+    Raise ValueError if the format is unknown.
+    '''
+    return openImage(fileName).frame(index)
+
+
+for _reader in (TxtReader(), PillowReader(), SpeReader(), SifReader(), NpyReader()):
+    registerReader(_reader)
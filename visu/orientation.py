@@ -0,0 +1,122 @@
+'''
+Orientation of the images: the 8 rotations and flips of a rectangle.
+
+An 'Orientation' is applied as a numpy view (no copy of the frame); the
+orientations are composed and inverted without touching the data, so the
+flips and rotation of SEE are applied with a single view and the inverse
+orientation is applied for free before saving.
+
+    orientation = Orientation.fromSettings(flipUpDown=True, rotate=1)
+    view = orientation.apply(frame)            # np.rot90(np.flipud(frame), 1)
+    frame = orientation.inverse().apply(view)
+
+The image files store the images rotated compared to the display (TIFF, sif):
+the loaders apply FILE_TO_DISPLAY, the savers DISPLAY_TO_FILE. The txt files
+are saved and read as displayed.
+'''
+
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+
+# small image with distinct values used to identify an orientation
+_PROBE = np.arange(6).reshape(2, 3)
+
+
+@dataclass(frozen=True)
+class Orientation:
+    '''
+    np.rot90(data, rotate) applied after a flip of the axis 0 if 'flip'.
+
+    Args:
+        rotate: (int)
+            number of rotations of 90 degrees (0 to 3).
+        flip: (bool)
+            flip up/down (axis 0) before the rotation.
+    '''
+    rotate: int = 0
+    flip: bool = False
+
+    def __post_init__(self):
+        object.__setattr__(self, "rotate", int(self.rotate) % 4)
+        object.__setattr__(self, "flip", bool(self.flip))
+
+    def apply(self, data: np.ndarray) -> np.ndarray:
+        '''
+        Return a view of 'data' (2D or more, the first two axes are oriented).
+        '''
+        if self.flip:
+            data = np.flip(data, 0)
+        if self.rotate:
+            data = np.rot90(data, self.rotate)
+        return data
+
+    def then(self, other: "Orientation") -> "Orientation":
+        '''
+        Return the orientation applying 'self' and then 'other'.
+        '''
+        return _compose(self, other)
+
+    def inverse(self) -> "Orientation":
+        '''
+        Return the orientation undoing 'self'.
+        '''
+        return _inverse(self)
+
+    @property
+    def isIdentity(self) -> bool:
+        '''
+        property that return True if the orientation does nothing.
+        '''
+        return self.rotate == 0 and not self.flip
+
+    @staticmethod
+    def fromSettings(flipUpDown: bool = False, flipLeftRight: bool = False,
+                     rotate: int = 0) -> "Orientation":
+        '''
+        Orientation of np.rot90(flipped data, rotate) with the flips of SEE:
+        np.flipud if 'flipUpDown', np.fliplr if 'flipLeftRight'.
+        '''
+        return _fromSettings(bool(flipUpDown), bool(flipLeftRight), int(rotate) % 4)
+
+
+def _identify(image: np.ndarray) -> Orientation:
+    '''
+    Return the orientation giving 'image' from the probe.
+    '''
+    for orientation in ALL:
+        result = orientation.apply(_PROBE)
+        if result.shape == image.shape and np.array_equal(result, image):
+            return orientation
+    raise ValueError("not an orientation of the probe")
+
+
+@lru_cache(maxsize=None)
+def _compose(first: Orientation, second: Orientation) -> Orientation:
+    return _identify(second.apply(first.apply(_PROBE)))
+
+
+@lru_cache(maxsize=None)
+def _inverse(orientation: Orientation) -> Orientation:
+    for candidate in ALL:
+        if _compose(orientation, candidate).isIdentity:
+            return candidate
+    raise ValueError("orientation without inverse")
+
+
+@lru_cache(maxsize=None)
+def _fromSettings(flipUpDown: bool, flipLeftRight: bool, rotate: int) -> Orientation:
+    orientation = IDENTITY
+    if flipUpDown:
+        orientation = orientation.then(FLIP_UD)
+    if flipLeftRight:
+        orientation = orientation.then(FLIP_LR)
+    return orientation.then(Orientation(rotate))
+
+
+ALL = [Orientation(rotate, flip) for flip in (False, True) for rotate in range(4)]
+IDENTITY = Orientation()
+FLIP_UD = Orientation(0, True)  # np.flipud
+FLIP_LR = Orientation(2, True)  # np.fliplr
+FILE_TO_DISPLAY = Orientation(3)  # np.rot90(data, 3) of the loaders
+DISPLAY_TO_FILE = FILE_TO_DISPLAY.inverse()  # np.rot90(data, 1) before saving
@@ -105,23 +105,43 @@ class WINSPECTRO(Build_Interface.Spectrometer_Interface):
     #       Display and generate data for DiagServ (dictionary)
     #####################################################################
     def Display(self, data):
+        self.showResult(self.compute(data, self.flip_image.isChecked(), self.integration_bounds_dict()))
 
-        # Deconvolve and display 2D data
-        if self.flip_image.isChecked():
+    def compute(self, data, flip=False, bounds=None):
+        '''
+        Deconvolve the image and integrate the spectrum over the angle.
+        No widget is used: it can run in a worker thread (see analysisDispatcher),
+        but two 'compute' of this window must not run at the same time.
+        :param data: the 2D image of the spectrometer
+        :param flip: flip the image before the deconvolution
+        :param bounds: 'integration_bounds_dict()' read in the GUI thread
+        :return: (deconvolved image, energy, integrated spectrum)
+        '''
+        # Deconvolve 2D data
+        if flip:
             self.deconvolved_spectrum.deconvolve_data(np.flip(data.T, axis=1))
         else:
             self.deconvolved_spectrum.deconvolve_data(data.T)
-        self.image_histogram.setImage(self.deconvolved_spectrum.image.T, autoLevels=True, autoDownsample=True)
 
-        # Integrate over angle and show graph
-        self.deconvolved_spectrum.integrate_spectrum(self.integration_bounds_dict()['signal'],
-                                                     self.integration_bounds_dict()['bkg'])
-        self.dnde_image.plot(self.deconvolved_spectrum.energy, self.deconvolved_spectrum.integrated_spectrum)
+        # Integrate over angle
+        bounds = bounds or self.integration_bounds_dict()
+        self.deconvolved_spectrum.integrate_spectrum(bounds['signal'], bounds['bkg'])
+        return (self.deconvolved_spectrum.image, self.deconvolved_spectrum.energy,
+                self.deconvolved_spectrum.integrated_spectrum)
+
+    def showResult(self, result):
+        # display 2D data and show graph
+        image, energy, integrated_spectrum = result
+        self.image_histogram.setImage(image.T, autoLevels=True, autoDownsample=True)
+        self.dnde_image.plot(energy, integrated_spectrum)
 
-    def spectro_dict(self, temp_dataArray):
+    def spectro_dict(self, temp_dataArray, spectrum=None):
         # Creation of dictionary to pass to diagServ ; cut energy from interface to remove noise
-        self.spectro_data_dict = Spectrum_Features.build_dict(self.deconvolved_spectrum.energy,
-                                                              self.deconvolved_spectrum.integrated_spectrum,
+        # spectrum: (energy, integrated spectrum) of the shot, the last deconvolved one if None
+        if spectrum is None:
+            spectrum = (self.deconvolved_spectrum.energy, self.deconvolved_spectrum.integrated_spectrum)
+        self.spectro_data_dict = Spectrum_Features.build_dict(spectrum[0],
+                                                              spectrum[1],
                                                               temp_dataArray[1],
                                                               energy_bounds=[self.min_cutoff_energy_ctl.value(),
                                                                              self.max_cutoff_energy_ctl.value()])
@@ -0,0 +1,204 @@
+'''
+Timing of the stages of the display of a frame.
+
+Each stage is timed with a span, the last durations of each stage are kept
+to give rolling percentiles:
+
+    timer = StageTimer()
+    with timer.span("filter"):
+        ...
+    timer.summary()         # {stage: {"count", "p50_ms", "p90_ms", "p99_ms", "max_ms", "last_ms"}}
+    timer.statusText()      # short text of the slowest stages for a status bar
+    timer.dump("timing.json")
+
+Other windows can time their own work in the same timer:
+
+    fitSpan = timer.register("spectro/fit")
+    with fitSpan():
+        ...
+
+A span costs two 'perf_counter' calls and a deque append; spans of a disabled
+timer do nothing. The spans can be used from any thread.
+
+Spans can be nested: a stage containing other spans ("render" around
+"setImage" and "coupe") is a parent stage. It stays in 'summary' but
+'statusText' ranks only the leaf stages, so the total is not shown above its
+own parts.
+'''
+
+import json
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from functools import partial
+import numpy as np
+
+_NOTHING = nullcontext()
+
+
+class _Span:
+    __slots__ = ("timer", "name", "t0")
+
+    def __init__(self, timer, name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        opened = self.timer._opened()
+        if opened:
+            self.timer._addParent(opened[-1])
+        opened.append(self.name)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.t0)
+        self.timer._opened().pop()
+        return False
+
+
+class StageTimer:
+
+    def __init__(self, window: int = 500, enabled: bool = True):
+        '''
+        Rolling durations of named stages.
+
+        Args:
+            window: (int)
+                number of durations kept for each stage.
+            enabled: (bool)
+                if False the spans are not timed.
+        '''
+        self.window = window
+        self.enabled = enabled
+        self._durations = {}  # stage -> deque of durations in s
+        self._parents = set()  # stages which contained other spans
+        self._local = threading.local()  # spans opened in each thread
+        self._lock = threading.Lock()
+
+    def _opened(self) -> list:
+        '''
+        Return the names of the spans opened in the current thread.
+        '''
+        opened = getattr(self._local, "opened", None)
+        if opened is None:
+            opened = self._local.opened = []
+        return opened
+
+    def _addParent(self, name: str) -> None:
+        '''
+        Mark the stage 'name' as containing other stages.
+        '''
+        if name not in self._parents:
+            with self._lock:
+                self._parents.add(name)
+
+    def span(self, name: str):
+        '''
+        Return a context manager timing the stage 'name'.
+        '''
+        if not self.enabled:
+            return _NOTHING
+        return _Span(self, name)
+
+    def register(self, name: str):
+        '''
+        Declare the stage 'name' (it appears in 'summary' before being timed)
+        and return a function giving its span: 'with timer.register(name)():'.
+        '''
+        with self._lock:
+            self._durations.setdefault(name, deque(maxlen=self.window))
+        return partial(self.span, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        '''
+        Add a duration (in s) to the stage 'name'.
+        '''
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = deque(maxlen=self.window)
+            durations.append(seconds)
+
+    @property
+    def stages(self) -> list:
+        '''
+        property that return the names of the stages.
+        '''
+        with self._lock:
+            return list(self._durations)
+
+    @property
+    def leafStages(self) -> list:
+        '''
+        property that return the names of the stages which never contained
+        another span.
+        '''
+        with self._lock:
+            return [name for name in self._durations if name not in self._parents]
+
+    def reset(self) -> None:
+        '''
+        Forget all the durations (the stages stay registered).
+        '''
+        with self._lock:
+            for durations in self._durations.values():
+                durations.clear()
+
+    def summary(self) -> dict:
+        '''
+        Return the percentiles of the durations in ms for each stage.
+        '''
+        with self._lock:
+            samples = {name: list(durations) for name, durations in self._durations.items()}
+        summary = {}
+        for name, durations in samples.items():
+            if len(durations) == 0:
+                summary[name] = {"count": 0}
+                continue
+            p50, p90, p99 = np.percentile(durations, [50, 90, 99]) * 1000
+            summary[name] = {"count": len(durations),
+                             "p50_ms": round(float(p50), 3),
+                             "p90_ms": round(float(p90), 3),
+                             "p99_ms": round(float(p99), 3),
+                             "max_ms": round(max(durations) * 1000, 3),
+                             "last_ms": round(durations[-1] * 1000, 3)}
+        return summary
+
+    def statusText(self, nbStages: int = 4, stages: list | None = None) -> str:
+        '''
+        Return the median duration of the 'nbStages' slowest stages,
+        ex: 'setImage 8.1  filter 3.2  coupe 1.0 ms (p50)'.
+
+        Args:
+            nbStages: (int)
+                number of stages in the text.
+            stages: (list)
+                the stages to consider, the leaf stages if None.
+        '''
+        summary = self.summary()
+        if stages is None:
+            stages = self.leafStages
+        timed = [(values["p50_ms"], name) for name, values in summary.items()
+                 if values["count"] > 0 and name in stages]
+        timed.sort(reverse=True)
+        if len(timed) == 0:
+            return ''
+        text = '  '.join(f"{name} {p50:.1f}" for p50, name in timed[:nbStages])
+        return text + ' ms (p50)'
+
+    def dump(self, fileName: str, samples: bool = False) -> str:
+        '''
+        Write the summary (and the durations in ms if 'samples') in a json file.
+        '''
+        content = {"date": time.strftime("%Y_%m_%d_%H_%M_%S"),
+                   "window": self.window,
+                   "stages": self.summary()}
+        if samples:
+            with self._lock:
+                content["samples_ms"] = {name: [round(d * 1000, 4) for d in durations]
+                                         for name, durations in self._durations.items()}
+        with open(fileName, "w") as f:
+            json.dump(content, f, indent=1)
+        return fileName
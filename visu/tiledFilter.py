@@ -0,0 +1,134 @@
+'''
+Gaussian and median filters of large frames computed by bands on a pool of threads.
+
+The frame is cut in bands of rows, each band is filtered with 'halo' rows of
+its neighbours (the radius of the kernel) and only its own rows are written
+in the output. The scipy filters release the GIL, so the bands are filtered
+in parallel, and the result is identical to the filter of the whole frame:
+
+    gaussianFilter(data, sigma)                 # == scipy.ndimage.gaussian_filter(data, sigma)
+    medianFilter(data, size, output=buffer)     # == scipy.ndimage.median_filter(data, size=size)
+
+The gaussian filter is separable (one 1D pass per axis), so the halo is only
+needed along the axis cut in bands. Small frames and filters without effect
+(sigma 0, size 1) do not use the threads.
+'''
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy.ndimage import gaussian_filter, median_filter
+
+MIN_PIXELS = 512 * 512  # smaller frames are filtered in the calling thread
+
+_executor = None
+_executorLock = threading.Lock()
+
+
+def maxWorkers() -> int:
+    '''
+    Return the number of threads of the pool (number of cpu).
+    '''
+    return os.cpu_count() or 1
+
+
+def _pool() -> ThreadPoolExecutor:
+    '''
+    Return the thread pool shared by the filters, created at the first use.
+    '''
+    global _executor
+    with _executorLock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=maxWorkers(),
+                                           thread_name_prefix="filter")
+        return _executor
+
+
+def bands(length: int, nbBands: int) -> list:
+    '''
+    Return the (start, stop) of 'nbBands' bands of about the same size.
+    '''
+    limits = np.linspace(0, length, nbBands + 1).round().astype(int)
+    return [(int(start), int(stop)) for start, stop in zip(limits[:-1], limits[1:])
+            if stop > start]
+
+
+def tiledFilter(filterFunc, data: np.ndarray, halo: int, output: np.ndarray | None = None,
+                workers: int | None = None, minPixels: int = MIN_PIXELS) -> np.ndarray:
+    '''
+    Apply 'filterFunc' to 'data' by bands of rows in the thread pool.
+
+    Args:
+        filterFunc: (callable)
+            filterFunc(block) return the filtered block (same shape and dtype),
+            the value of a pixel must only depend on the pixels at less than
+            'halo' rows.
+        data: (np.ndarray)
+            the image.
+        halo: (int)
+            number of rows of the neighbour bands given with each band.
+        output: (np.ndarray)
+            array receiving the result (must not overlap 'data'), allocated if None.
+        workers: (int)
+            number of bands, the number of cpu if None.
+        minPixels: (int)
+            images with less pixels are filtered in one block.
+    '''
+    data = np.asarray(data)
+    if output is None:
+        output = np.empty_like(data)
+    elif np.may_share_memory(output, data):
+        raise ValueError("the output of the filter must not overlap the image")
+    if workers is None:
+        workers = maxWorkers()
+    # bands much thinner than the halo would filter the same rows several times
+    nbBands = min(workers, data.shape[0] // max(2 * halo, 1)) if data.ndim > 0 else 1
+    if nbBands <= 1 or data.size < minPixels:
+        output[...] = filterFunc(data)
+        return output
+
+    length = data.shape[0]
+
+    def filterBand(start, stop):
+        low, high = max(start - halo, 0), min(stop + halo, length)
+        result = filterFunc(data[low:high])
+        output[start:stop] = result[start - low:stop - low]
+
+    futures = [_pool().submit(filterBand, start, stop) for start, stop in bands(length, nbBands)]
+    for future in futures:
+        future.result()  # raise the error of a band
+    return output
+
+
+def gaussianFilter(data: np.ndarray, sigma: float, output: np.ndarray | None = None,
+                   workers: int | None = None, truncate: float = 4.0) -> np.ndarray:
+    '''
+    Same result as scipy.ndimage.gaussian_filter(data, sigma, truncate=truncate)
+    computed by bands in parallel.
+    '''
+    sigma0 = float(np.ravel(sigma)[0])  # sigma along the axis cut in bands
+    if np.all(np.asarray(sigma) == 0):  # no filter
+        if output is None:
+            return data.copy()
+        output[...] = data
+        return output
+    halo = int(truncate * sigma0 + 0.5)  # radius of the kernel as computed by scipy
+    return tiledFilter(lambda block: gaussian_filter(block, sigma, truncate=truncate),
+                       data, halo, output, workers)
+
+
+def medianFilter(data: np.ndarray, size: int, output: np.ndarray | None = None,
+                 workers: int | None = None) -> np.ndarray:
+    '''
+    Same result as scipy.ndimage.median_filter(data, size=size)
+    computed by bands in parallel.
+    '''
+    size = int(size)
+    if size <= 1:  # no filter
+        if output is None:
+            return data.copy()
+        output[...] = data
+        return output
+    return tiledFilter(lambda block: median_filter(block, size=size),
+                       data, size // 2, output, workers)
@@ -31,20 +31,20 @@ from PyQt6.QtGui import QFont
 import sys
 import time
 import os
+from dataclasses import replace
+from functools import partial
 
 import numpy as np
 import qdarkstyle  # pip install qdarkstyle https://github.com/ColinDuquesnoy/QDarkStyleSheet  sur conda
 from scipy.interpolate import splrep, sproot
-from scipy.ndimage import gaussian_filter, median_filter
+from scipy.ndimage import gaussian_filter
 from PIL import Image
-from visu.winspec import SpeFile
 from visu.visualLight import SEELIGHT
 from visu.winSuppE import WINENCERCLED
 from visu.WinCut import GRAPHCUT
 from visu.winMeas import MEAS
 from visu.WinOption import OPTION
 from visu.WinPreference import PREFERENCES
-from visu.andor import SifFile
 from visu.winFFT import WINFFT
 from visu.winMath import WINMATH
 from visu.winPointing import WINPOINTING
@@ -53,6 +53,13 @@ from visu import aboutWindows
 from visu.winZoom import ZOOM
 from visu.winCrop import WINCROP
 from visu.spectrum_analysis.winSpectro import WINSPECTRO
+from visu.imageProcessing import ImagePipeline, ProcessingParams, autoSaveName, tiffArray
+from visu.frameProducts import FrameProducts
+from visu.analysisDispatcher import AnalysisDispatcher
+from visu.stageTimer import StageTimer
+from visu.orientation import Orientation, FILE_TO_DISPLAY, DISPLAY_TO_FILE
+from visu.backgroundLibrary import BackgroundKey, RunningBackground
+from visu.imageReaders import openImage, fileFilter
 # try :
 #     from visu.Win3D import GRAPH3D #conda install pyopengl
 # except :
@@ -63,7 +70,8 @@ import visu
 from laplace_server.server_lhc import ServerLHC
 from laplace_server.protocol import DEVICE_CAMERA
 from laplace_server.server_controller import ServerController
-# from visu.diagServer import diagServer
+from visu.diagServer import diagServer
+from visu.diagServerProcess import diagServerProcess
 
 __version__ = visu.__version__
 __author__ = visu.__author__
@@ -89,6 +97,16 @@ class SEE(QMainWindow):
             aff = "right" or "left" display button on the  right or on the left
             fft="on" or "off" display 1d and 2D fft
             plot3D
+            server = "lhc" (default) laplace ServerLHC in the GUI process,
+                "process" diagServer in its own process (see diagServerProcess),
+                "thread" diagServer in a thread of the GUI process
+            serverAddress = address of the diagServer, default "tcp://*:1110"
+            coalesce = True: draw only the last received frame (every frame
+                is still analysed), default False: every frame is drawn
+            processInWorker = True: the camera frames are processed (background,
+                filters, fluence) in a worker of the dispatcher, the rest of the
+                analysis runs in the GUI thread when the result arrives,
+                default False: processed in the GUI thread
     '''
 
     signalMeas = QtCore.pyqtSignal(object)
@@ -120,12 +138,26 @@ class SEE(QMainWindow):
         self.aboutWidget = aboutWindows.ABOUT()
         self.signalTrans = dict()  # dict to emit multivariable
         self.frameNumber = 0
+        # display coalescing: frames analysed, drawn and not drawn
+        self.framesReceived = 0
+        self.framesRendered = 0
+        self.framesDropped = 0
+        self.renderPending = False
         
         # default coefficiants for gaussian, median and threshold filters
         self.threshold = 0
         self.sigma = 0
+        self.timer = StageTimer()  # timing of the stages of the display
+        self.pipeline = ImagePipeline(timer=self.timer)  # processing of the frames without Qt
+        self.workerPipeline = ImagePipeline(timer=self.timer)  # used only by the "process" jobs
+        self.products = FrameProducts()  # products of the frame shared by the windows
 
         self.numSnapbg = 0
+        self.darkAccumulator = None  # RunningBackground of 'Snap Background'
+        self.exposure = None  # camera settings of the background key (see setCameraSettings)
+        self.cameraRoi = None
+        self._bgKey = None  # key and background of the library used by the auto background
+        self._bgAuto = None
 
         # kwds definition  :
 
@@ -249,6 +281,50 @@ class SEE(QMainWindow):
             self.winEncercled = WINENCERCLED(parent=self, conf=self.conf,
                                              name=self.name)
 
+        if "coalesce" in kwds:  # draw only the last received frame
+            self.coalesce = kwds["coalesce"]
+        else:
+            self.coalesce = False  # opt-in: every frame drawn, as before
+
+        if "workers" in kwds:  # threads for the analysis windows, 0: in the GUI thread
+            self.workers = kwds["workers"]
+        else:
+            self.workers = None  # number of cpu
+        if "processInWorker" in kwds:  # process the camera frames out of the GUI thread
+            self.processInWorker = kwds["processInWorker"]
+        else:
+            self.processInWorker = False
+        if self.workers == 0:
+            self.dispatcher = None
+        else:
+            self.dispatcher = AnalysisDispatcher(maxWorkers=self.workers, parent=self,
+                                                 timer=self.timer)
+            if self.winSpectro is not None:
+                # the spectro window gets its results from the workers (see showSpectro),
+                # the spectro signals are kept for the other listeners
+                self.signalSpectro.disconnect(self.winSpectro.Display)
+                self.signalSpectroList.disconnect(self.winSpectro.spectro_dict)
+
+        if "timing" in kwds:  # time the stages of the display (see stageTimer)
+            self.timer.enabled = kwds["timing"]
+        else:
+            self.timer.enabled = True
+
+        if "dtype" in kwds:  # working dtype of the processing: 'float32', 'float64' or 'auto'
+            self.workingDtype = kwds["dtype"]
+        else:
+            self.workingDtype = "float32"
+
+        if "server" in kwds:  # 'lhc', 'process' or 'thread'
+            self.serverKind = kwds["server"]
+        else:
+            self.serverKind = "lhc"
+
+        if "serverAddress" in kwds:
+            self.serverAddress = kwds["serverAddress"]
+        else:
+            self.serverAddress = "tcp://*:1110"
+
         if "plot3d" in kwds:
             self.plot3D = kwds["plot3d"]
         else:
@@ -315,7 +391,7 @@ class SEE(QMainWindow):
 
             self.data = (twoD_Gaussian(self.x, self.y, 200, 200, 600, 40, 40,
                                        0, 10) +
-                         (50*np.random.rand(self.dimx, self.dimy)).round())
+                         (50*np.random.rand(self.dimx, self.dimy)).round()).astype(np.float32)
 
             # self.data=(50*np.random.rand(self.dimx,self.dimy)).round() + 150
         else:
@@ -332,35 +408,45 @@ class SEE(QMainWindow):
         self.yminR = 0
         self.ymaxR = self.dimy
 
-        # self.serv = diagServer(parent=self, data={"state":"starting..."}) # init the server
-        try: 
-            self.serv = ServerLHC(
-                name = "Spectro 1",
-                address = "tcp://*:0089",
-                freedom = 0,
-                device = DEVICE_CAMERA,
-                data = {}
-            )
-        except Exception as e:
-            print(f'Exception : {e}')
-            try: 
+        self.serv = None
+        if self.serverKind in ("process", "thread"):
+            # encoding and answers out of the GUI thread ('process': out of its GIL too)
+            serverClass = diagServerProcess if self.serverKind == "process" else diagServer
+            try:
+                self.serv = serverClass(address=self.serverAddress, name=self.name,
+                                        data={"state": "starting..."})
+            except Exception as e:
+                print(f'Exception : {e}')
+        else:
+            try:
                 self.serv = ServerLHC(
-                name = "Spectro 2",
-                address = "tcp://*:0090",
-                freedom = 0,
-                device = DEVICE_CAMERA,
-                data = {}
-            )
-            except Exception as e: 
+                    name = "Spectro 1",
+                    address = "tcp://*:0089",
+                    freedom = 0,
+                    device = DEVICE_CAMERA,
+                    data = {}
+                )
+            except Exception as e:
                 print(f'Exception : {e}')
-            
+                try:
+                    self.serv = ServerLHC(
+                    name = "Spectro 2",
+                    address = "tcp://*:0090",
+                    freedom = 0,
+                    device = DEVICE_CAMERA,
+                    data = {}
+                )
+                except Exception as e:
+                    print(f'Exception : {e}')
+
         self.server_controller = ServerController()
-        self.serv.start() # start the server thread
+        if self.serv is not None:
+            self.serv.start() # start the server thread
 
         self.shortcut()
         self.actionButton()
         imageOuverture = Image.open(self.icon+'LOA.png')
-        imageOuverture = np.rot90(np.array (imageOuverture),3)
+        imageOuverture = FILE_TO_DISPLAY.apply(np.array(imageOuverture))
         self.imh.setImage(imageOuverture, autoLevels=True, autoDownsample=True)
         #self.Display(self.data)
         self.activateWindow()
@@ -673,6 +759,30 @@ class SEE(QMainWindow):
         self.removeHP.setChecked(False)
         self.ProcessMenu.addAction(self.removeHP)
 
+        self.coalesceAct = QAction('Draw Last Frame Only', self)
+        self.coalesceAct.setCheckable(True)
+        self.coalesceAct.setChecked(self.coalesce)
+        self.ProcessMenu.addAction(self.coalesceAct)
+
+        self.timingAct = QAction('Show Timing', self)
+        self.timingAct.setCheckable(True)
+        self.timingAct.setChecked(False)
+        self.ProcessMenu.addAction(self.timingAct)
+        self.timingAct.triggered.connect(self.showTiming)
+
+        self.saveTimingAct = QAction('Save Timing', self)
+        self.ProcessMenu.addAction(self.saveTimingAct)
+        self.saveTimingAct.triggered.connect(self.saveTiming)
+
+        self.timingLabel = QLabel()  # median time of the slowest stages
+        self.timingLabel.setStyleSheet("font:8pt")
+        self.timingLabel.setMaximumHeight(30)
+        self.timingLabel.setVisible(False)
+        self.statusBar.addWidget(self.timingLabel)
+        self.timingRefresh = QtCore.QTimer(self)
+        self.timingRefresh.setInterval(1000)
+        self.timingRefresh.timeout.connect(self.updateTiming)
+
         if self.plot3D is True:
             self.box3d = QPushButton('3D', self)
             self.toolBar.addWidget(self.box3d)
@@ -1035,10 +1145,19 @@ class SEE(QMainWindow):
         self.pentaButton.setChecked(False)
         self.ligneButton.setChecked(False)
 
+    def arrayRegion(self, roi):
+        '''
+        Data of the image in the roi, extracted once per frame and roi position
+        (shared by the cut, measurement, crop and pointing windows).
+        '''
+        key = ('region', id(roi), tuple(roi.pos()), tuple(roi.size()), roi.angle(),
+               tuple((p.x(), p.y()) for _, p in roi.getLocalHandlePositions()))
+        return self.products.memo(key, lambda: roi.getArrayRegion(self.data, self.imh), self.data)
+
     def RectChanged(self):
         '''Take ROI
         '''
-        self.cut = (self.plotRect.getArrayRegion(self.data, self.imh))
+        self.cut = self.arrayRegion(self.plotRect)
         self.xini=self.plotRect.pos()[0]
         self.yini=self.plotRect.pos()[1]
         if self.winPref.plotRectOpt.currentIndex() == 0:
@@ -1093,7 +1212,7 @@ class SEE(QMainWindow):
     def CercChanged(self):
         '''take ROIc
         '''
-        self.cut = (self.plotCercle.getArrayRegion(self.data, self.imh))
+        self.cut = self.arrayRegion(self.plotCercle)
         self.xini=self.plotCercle.pos()[0]
         self.yini=self.plotCercle.pos()[1]
         self.cut1 = self.cut.mean(axis=1)
@@ -1118,7 +1237,7 @@ class SEE(QMainWindow):
             self.p1.addItem(self.plotPentagon)
 
     def PentaChanged(self):
-        self.cut = (self.plotPentagon.getArrayRegion(self.data, self.imh))
+        self.cut = self.arrayRegion(self.plotPentagon)
         self.cut1 = self.cut.mean(axis=1)
         self.xini=self.plotPentagon.pos()[0]
         self.yini=self.plotPentagon.pos()[1]
@@ -1166,6 +1285,56 @@ class SEE(QMainWindow):
                 if answer == QMessageBox.StandardButton.Cancel:
                     self.snapSaveWarningShowed = False
                     return
+        # running mean of the current frame and the next ones (see addDark)
+        self.darkAccumulator = RunningBackground(std=True)
+        self.addDark(self.dataOrg)
+
+    def addDark(self, frame):
+        '''
+        Add a raw frame to the background snapped, saved when the number of
+        shots of the options is reached.
+        '''
+        try:
+            count = self.darkAccumulator.add(frame)
+        except ValueError as e:  # the frame shape changed during the snap
+            self.darkAccumulator = None
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Icon.Critical)
+            msg.setText("Background not snapped !")
+            msg.setInformativeText(str(e))
+            msg.setWindowTitle("Warning ...")
+            msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
+            msg.exec()
+            return
+        nbShots = self.winOpt.bgShotsBox.value()
+        if count < nbShots:
+            print(f'snap background: {count}/{nbShots} shots')
+            return
+        dark = self.darkAccumulator
+        self.darkAccumulator = None
+        self.saveDark(dark)
+
+    def backgroundKey(self, shape):
+        '''
+        Return the BackgroundKey of the frames of 'shape' with the current
+        camera settings.
+        '''
+        return BackgroundKey(self.name, shape, self.cameraRoi, self.exposure)
+
+    def setCameraSettings(self, exposure=None, roi=None):
+        '''
+        Settings of the camera used to find the background in the library,
+        given by the camera program.
+        '''
+        self.exposure = exposure
+        self.cameraRoi = roi
+        self._bgKey = None
+
+    def saveDark(self, dark):
+        '''
+        Save the mean of the snapped background as TIFF or txt and in the
+        background library, and use it as background.
+        '''
         self.numSnapbg += 1
         date = time.strftime("%Y_%m_%d_%H_%M_%S")
         fileName = "snap_background"
@@ -1177,17 +1346,27 @@ class SEE(QMainWindow):
             nomFichier = f"{self.pathAutoSave}/{fileName}_{self.numSnapbg}"
             #print(nomFichier)
             
-        print(nomFichier, 'saved')
+        print(nomFichier, f'saved (mean of {dark.count} shots)')
         if self.winOpt.checkBoxTiff.isChecked():  # save as tiff
-            self.dataS = np.rot90(self.data, 1)
-            img_PIL = Image.fromarray(self.dataS)
+            self.dataS = DISPLAY_TO_FILE.apply(dark.mean)
+            img_PIL = Image.fromarray(tiffArray(self.dataS))
             ext = "TIFF"
             img_PIL.save(str(nomFichier) + f'.{ext}', format=ext)
         else:
             ext = "txt"
-            np.savetxt(str(nomFichier)+'.{ext}', self.data)
+            self.dataS = dark.mean  # txt files are saved as displayed
+            np.savetxt(str(nomFichier)+f'.{ext}', self.dataS)
 
-        self.winOpt.loadBg(nomFichier + f'.{ext}')
+        # the library keeps the mean and std for these camera settings,
+        # memory-mapped, the background is not read again from the file
+        key = self.backgroundKey(dark.shape)
+        try:
+            fichier = self.winOpt.backgroundLibrary().save(key, dark)
+            self.winOpt.setBackground(self.winOpt.backgroundLibrary().load(key)[0], fichier)
+        except OSError as e:
+            print('background library error:', e)
+            self.winOpt.setBackground(dark.mean, nomFichier + f'.{ext}')
+        self._bgKey = None
 
 
     def Measurement(self):
@@ -1199,7 +1378,8 @@ class SEE(QMainWindow):
                 self.winM.setFile(self.nomFichier)
                 self.open_widget(self.winM)
                 MeasData=[self.cut,self.xini,self.yini,0,0]
-                self.signalMeas.emit(MeasData)
+                self.dispatch("meas", self.winM, MeasData, self.winM.ThresholdState,
+                              self.winM.threshold, signal=self.signalMeas)
                 # self.winM.Display(self.cut)
 
         if self.ite == 'cercle':
@@ -1208,7 +1388,8 @@ class SEE(QMainWindow):
                 self.winM.setFile(self.nomFichier)
                 self.open_widget(self.winM)
                 MeasData=[self.cut,self.xini,self.yini,0,0]
-                self.signalMeas.emit(MeasData)
+                self.dispatch("meas", self.winM, MeasData, self.winM.ThresholdState,
+                              self.winM.threshold, signal=self.signalMeas)
                 # self.winM.Display(self.cut)
 
         if self.ite == 'pentagon':
@@ -1217,14 +1398,16 @@ class SEE(QMainWindow):
                 self.winM.setFile(self.nomFichier)
                 self.open_widget(self.winM)
                 MeasData=[self.cut,0,0,0,0]
-                self.signalMeas.emit(MeasData)
+                self.dispatch("meas", self.winM, MeasData, self.winM.ThresholdState,
+                              self.winM.threshold, signal=self.signalMeas)
 
         if self.ite is None:
             if self.meas is True:
                 self.winM.setFile(self.nomFichier)
                 self.open_widget(self.winM)
                 MeasData=[self.data,0,0,0,0]
-                self.signalMeas.emit(MeasData)
+                self.dispatch("meas", self.winM, MeasData, self.winM.ThresholdState,
+                              self.winM.threshold, signal=self.signalMeas)
 
     def Pointing(self):
         self.open_widget(self.winPointing)
@@ -1245,13 +1428,65 @@ class SEE(QMainWindow):
             pData = self.data
 
         if self.winPref.checkBoxAxeScale.isChecked() == 1:
-            self.signalPointing.emit([pData, self.winPref.stepX,
-                                     self.winPref.stepX,self.xini,self.yini])
-            
+            pointingData = [pData, self.winPref.stepX,
+                            self.winPref.stepX,self.xini,self.yini]
             # self.winPointing.Display(pData,self.winPref.stepX,self.winPref.stepX)
         else:
-            self.signalPointing.emit([pData,1,1,self.xini,self.yini])
+            pointingData = [pData,1,1,self.xini,self.yini]
             # self.winPointing.Display(pData)
+        self.dispatch("pointing", self.winPointing, pointingData,
+                      self.winPointing.centerOfMass.isChecked(), signal=self.signalPointing)
+
+    def dispatch(self, name, window, obje, *options, signal=None, latestOnly=False):
+        '''
+        Send a frame to an analysis window: 'window.compute(obje, *options)' is
+        run by a worker of the dispatcher and 'window.showResult' in the GUI
+        thread. Without dispatcher 'signal' is emitted (or 'window.Display' called).
+
+        Args:
+            name: (str)
+                the name of the analysis, its frames are analysed in order.
+            window:
+                the window with 'compute' and 'showResult' methods.
+            obje: (np.ndarray or list)
+                the frame, or a list starting with the frame.
+            options:
+                the options of 'compute' read from the widgets in the GUI thread.
+            latestOnly: (bool)
+                only the last frame is analysed if the window is late.
+        '''
+        if self.dispatcher is None:
+            if signal is not None:
+                signal.emit(obje)
+            else:
+                window.Display(obje)
+            return
+        if isinstance(obje, np.ndarray):
+            obje = self.frameForWorkers(obje)
+        else:
+            obje = [self.frameForWorkers(obje[0])] + list(obje[1:])
+        self.dispatcher.submit(name, window.compute, window.showResult, obje, *options,
+                               latestOnly=latestOnly)
+
+    def frameForWorkers(self, data):
+        '''
+        Return 'data' for the analysis workers: the buffers of the pipeline are
+        overwritten by the next frames, they are copied (once per frame).
+        '''
+        if not self.pipeline.isBuffer(data):
+            return data
+        return self.products.memo("copy", data.copy, data)
+
+    def showSpectro(self, dataArray, result):
+        '''
+        Display the spectrum computed by a worker for the shot 'dataArray'
+        ([frame, shot number]), send its features to diagServ and emit the
+        spectro signals for the other listeners.
+        '''
+        self.winSpectro.showResult(result)
+        self.winSpectro.spectro_dict(dataArray, spectrum=result[1:])
+        self.signalSpectro.emit(dataArray[0])
+        self.signalSpectroList.emit(dataArray)
 
     def fftTransform(self):
         # show on a new widget fft
@@ -1276,30 +1511,122 @@ class SEE(QMainWindow):
             self.open_widget(self.winFFT)
             self.winFFT.Display(self.data)
 
+    def processingParams(self) -> ProcessingParams:
+        '''
+        Read the processing parameters from the widgets.
+        '''
+        fluence = self.winPref.checkBoxFluence.isChecked() == 1
+        pixelArea = 1
+        if fluence and self.winPref.checkBoxAxeScale.isChecked() == 1:  # en micron
+            pixelArea = 1E-8*self.winPref.stepX*self.winPref.stepY
+        posFluence, sizeFluence = self.roiFluence.pos(), self.roiFluence.size()
+        return ProcessingParams(
+            background=self.checkBoxBg.isChecked() is True,
+            filter=self.filter,
+            sigma=self.sigma,
+            threshold=self.threshold,
+            removeHotPixel=self.removeHP.isChecked() is True,
+            fluence=fluence,
+            energy=self.winPref.energy.value() if fluence else 0,
+            pixelArea=pixelArea,
+            fluenceRegion=(posFluence[0], posFluence[1], sizeFluence[0], sizeFluence[1],
+                           self.roiFluence.angle()),
+            dtype=self.workingDtype)
+
     @pyqtSlot(object)
     def Display(self, data):
         #  display the data and refresh all the calculated things and plots
-        self.data = data
-        
-        if (self.checkBoxBg.isChecked() is True and
-                self.winOpt.dataBgExist is True):
+        with self.timer.span("analyse"):
+            self.Analyse(data)
+        with self.timer.span("render"):
+            self.Render()
+
+    def analyseSettings(self, data):
+        '''
+        Return the parameters of the processing of the frame 'data' and its
+        background (or None), read from the widgets in the GUI thread.
+        '''
+        params = self.processingParams()
+        if self.checkBoxAutoSave.isChecked():  # autosave data
+            self.pathAutoSave = str(self.conf.value(self.name+'/pathAutoSave'))
+            self.fileNameSave = str(self.conf.value(self.name+'/nameFile'))
+            self.numTir = int(self.conf.value(self.name+'/tirNumber'))
+            nomFichier = autoSaveName(self.pathAutoSave, self.fileNameSave, self.numTir,
+                                      date=self.winOpt.checkBoxDate.isChecked())
+            params = replace(params, autoSave=nomFichier,
+                             saveTiff=self.winOpt.checkBoxTiff.isChecked())
+
+        bg = self.winOpt.dataBg if self.winOpt.dataBgExist is True else None
+        if self.winOpt.checkBoxBgAuto.isChecked():  # background of the library for this frame
+            key = self.backgroundKey(np.shape(data))
+            if key != self._bgKey:
+                self._bgKey = key
+                self._bgAuto = self.winOpt.matchBackground(key)
+            if self._bgAuto is not None:
+                bg = self._bgAuto
+        return params, bg
+
+    def Analyse(self, data):
+        '''
+        Process the frame and update everything that needs every frame:
+        measurements, pointing, encercled energy, spectrometer, autosave.
+        '''
+        params, bg = self.analyseSettings(data)
+        self.pipeline.setBackground(bg)
+        self.pipeline.setDefectMap(self.winOpt.defectMap)
+        with self.timer.span("process"):
+            result = self.pipeline.process(data, params)
+        self.analyseResult(result, params, bg)
+
+    def processFrame(self, data, params, bg, defectMap):
+        '''
+        Process a frame in a worker of the dispatcher (no widget). The jobs
+        "process" run one after the other, so 'workerPipeline' is used by one
+        thread at a time. Its buffers are overwritten by the next frames while
+        the result waits for the GUI thread: the result is copied.
+        '''
+        self.workerPipeline.setBackground(bg)
+        self.workerPipeline.setDefectMap(defectMap)
+        with self.timer.span("process"):
+            result = self.workerPipeline.process(data, params)
+        if self.workerPipeline.isBuffer(result.data):
+            if result.roi is not None and np.shares_memory(result.roi, result.data):
+                result.roi = result.roi.copy()
+            result.data = result.data.copy()
+        return result
+
+    def processedFrame(self, params, bg, result):
+        '''
+        Analyse in the GUI thread a frame processed by a worker (see
+        'processFrame') and draw it.
+        '''
+        with self.timer.span("analyse"):
+            self.analyseResult(result, params, bg)
+        self.frameAnalysed()
+
+    def analyseResult(self, result, params, bg):
+        '''
+        Update everything that needs every frame with the processed frame
+        'result' (FrameResult), in the GUI thread.
+        '''
+        self.data = result.data
+        self.products.newFrame(self.data)
+
+        if result.background == 'on':
             self.labelFrameName.setText('bg sub  on frame :')
-            try:
-                self.data = np.where( self.data - self.winOpt.dataBg > 0,  self.data - self.winOpt.dataBg, 0)
-            except Exception:
-                self.winOpt.dataBgExist = False
-                self.checkBoxBg.setChecked(False)
-                self.BackgroundF()
-                self.winOpt.fileBgBox.setText("bgfile not selected")
-                msg = QMessageBox()
-                msg.setIcon(QMessageBox.Icon.Critical)
-                msg.setText("Background not soustracred !")
-                msg.setInformativeText("Background file error  ")
-                msg.setWindowTitle("Warning ...")
-                msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
-                msg.exec()
-        elif (self.checkBoxBg.isChecked() is True 
-              and self.winOpt.dataBgExist is False):
+        elif result.background == 'error':
+            self.winOpt.dataBgExist = False
+            self.checkBoxBg.setChecked(False)
+            self.BackgroundF()
+            self.winOpt.fileBgBox.setText("bgfile not selected")
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Icon.Critical)
+            msg.setText("Background not soustracred !")
+            msg.setInformativeText(f"Background shape {np.shape(bg)} != image shape {np.shape(result.raw)}")
+            msg.setWindowTitle("Warning ...")
+            msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
+            msg.exec()
+        elif result.background == 'missing':
             self.winOpt.fileBgBox.setText("bgfile not selected")
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Icon.Critical)
@@ -1311,38 +1638,90 @@ class SEE(QMainWindow):
         else : 
             self.labelFrameName.setText('bgsub  off frame :')
 
-
-        # filtre
-        if self.filter == 'gauss':
-            self.data = gaussian_filter(self.data, self.sigma)
-            # print('gauss filter')
-        if self.filter == 'median':
-            self.data = median_filter(self.data, size=self.sigma)
-            # print('median filter')
-        if self.filter == 'threshold':  # 0 si sous le seuil
-            self.data = np.where(self.data < self.threshold, 0, self.data)
-        if self.removeHP.isChecked() is True:
-            # Remove hot pixel if data=data.max remplace by mean otherwise by data
-            self.data = np.where(self.data == self.data.max(), self.data.mean(), self.data)
-
         # fluence
-        if self.winPref.checkBoxFluence.isChecked() == 1:  # fluence on
-            energy = self.winPref.energy.value()
-            # print('energy',energy)
+        if params.fluence:
             if self.winPref.checkBoxAxeScale.isChecked() == 0:  # en pixel
-                size = 1  # self.sizeFluenceX*self.sizeFluenceY
                 self.labelValue = ' mJ/pixel2'
-            if self.winPref.checkBoxAxeScale.isChecked() == 1:  # en micron
-                size = 1E-8*self.winPref.stepX*self.winPref.stepY
+            else:  # en micron
                 self.labelValue = ' mJ/cm2'
-
-            enrgTot = self.roiFluence.getArrayRegion(self.data, self.imh).sum()
-
-            self.data = 1000*(self.data*energy/enrgTot)/size  # (microJ/cm2)
-        # self.p1.setAspectLocked(True,ratio=1)
         else:
             self.labelValue = ''
 
+        if self.encercled is True:
+            if self.winEncercled.isWinOpen is True:
+                # self.signalEng.emit(self.data)
+                
+                # select the data in the corresponding ROI or the full image
+                if self.ite == "rect":
+                    reduced = self.arrayRegion(self.plotRect)
+                elif self.ite == "cercle":
+                    reduced = self.arrayRegion(self.plotCercle)
+                else:
+                    # self.Rectangle()
+                    # reduced = self.plotRect.getArrayRegion(self.data, self.imh)
+                    reduced = self.data
+                # print(f"reduced shape = {reduced.shape}")
+                with self.timer.span("encercled"):
+                    self.dispatch("encercled", self.winEncercled, reduced,
+                                  self.winEncercled.checkBoxAuto.isChecked(),
+                                  signal=self.signalEng, latestOnly=True)
+                # self.winEncercled.Display(reduced) ## energy update
+
+        if self.meas is True:
+            if self.winM.isWinOpen is True:  # measurement update
+                with self.timer.span("meas"):
+                    if self.ite == 'rect':
+                        self.RectChanged()
+                        self.Measurement()
+                    elif self.ite == 'cercle':
+                        self.CercChanged()
+                        self.Measurement()
+                    elif self.ite == 'pentagon':
+                        self.PentaChanged()
+                        self.Measurement()
+                    else:
+                        self.Measurement()
+
+        # if self.plot3D is True:
+        #     if self.Widget3D.isWinOpen==True:
+        #         self.Graph3D()
+        if self.winPointing.isWinOpen is True:
+            with self.timer.span("pointing"):
+                self.Pointing()
+        if self.spectro is True: 
+            #if self.winSpectro.isWinOpen is True:
+            temp_shotnumber = -1
+            self.temp_dataArray = [self.data, temp_shotnumber]
+            with self.timer.span("spectro"):
+                if self.dispatcher is None:
+                    self.signalSpectro.emit(self.data)
+                    self.signalSpectroList.emit(self.temp_dataArray)
+                else:  # deconvolution in a worker, features sent with the result
+                    frame = self.frameForWorkers(self.data)
+                    self.dispatcher.submit("spectro", self.winSpectro.compute,
+                                           partial(self.showSpectro, [frame, temp_shotnumber]),
+                                           frame,
+                                           self.winSpectro.flip_image.isChecked(),
+                                           self.winSpectro.integration_bounds_dict())
+
+        self.signalDisplayed.emit(True)
+        
+        #  autosave
+        if result.savedFile is not None:  # saved by the pipeline
+            print(params.autoSave, 'saved')
+            if not self.winOpt.checkBoxServer.isChecked():  
+                # if not connected to server we had +1
+                self.numTir += 1
+                self.winOpt.setTirNumber(self.numTir)
+
+            self.conf.setValue(self.name+"/tirNumber", self.numTir)
+            self.fileName.setText(params.autoSave)
+
+    def Render(self):
+        '''
+        Draw the last processed frame: image, cross profiles, zoom, cut,
+        fft and crop windows.
+        '''
         # color  and sacle
         if self.checkBoxScale.isChecked() == 1:  # color autoscale on
 
@@ -1357,31 +1736,23 @@ class SEE(QMainWindow):
                 self.axeX.setScale(1)
                 self.axeY.setScale(1)
                 self.axeX.showLabel(False)
-            self.imh.setImage(self.data, autoLevels=True, autoDownsample=True)
+            # fixed levels: percentiles of a subsample of the frame (no blow out
+            # by cold or hot pixels), high level raised to the brightest spot
+            with self.timer.span("levels"):
+                levels = self.products.get("levels", self.data)
+            with self.timer.span("setImage"):
+                self.imh.setImage(self.data, autoLevels=False, levels=levels,
+                                  autoDownsample=True)
+                self.hist.setLevels(*levels)
         else:
-            self.imh.setImage(self.data, autoLevels=False, autoDownsample=True)
+            with self.timer.span("setImage"):
+                self.imh.setImage(self.data, autoLevels=False, autoDownsample=True)
 
         # update
-        self.Coupe()  # self.PlotXY() # graph update
+        with self.timer.span("coupe"):
+            self.Coupe()  # self.PlotXY() # graph update
         self.zoomRectupdate()  # update zoom rect
 
-        if self.encercled is True:
-            if self.winEncercled.isWinOpen is True:
-                # self.signalEng.emit(self.data)
-                
-                # select the data in the corresponding ROI or the full image
-                if self.ite == "rect":
-                    reduced = self.plotRect.getArrayRegion(self.data, self.imh)
-                elif self.ite == "cercle":
-                    reduced = self.plotCercle.getArrayRegion(self.data, self.imh)
-                else:
-                    # self.Rectangle()
-                    # reduced = self.plotRect.getArrayRegion(self.data, self.imh)
-                    reduced = self.data
-                # print(f"reduced shape = {reduced.shape}")
-                self.signalEng.emit(reduced)
-                # self.winEncercled.Display(reduced) ## energy update
-
         if self.winCoupe.isWinOpen is True:
             if self.ite == 'line':
                 self.LigneChanged()
@@ -1392,80 +1763,17 @@ class SEE(QMainWindow):
             if self.ite == 'cercle':
                 self.CercChanged()
 
-        if self.meas is True:
-            if self.winM.isWinOpen is True:  # measurement update
-                if self.ite == 'rect':
-                    self.RectChanged()
-                    self.Measurement()
-                elif self.ite == 'cercle':
-                    self.CercChanged()
-                    self.Measurement()
-                elif self.ite == 'pentagon':
-                    self.PentaChanged()
-                    self.Measurement()
-                else:
-                    self.Measurement()
-
         if self.fft is True:
             if self.winFFT.isWinOpen is True:  # fft update
-                self.winFFT.Display(self.data)
+                with self.timer.span("fft"):
+                    self.dispatch("fft", self.winFFT, self.data, latestOnly=True)
 
-        # if self.plot3D is True:
-        #     if self.Widget3D.isWinOpen==True:
-        #         self.Graph3D()
-        if self.winPointing.isWinOpen is True:
-            self.Pointing()
         if self.winZoomMax.isWinOpen is True:
             self.ZoomMAX()
         if self.winCrop.isWinOpen is True:
             # print('emit new crop image')
-            self.signalCrop.emit(self.cropImg)
-        if self.spectro is True: 
-            #if self.winSpectro.isWinOpen is True:
-            self.signalSpectro.emit(self.data)
-            temp_shotnumber = -1
-            self.temp_dataArray = [self.data, temp_shotnumber]
-            self.signalSpectroList.emit(self.temp_dataArray)
-
-        self.signalDisplayed.emit(True)
-        
-        #  autosave
-        if self.checkBoxAutoSave.isChecked():  # autosave data
-            
-            self.pathAutoSave = str(self.conf.value(self.name+'/pathAutoSave'))
-            self.fileNameSave = str(self.conf.value(self.name+'/nameFile'))
-            date = time.strftime("%Y_%m_%d_%H_%M_%S")
-            self.numTir = int(self.conf.value(self.name+'/tirNumber'))
-            # if self.numTir < 10:
-            #     num = "00"+ str(self.numTir)
-            # elif 9<self.numTir<100:
-            #     num = "0" + str(self.numTir)
-            # else:
-            # num = str(self.numTir)
-            num = "%04i" % self.numTir
-            if self.winOpt.checkBoxDate.isChecked():  # add the date
-                # nomFichier = str(str(self.pathAutoSave) + '/' + self.fileNameSave + '_' + num+'_' + date)
-                nomFichier = f"{self.pathAutoSave}/{self.fileNameSave}_{num}_{date}"
-            else:
-                # nomFichier = str(str(self.pathAutoSave) + '/' + self.fileNameSave + '_'+num)
-                nomFichier = f"{self.pathAutoSave}/{self.fileNameSave}_{num}"
-                #print(nomFichier)
-
-            print(nomFichier, 'saved')
-            if self.winOpt.checkBoxTiff.isChecked():  # save as tiff
-                self.dataS = np.rot90(self.data, 1)
-                img_PIL = Image.fromarray(self.dataS)
-                img_PIL.save(str(nomFichier) + '.TIFF', format='TIFF')
-            else:
-                np.savetxt(str(nomFichier)+'.txt', self.data)
-
-            if not self.winOpt.checkBoxServer.isChecked():  
-                # if not connected to server we had +1
-                self.numTir += 1
-                self.winOpt.setTirNumber(self.numTir)
-
-            self.conf.setValue(self.name+"/tirNumber", self.numTir)
-            self.fileName.setText(nomFichier)
+            with self.timer.span("crop"):
+                self.signalCrop.emit(self.cropImg)
 
     def mouseClick(self, evt):  # block the cross or allow to print mousse value if mousse button clicked
 
@@ -1590,11 +1898,11 @@ class SEE(QMainWindow):
         if self.maxGraphBox.isChecked():
             # Set another cross on the maximum in green
             if self.ite == 'rect':
-                dataforMax = (self.plotRect.getArrayRegion(self.data, self.imh))
+                dataforMax = self.arrayRegion(self.plotRect)
                 x = self.plotRect.pos()[0]
                 y = self.plotRect.pos()[1]
             elif self.ite == 'cercle':
-                dataforMax = (self.plotCercle.getArrayRegion(self.data, self.imh))
+                dataforMax = self.arrayRegion(self.plotCercle)
                 x = self.plotCercle.pos()[0]
                 y = self.plotCercle.pos()[1]
                 dataforMax = (self.plotPenta.getArrayRegion(self.data, self.imh))
@@ -1604,7 +1912,7 @@ class SEE(QMainWindow):
                 dataforMax = self.data
                 x = 0
                 y = 0
-            (self.xcMax, self.ycMax) = np.unravel_index(dataforMax.argmax(), dataforMax.shape)  # take the max ndimage.measurements.center_of_mass(dataF)#
+            (self.xcMax, self.ycMax) = self.products.get('argmax', dataforMax)  # take the max ndimage.measurements.center_of_mass(dataF)#
             self.xcMax = round(self.xcMax + x, 0)
             self.ycMax = round(self.ycMax + y, 0)
             self.vLineCrossMax.setPos(self.xcMax)
@@ -1746,8 +2054,7 @@ class SEE(QMainWindow):
         # change the color scale
         levels = self.imh.getLevels()
         if levels[0] is None:
-            xmax = self.data.max()
-            xmin = self.data.min()
+            xmin, xmax = self.products.get("levels", self.data)
         else:
             xmax = levels[1]
             xmin = levels[0]
@@ -1760,8 +2067,7 @@ class SEE(QMainWindow):
 
         levels = self.imh.getLevels()
         if levels[0] is None:
-            xmax = self.data.max()
-            xmin = self.data.min()
+            xmin, xmax = self.products.get("levels", self.data)
         else:
             xmax = levels[1]
             xmin = levels[0]
@@ -1771,18 +2077,15 @@ class SEE(QMainWindow):
         self.hist.setHistogramRange(xmin, xmax + (xmax - xmin) / 10)
 
     def paletteauto(self):
-
-        xmax = self.data.max()
-        xmin = self.data.min()
-        if xmax == xmin:
-            xmax = xmin+1
+        # levels at the 0.1 % and 99.9 % percentiles, or the brightest spot (see autoLevels)
+        xmin, xmax = self.products.get("levels", self.data)
 
         self.imh.setLevels([xmin, xmax])
         self.hist.setHistogramRange(xmin, xmax)
 
     def contrast(self):
         if self.ite == 'rect':
-            self.cont = (self.plotRect.getArrayRegion(self.data, self.imh))
+            self.cont = self.arrayRegion(self.plotRect)
             xmax = self.cont.max()
             xmin = self.cont.min()
         else:
@@ -1855,7 +2158,12 @@ class SEE(QMainWindow):
                 "data":self.winSpectro.data_dict,
                 "name":"spectrum"
             }
-            self.serv.set_data(data)
+            if self.serv is None:
+                return
+            if self.serverKind == "lhc":
+                self.serv.set_data(data)
+            else:
+                self.serv.setData(data, shotNumber=self.frameNumber)
 
     def roiChanged(self):
 
@@ -1934,10 +2242,12 @@ class SEE(QMainWindow):
         if fileOpen is False:
 
             chemin = self.conf.value(self.name+"/path")
-            fname = QFileDialog.getOpenFileNames(self, "Open File", chemin, "Images (*.txt *.spe *.TIFF *.sif *.tif);;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
+            fname = QFileDialog.getOpenFileNames(self, "Open File", chemin, fileFilter() + ";;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
             self.openedFiles = fname[0]
 
             self.nbOpenedImage = len(self.openedFiles)
+            if self.nbOpenedImage == 0:  # cancelled
+                return self.data
 
             if self.nbOpenedImage == 1:
                 fichier = self.openedFiles[0]
@@ -1952,24 +2262,9 @@ class SEE(QMainWindow):
         else:
             fichier = str(fileOpen)
 
-        ext = os.path.splitext(fichier)[1]
-
-        if ext == '.txt':  # text file
-            data = np.loadtxt(str(fichier))
-        elif ext == '.spe' or ext == '.SPE':  # SPE file
-            dataSPE = SpeFile(fichier)
-            data1 = dataSPE.data[0]  # .transpose() # first frame
-            data = data1  # np.flipud(data1)
-        elif ext == '.TIFF' or ext == '.tif' or ext == '.Tiff' or ext == '.jpg' or ext == '.JPEG' or ext == '.png':  # tiff File
-            dat = Image.open(fichier)
-            data = np.array(dat)
-            data = np.rot90(data, 3)
-        elif ext == '.sif':
-            sifop = SifFile()
-            im = sifop.openA(fichier)
-            data = np.rot90(im, 3)
-#            self.data = self.data[250:495,:]
-        else:
+        try:  # first frame (see imageReaders)
+            data = openImage(fichier).data
+        except ValueError:
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Icon.Critical)
             msg.setText("Wrong file format !")
@@ -1977,6 +2272,7 @@ class SEE(QMainWindow):
             msg.setWindowTitle("Warning ...")
             msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
             msg.exec_()
+            return self.data
 
         chemin = os.path.dirname(fichier)
         self.conf.setValue(self.name+"/path", chemin)
@@ -1994,7 +2290,7 @@ class SEE(QMainWindow):
     def StactF(self) :
 
         chemin = self.conf.value(self.name+"/path")
-        fname = QFileDialog.getOpenFileNames(self, "Open Multi files", chemin, "Images (*.txt *.spe *.TIFF *.sif *.tif);;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
+        fname = QFileDialog.getOpenFileNames(self, "Open Multi files", chemin, fileFilter() + ";;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
         self.openedFiles = fname[0]
         self.nbOpenedImage = len(self.openedFiles)
         
@@ -2002,23 +2298,9 @@ class SEE(QMainWindow):
         
         for i in range (0,self.nbOpenedImage):
             fichier = self.openedFiles[i]
-            ext = os.path.splitext(fichier)[1]
-            if ext == '.txt':  # text file
-                data = np.loadtxt(str(fichier))
-            elif ext == '.spe' or ext == '.SPE':  # SPE file
-                dataSPE = SpeFile(fichier)
-                data1 = dataSPE.data[0]  # .transpose() # first frame
-                data = data1  # np.flipud(data1)
-            elif ext == '.TIFF' or ext == '.tif' or ext == '.Tiff' or ext == '.jpg' or ext == '.JPEG' or ext == '.png':  # tiff File
-                dat = Image.open(fichier)
-                data = np.array(dat)
-                data = np.rot90(data, 3)
-            elif ext == '.sif':
-                sifop = SifFile()
-                im = sifop.openA(fichier)
-                data = np.rot90(im, 3)
-    #            self.data = self.data[250:495,:]
-            else:
+            try:  # first frame (see imageReaders)
+                data = openImage(fichier).data
+            except ValueError:
                 msg = QMessageBox()
                 msg.setIcon(QMessageBox.Icon.Critical)
                 msg.setText("Wrong file format !")
@@ -2026,6 +2308,7 @@ class SEE(QMainWindow):
                 msg.setWindowTitle("Warning ...")
                 msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
                 msg.exec_()
+                return
         
             datS.append(data)
         
@@ -2040,27 +2323,15 @@ class SEE(QMainWindow):
     def OpenFNewWin(self):
 
         chemin = self.conf.value(self.name+"/path")
-        fname = QFileDialog.getOpenFileNames(self, "Open File", chemin, "Images (*.txt *.spe *.TIFF *.sif *.tif);;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
+        fname = QFileDialog.getOpenFileNames(self, "Open File", chemin, fileFilter() + ";;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
         self.openedFiles = fname[0]
+        if len(self.openedFiles) == 0:  # cancelled
+            return
         fichier = self.openedFiles[0]
-        ext = os.path.splitext(fichier)[1]
-
-        if ext == '.txt':  # text file
-            data = np.loadtxt(str(fichier))
-        elif ext == '.spe' or ext == '.SPE':  # SPE file
-            dataSPE = SpeFile(fichier)
-            data1 = dataSPE.data[0]  # .transpose() # first frame
-            data = data1  # np.flipud(data1)
-        elif ext == '.TIFF' or ext == '.tif' or ext == '.Tiff' or ext == '.jpg' or ext == '.JPEG' or ext == '.png':  # tiff File
-            dat = Image.open(fichier)
-            data = np.array(dat)
-            data = np.rot90(data, 3)
-        elif ext == '.sif':
-            sifop = SifFile()
-            im = sifop.openA(fichier)
-            data = np.rot90(im, 3)
-#            self.data = self.data[250:495,:]
-        else:
+
+        try:  # first frame (see imageReaders)
+            data = openImage(fichier).data
+        except ValueError:
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Icon.Critical)
             msg.setText("Wrong file format !")
@@ -2068,6 +2339,7 @@ class SEE(QMainWindow):
             msg.setWindowTitle("Warning ...")
             msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
             msg.exec_()
+            return
 
         chemin = os.path.dirname(fichier)
         self.conf.setValue(self.name+"/path", chemin)
@@ -2096,8 +2368,8 @@ class SEE(QMainWindow):
             print(fichier, ' is saved')
             self.conf.setValue(self.name+"/path", self.path)
             time.sleep(0.1)
-            self.dataS = np.rot90(self.data, 1)
-            img_PIL = Image.fromarray(self.dataS)
+            self.dataS = DISPLAY_TO_FILE.apply(self.data)
+            img_PIL = Image.fromarray(tiffArray(self.dataS))
 
             img_PIL.save(str(fname[0]) + '.TIFF', format='TIFF')
             self.fileName.setText(fname[0]+'.TIFF')
@@ -2106,7 +2378,7 @@ class SEE(QMainWindow):
             fname = QFileDialog.getSaveFileName(self, "Save data as txt", self.path)
             self.path = os.path.dirname(str(fname[0]))
             fichier = fname[0]
-            self.dataS = np.rot90(self.data, 1)
+            self.dataS = self.data  # txt files are saved as displayed
             ext = os.path.splitext(fichier)[1]
             print(fichier, ' is saved')
             self.conf.setValue(self.name+"/path", self.path)
@@ -2118,30 +2390,128 @@ class SEE(QMainWindow):
     def newDataReceived(self, data):
         '''
             Do display and save origin data when new Displadata signal is  sent to  visu
+
+            With 'Draw Last Frame Only' (coalesce) the drawing is done once
+            for the frames received before the event loop runs again. The
+            analysis (Analyse) still runs inline for every frame in the GUI
+            thread: a frame slower to analyse than the camera period still
+            builds up the queue of Qt events.
+
+            With 'processInWorker' (and a dispatcher) the processing of the
+            frame runs in a worker and the rest of the analysis and the
+            drawing when its result arrives (see 'processedFrame'). When the
+            processing is late the oldest waiting frames are dropped by the
+            dispatcher (its counters in 'displayStats'). The frames saved by
+            the autosave are processed in the GUI thread, so none is lost.
         '''
-        self.data = data
         self.ImgFrame.animateClick()  # change icon data when receive image
-        if self.flipButton.isChecked() == 1 and self.flipButtonVert.isChecked() == 1:
-            self.data = np.flipud(self.data)
-            self.data = np.fliplr(self.data)
-        elif self.flipButton.isChecked() == 1:
-            self.data = np.flipud(self.data)
-        elif self.flipButtonVert.isChecked() == 1:
-            self.data = np.fliplr(self.data)
-        else:
-            self.data = data
-
-        self.data = np.rot90(self.data, self.winPref.rotateValue)
+        # flips and rotation composed in one orientation applied as a view:
+        # the frame is not copied before the processing
+        orientation = Orientation.fromSettings(flipUpDown=self.flipButton.isChecked(),
+                                               flipLeftRight=self.flipButtonVert.isChecked(),
+                                               rotate=self.winPref.rotateValue)
+        self.data = orientation.apply(data)
         self.dimy = np.shape(self.data)[1]
         self.dimx = np.shape(self.data)[0]
         self.dataOrgScale = self.data
         self.dataOrg = self.data
-
-        self.updateServer()
-        self.Display(self.data)
+        if self.darkAccumulator is not None:  # snap background in progress
+            self.addDark(self.data)
+
+        with self.timer.span("server"):
+            self.updateServer()
+        self.framesReceived += 1
+        if (self.processInWorker and self.dispatcher is not None
+                and not self.checkBoxAutoSave.isChecked()):
+            params, bg = self.analyseSettings(self.data)
+            self.dispatcher.submit("process", self.processFrame,
+                                   partial(self.processedFrame, params, bg),
+                                   self.data, params, bg, self.winOpt.defectMap)
+        else:
+            with self.timer.span("analyse"):
+                self.Analyse(self.data)
+            self.frameAnalysed()
         self.frameName.setText(str(self.frameNumber))
+        self.frameName.setToolTip(f'received: {self.framesReceived}  '
+                                  f'drawn: {self.framesRendered}  '
+                                  f'not drawn: {self.framesDropped}')
         self.frameNumber = self.frameNumber + 1
 
+    def frameAnalysed(self):
+        '''
+        Draw the frame just analysed. With 'Draw Last Frame Only' every frame
+        is analysed but only the last one is drawn: the frames received before
+        the drawing are dropped from the display.
+        '''
+        if self.coalesceAct.isChecked():
+            if self.renderPending:
+                self.framesDropped += 1
+            else:
+                self.renderPending = True
+                QtCore.QTimer.singleShot(0, self.renderLastFrame)
+        else:
+            with self.timer.span("render"):
+                self.Render()
+            self.framesRendered += 1
+
+    def renderLastFrame(self):
+        '''
+        Draw the last analysed frame, called from the event loop once the
+        pending frames have been analysed.
+        '''
+        self.renderPending = False
+        with self.timer.span("render"):
+            self.Render()
+        self.framesRendered += 1
+
+    def displayStats(self) -> dict:
+        '''
+        Return the counters of the display coalescing.
+        '''
+        stats = {"received": self.framesReceived,
+                 "rendered": self.framesRendered,
+                 "dropped": self.framesDropped}
+        if self.dispatcher is not None:
+            stats["analysis"] = self.dispatcher.stats()
+        return stats
+
+    def registerSpan(self, name):
+        '''
+        Add a stage to the timing of the display, for the windows timing their
+        own work: 'span = parent.registerSpan("myWindow/fit")' then 'with span():'.
+        '''
+        return self.timer.register(name)
+
+    def showTiming(self):
+        '''
+        Show or hide the timing of the slowest stages in the status bar.
+        '''
+        if self.timingAct.isChecked():
+            self.timer.enabled = True
+            self.timingLabel.setVisible(True)
+            self.updateTiming()
+            self.timingRefresh.start()
+        else:
+            self.timingRefresh.stop()
+            self.timingLabel.setVisible(False)
+
+    def updateTiming(self):
+        self.timingLabel.setText(self.timer.statusText())
+        self.timingLabel.setToolTip('\n'.join(
+            f"{name}: p50 {values['p50_ms']} p99 {values['p99_ms']} max {values['max_ms']} ms"
+            for name, values in self.timer.summary().items() if values["count"] > 0))
+
+    def saveTiming(self):
+        '''
+        Save the timing of the stages (percentiles and durations) in a json file.
+        '''
+        fname = QFileDialog.getSaveFileName(self, "Save timing as json", self.path)
+        if fname[0] == '':
+            return
+        fichier = fname[0] if fname[0].endswith('.json') else fname[0] + '.json'
+        self.timer.dump(fichier, samples=True)
+        print(fichier, ' is saved')
+
     def ScaleImg(self):
         # scale Axis px to um
         if self.winPref.checkBoxAxeScale.isChecked():
@@ -2285,17 +2655,19 @@ class SEE(QMainWindow):
         if self.winCrop.isWinOpen is True:
 
             if self.ite == "pentagon":
-                self.cropImg = self.plotPentagon.getArrayRegion(self.data, self.imh)
+                self.cropImg = self.arrayRegion(self.plotPentagon)
             elif self.ite == 'rect':
-                self.cropImg = self.plotRect.getArrayRegion(self.data, self.imh)
+                self.cropImg = self.arrayRegion(self.plotRect)
             elif self.ite == 'cercle':
-                self.cropImg = self.plotCercle.getArrayRegion(self.data, self.imh)
+                self.cropImg = self.arrayRegion(self.plotCercle)
             else:
                 self.cropImg = self.data
             self.winCrop.Display(self.cropImg)
 
     def spectroFunct(self):
         self.open_widget(self.winSpectro)
+        if self.dispatcher is not None:  # not connected to signalSpectro
+            self.winSpectro.Display(self.data)
         self.signalSpectro.emit(self.data)
 
     def closeEvent(self, event):
@@ -2328,7 +2700,10 @@ class SEE(QMainWindow):
             if self.winSpectro.isWinOpen is True:
                 self.winSpectro.close()
         
-        self.serv.stop() # stop the server thread properly
+        if self.dispatcher is not None:
+            self.dispatcher.shutdown()
+        if self.serv is not None:
+            self.serv.stop() # stop the server thread (or process) properly
 
 
 class DialogColorBar(QDialog):
@@ -34,16 +34,15 @@ import os
 import numpy as np
 import qdarkstyle  # pip install qdarkstyle https://github.com/ColinDuquesnoy/QDarkStyleSheet  sur conda
 from scipy.interpolate import splrep, sproot
-from scipy.ndimage import gaussian_filter, median_filter
+from scipy.ndimage import gaussian_filter
 from PIL import Image
-from visu.winspec import SpeFile
+from visu.imageReaders import openImage, fileFilter
 from visu.visualLight import SEELIGHT
 from visu.winSuppE import WINENCERCLED
 from visu.WinCut import GRAPHCUT
 from visu.winMeas import MEAS
 from visu.WinOption import OPTION
 from visu.WinPreference import PREFERENCES
-from visu.andor import SifFile
 from visu.winFFT import WINFFT
 from visu.winMath import WINMATH
 from visu.winPointing import WINPOINTING
@@ -52,6 +51,7 @@ from visu import aboutWindows
 from visu.winZoom import ZOOM
 from visu.winCrop import WINCROP
 from visu.winSpectro_old import WINSPECTRO
+from visu.tiledFilter import gaussianFilter, medianFilter
 # try :
 #     from visu.Win3D import GRAPH3D #conda install pyopengl
 # except :
@@ -1128,11 +1128,11 @@ class SEEELECTRONS(QMainWindow):
 
         # filtre
         if self.filter == 'gauss':
-            self.data = gaussian_filter(self.data, self.sigma)
+            self.data = gaussianFilter(self.data, self.sigma)
             # print('gauss filter')
 
         if self.filter == 'median':
-            self.data = median_filter(self.data, size=self.sigma)
+            self.data = medianFilter(self.data, self.sigma)
             # print('median filter')
         if self.filter == 'threshold':  # 0 si sous le seuil
             self.data = np.where(self.data < self.threshold, 0, self.data)
@@ -1683,7 +1683,7 @@ class SEEELECTRONS(QMainWindow):
         if fileOpen is False:
 
             chemin = self.conf.value(self.name+"/path")
-            fname = QFileDialog.getOpenFileNames(self, "Open File", chemin, "Images (*.txt *.spe *.TIFF *.sif *.tif);;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
+            fname = QFileDialog.getOpenFileNames(self, "Open File", chemin, fileFilter() + ";;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
             self.openedFiles = fname[0]
 
             self.nbOpenedImage = len(self.openedFiles)
@@ -1701,24 +1701,9 @@ class SEEELECTRONS(QMainWindow):
         else:
             fichier = str(fileOpen)
 
-        ext = os.path.splitext(fichier)[1]
-
-        if ext == '.txt':  # text file
-            data = np.loadtxt(str(fichier))
-        elif ext == '.spe' or ext == '.SPE':  # SPE file
-            dataSPE = SpeFile(fichier)
-            data1 = dataSPE.data[0]  # .transpose() # first frame
-            data = data1  # np.flipud(data1)
-        elif ext == '.TIFF' or ext == '.tif' or ext == '.Tiff' or ext == '.jpg' or ext == '.JPEG' or ext == '.png':  # tiff File
-            dat = Image.open(fichier)
-            data = np.array(dat)
-            data = np.rot90(data, 3)
-        elif ext == '.sif':
-            sifop = SifFile()
-            im = sifop.openA(fichier)
-            data = np.rot90(im, 3)
-#            self.data = self.data[250:495,:]
-        else:
+        try:  # first frame (see imageReaders)
+            data = openImage(fichier).data
+        except ValueError:
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Critical)
             msg.setText("Wrong file format !")
@@ -1726,6 +1711,7 @@ class SEEELECTRONS(QMainWindow):
             msg.setWindowTitle("Warning ...")
             msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
             msg.exec_()
+            return self.data
 
         chemin = os.path.dirname(fichier)
         self.conf.setValue(self.name+"/path", chemin)
@@ -1743,27 +1729,12 @@ class SEEELECTRONS(QMainWindow):
     def OpenFNewWin(self):
 
         chemin = self.conf.value(self.name+"/path")
-        fname = QFileDialog.getOpenFileNames(self, "Open File", chemin, "Images (*.txt *.spe *.TIFF *.sif *.tif);;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
+        fname = QFileDialog.getOpenFileNames(self, "Open File", chemin, fileFilter() + ";;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
         self.openedFiles = fname[0]
         fichier = self.openedFiles[0]
-        ext = os.path.splitext(fichier)[1]
-
-        if ext == '.txt':  # text file
-            data = np.loadtxt(str(fichier))
-        elif ext == '.spe' or ext == '.SPE':  # SPE file
-            dataSPE = SpeFile(fichier)
-            data1 = dataSPE.data[0]  # .transpose() # first frame
-            data = data1  # np.flipud(data1)
-        elif ext == '.TIFF' or ext == '.tif' or ext == '.Tiff' or ext == '.jpg' or ext == '.JPEG' or ext == '.png':  # tiff File
-            dat = Image.open(fichier)
-            data = np.array(dat)
-            data = np.rot90(data, 3)
-        elif ext == '.sif':
-            sifop = SifFile()
-            im = sifop.openA(fichier)
-            data = np.rot90(im, 3)
-#            self.data = self.data[250:495,:]
-        else:
+        try:  # first frame (see imageReaders)
+            data = openImage(fichier).data
+        except ValueError:
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Critical)
             msg.setText("Wrong file format !")
@@ -1771,6 +1742,7 @@ class SEEELECTRONS(QMainWindow):
             msg.setWindowTitle("Warning ...")
             msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
             msg.exec_()
+            return
 
         chemin = os.path.dirname(fichier)
         self.conf.setValue(self.name+"/path", chemin)
@@ -1809,7 +1781,7 @@ class SEEELECTRONS(QMainWindow):
             fname = QFileDialog.getSaveFileName(self, "Save data as txt", self.path)
             self.path = os.path.dirname(str(fname[0]))
             fichier = fname[0]
-            self.dataS = np.rot90(self.data, 1)
+            self.dataS = self.data  # txt files are saved as displayed
             ext = os.path.splitext(fichier)[1]
             print(fichier, ' is saved')
             self.conf.setValue(self.name+"/path", self.path)
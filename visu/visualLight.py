@@ -30,11 +30,10 @@ import os
 import numpy as np
 import qdarkstyle  # pip install qdarkstyle https://github.com/ColinDuquesnoy/QDarkStyleSheet  sur conda
 from PIL import Image
-from visu.winspec import SpeFile
+from visu.imageReaders import openImage, fileFilter
 from visu.winMeas import MEAS
 from visu.WinOption import OPTION
 from visu.WinPreference import PREFERENCES
-from visu.andor import SifFile
 from visu.winPointing import WINPOINTING
 import pathlib
 import visu
@@ -752,7 +751,7 @@ class SEELIGHT(QMainWindow):
         fileOpen = fileOpen
         if fileOpen is False:
             chemin = self.conf.value(self.name+"/path")
-            fname = QFileDialog.getOpenFileNames(self, "Open File", chemin, "Images (*.txt *.spe *.TIFF *.sif *.tif);;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
+            fname = QFileDialog.getOpenFileNames(self, "Open File", chemin, fileFilter() + ";;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
             fichier = fname[0]
             self.openedFiles = fichier
             self.nbOpenedImage = len(fichier)
@@ -770,24 +769,9 @@ class SEELIGHT(QMainWindow):
         else:
             fichier = str(fileOpen)
             
-        ext = os.path.splitext(fichier)[1]
-        
-        if ext == '.txt':  # text file
-            data = np.loadtxt(str(fichier))
-        elif ext == '.spe' or ext == '.SPE':  # SPE file
-            dataSPE = SpeFile(fichier)
-            data1 = dataSPE.data[0]  # .transpose() # first frame
-            data = data1  # np.flipud(data1)
-        elif ext == '.TIFF' or ext == '.tif' or ext == '.Tiff' or ext == '.jpg' or ext == '.JPEG' or ext == '.png':  # tiff File
-            dat = Image.open(fichier)
-            data = np.array(dat)
-            data = np.rot90(data, 3)
-        elif ext == '.sif':
-            sifop = SifFile()
-            im = sifop.openA(fichier)
-            data = np.rot90(im, 3)
-#            self.data=self.data[250:495,:]
-        else:
+        try:  # first frame (see imageReaders)
+            data = openImage(fichier).data
+        except ValueError:
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Icon.Critical)
             msg.setText("Wrong file format !")
@@ -795,6 +779,7 @@ class SEELIGHT(QMainWindow):
             msg.setWindowTitle("Warning ...")
             msg.setWindowFlags(QtCore.Qt.WindowType.WindowStaysOnTopHint)
             msg.exec_()
+            return self.data
             
         chemin = os.path.dirname(fichier)
         self.conf.setValue(self.name+"/path", chemin)
@@ -824,7 +809,7 @@ class SEELIGHT(QMainWindow):
             fname = QFileDialog.getSaveFileName(self, "Save data as txt", self.path)
             self.path = os.path.dirname(str(fname[0]))
             fichier = fname[0]
-            self.dataS = np.rot90(self.data, 1)
+            self.dataS = self.data  # txt files are saved as displayed
             ext = os.path.splitext(fichier)[1]
             
             print(fichier, ' is saved')
@@ -20,6 +20,8 @@ import numpy as np
 import qdarkstyle  # pip install qdakstyle https://github.com/ColinDuquesnoy/QDarkStyleSheet  sur conda
 import os
 import pathlib
+from visu.orientation import DISPLAY_TO_FILE
+from visu.imageReaders import openImage
 
 
 class WINCROP(QMainWindow):
@@ -201,15 +203,14 @@ class WINCROP(QMainWindow):
 
         fname = QFileDialog.getOpenFileNames(self, "Open File")
         self.openedFiles = fname[0]
+        if len(self.openedFiles) == 0:  # cancelled
+            return
         fichier = self.openedFiles[0]
-        ext = os.path.splitext(fichier)[1]
-        
-        if ext == '.txt':  # text file
-            data = np.loadtxt(str(fichier))
-        elif ext == '.TIFF' or ext == '.tif' or ext == '.Tiff' or ext == '.jpg' or ext == '.JPEG' or ext == '.png':  # tiff File
-            dat = Image.open(fichier)
-            data = np.array(dat)
-            data = np.rot90(data, 3)
+        try:  # first frame (see imageReaders)
+            self.data = openImage(fichier).data
+        except ValueError as e:
+            print('open error:', e)
+            return
 
         self.Display(self.data)
 
@@ -221,7 +222,7 @@ class WINCROP(QMainWindow):
         print(fichier, ' is saved')
         self.conf.setValue(self.name+"/path", self.path)
         time.sleep(0.1)
-        self.dataS = np.rot90(self.data, 1)
+        self.dataS = DISPLAY_TO_FILE.apply(self.data)
         img_PIL = Image.fromarray(self.dataS)
         img_PIL.save(str(fname[0])+'.TIFF', format='TIFF')
         
@@ -29,14 +29,15 @@ import pyqtgraph as pg  # pip install pyqtgraph (https://github.com/pyqtgraph/py
 
 
 from scipy.interpolate import splrep, sproot  #
-from scipy.ndimage.filters import gaussian_filter, median_filter
+from scipy.ndimage.filters import gaussian_filter
+from visu.tiledFilter import gaussianFilter, medianFilter
 from PIL import Image
-from visu.winspec import SpeFile
 from visu.winSuppE import WINENCERCLED
 from visu.WinCut import GRAPHCUT
 from visu.winMeas import MEAS
 from visu.WinOption import OPTION
-from visu.andor import SifFile
+from visu.imageReaders import openImage, fileFilter
+from visu.imageProcessing import displayArray
 
 
 class WINFFT(QWidget):
@@ -68,11 +69,24 @@ class WINFFT(QWidget):
         self.setLayout(hMainLayout)
 
     def Display(self, data):
-        self.data = data
-        if self.data.ndim == 2:
-            datafft = np.fft.fft2(np.array(self.data))
-            self.norm = abs(np.fft.fftshift(datafft))  # datafft*datafft.conj()
-            self.norm = np.log10(1+self.norm)
+        self.showResult(self.compute(data))
+
+    def compute(self, data):
+        '''
+        Log of the modulus of the fft of the image (None if data is not 2D).
+        No widget is used: it can run in a worker thread (see analysisDispatcher).
+        '''
+        norm = None
+        if data.ndim == 2:
+            datafft = np.fft.fft2(np.array(data))
+            norm = abs(np.fft.fftshift(datafft))  # datafft*datafft.conj()
+            norm = np.log10(1+norm)
+        return data, norm
+
+    def showResult(self, result):
+        self.data, norm = result
+        if norm is not None:
+            self.norm = norm
             self.visualisationFFT.newDataReceived(self.norm)
            
     def closeEvent(self, event):
@@ -539,17 +553,17 @@ class SEEFFT(QWidget):
         self.p1.setYRange(0, self.dimy)
         
         if self.filter == 'gauss':
-            self.data = gaussian_filter(self.data, self.sigma)
+            self.data = gaussianFilter(self.data, self.sigma)
             print('gauss filter')
             
         if self.filter == 'median':
-            self.data = median_filter(self.data, size=self.sigma)
+            self.data = medianFilter(self.data, self.sigma)
             print('median filter')
          
         if self.checkBoxScale.isChecked():  # autoscale on
-            self.imh.setImage(self.data.astype(float), autoLevels=True, autoDownsample=True)
+            self.imh.setImage(displayArray(self.data), autoLevels=True, autoDownsample=True)
         else:
-            self.imh.setImage(self.data.astype(float), autoLevels=False, autoDownsample=True)
+            self.imh.setImage(displayArray(self.data), autoLevels=False, autoDownsample=True)
         
         self.PlotXY()  # graph update
         
@@ -834,29 +848,14 @@ class SEEFFT(QWidget):
 
         if fileOpen is False:
             chemin = self.conf.value(self.name+"/path")
-            fname = QtGui.QFileDialog.getOpenFileName(self, "Open File", chemin, "Images (*.txt *.spe *.TIFF *.sif *.tif);;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
+            fname = QtGui.QFileDialog.getOpenFileName(self, "Open File", chemin, fileFilter() + ";;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
             fichier = fname[0]
         else:
             fichier = str(fileOpen)
             
-        ext = os.path.splitext(fichier)[1]
-        
-        if ext == '.txt':  # text file
-            self.data = np.loadtxt(str(fichier))
-        elif ext == '.spe' or ext == '.SPE':  # SPE file
-            dataSPE = SpeFile(fichier)
-            data1 = dataSPE.data[0]  # .transpose() # first frame
-            self.data = data1  # np.flipud(data1)
-        elif ext == '.TIFF' or ext == '.tif':  # tiff File
-            dat = Image.open(fichier)
-            self.data = np.array(dat)
-        elif ext == '.sif':
-            sifop = SifFile()
-            im = sifop.openA(fichier)
-            
-            self.data = np.rot90(im, 3)
-#            self.data=self.data[250:495,:]
-        else:
+        try:  # first frame (see imageReaders)
+            self.data = openImage(fichier).data
+        except ValueError:
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Critical)
             msg.setText("Wrong file format !")
@@ -864,6 +863,7 @@ class SEEFFT(QWidget):
             msg.setWindowTitle("Warning ...")
             msg.setWindowFlags(QtCore.Qt.WindowStaysOnTopHint)
             msg.exec_()
+            return
             
         chemin = os.path.dirname(fichier)
         self.conf.setValue(self.name+"/path", chemin)
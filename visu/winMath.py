@@ -14,9 +14,7 @@ from PyQt6.QtGui import QIcon
 import sys
 import os
 import numpy as np
-from visu.andor import SifFile
-from PIL import Image
-from visu.winspec import SpeFile
+from visu.imageReaders import openImage, fileFilter
 import pathlib
 
 
@@ -149,7 +147,7 @@ class WINMATH(QWidget):
         if fileOpen is False:
             
             chemin = self.conf.value(self.name+"/path")
-            fname = QFileDialog.getOpenFileName(self, "Open File", chemin, "Images (*.txt *.spe *.TIFF *.sif *.tif);;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
+            fname = QFileDialog.getOpenFileName(self, "Open File", chemin, fileFilter() + ";;Text File(*.txt);;Ropper File (*.SPE);;Andor File(*.sif);; TIFF file(*.TIFF)")
             
             fichier = fname[0]
             self.openedFiles = fichier
@@ -157,24 +155,9 @@ class WINMATH(QWidget):
         else:
             fichier = str(fileOpen)
             
-        ext = os.path.splitext(fichier)[1]
-        
-        if ext == '.txt':  # text file
-            data = np.loadtxt(str(fichier))
-        elif ext == '.spe' or ext == '.SPE':  # SPE file
-            dataSPE = SpeFile(fichier)
-            data1 = dataSPE.data[0]  # .transpose() # first frame
-            data = data1  # np.flipud(data1)
-        elif ext == '.TIFF' or ext == '.tif' or ext == '.Tiff' or ext == '.jpg' or ext == '.JPEG' or ext == '.png':  # tiff File
-            dat = Image.open(fichier)
-            data = np.array(dat)
-            data = np.rot90(data, 3)
-        elif ext == '.sif':
-            sifop = SifFile()
-            im = sifop.openA(fichier)
-            data = np.rot90(im, 3)
-#            self.data=self.data[250:495,:]
-        else:
+        try:  # first frame (see imageReaders)
+            data = openImage(fichier).data
+        except ValueError:
             msg = QMessageBox()
             msg.setIcon(QMessageBox.Critical)
             msg.setText("Wrong file format !")
@@ -182,6 +165,7 @@ class WINMATH(QWidget):
             msg.setWindowTitle("Warning ...")
             msg.setWindowFlags(QtCore.Qt.WindowStaysOnTopHint)
             msg.exec_()
+            return (None, '')
             
         chemin = os.path.dirname(fichier)
         self.conf.setValue(self.name+"/path", chemin)
@@ -23,7 +23,7 @@ import numpy as np
 import sys
 import time
 import os
-from scipy import ndimage
+from visu.frameProducts import getProduct
 
 
 
@@ -444,27 +444,50 @@ class MEAS(QMainWindow):
         self.signalPlot.emit(self.signalTrans)
 
     def Display(self, data):
-        self.data = data[0]
-        self.transx=data[1]
-        self.transy=data[2]
-        self.scalex=data[3]
-        self.scaley=data[4]
+        self.showResult(self.compute(data, self.ThresholdState, self.threshold))
+
+    def compute(self, obje, thresholdState=False, threshold=0):
+        '''
+        Measurements of the image (max, min, sum, mean, max and center of mass).
+        No widget is used: it can run in a worker thread (see analysisDispatcher).
+        '''
+        data, transx, transy, scalex, scaley = obje
+        (xmax, ymax) = getProduct(self.parent, "argmax", data)
+        # print(self.maxx,data[int(self.xmax),int(self.ymax)])
+        (xcmass, ycmass) = getProduct(self.parent, "centerOfMass", data)
+        result = {"obje": obje,
+                  "maxx": round(data.max(), 3),
+                  "minn": round(data.min(), 3),
+                  "summ": round(data.sum(), 3),
+                  "moy": round(data.mean(), 3),
+                  "xmax": (xmax + transx) * scalex,
+                  "ymax": (ymax + transy) * scaley,
+                  "xcmass": (round(xcmass, 3) + transx) * scalex,
+                  "ycmass": (round(ycmass, 3) + transy) * scaley,
+                  "summThre": None}
+        if thresholdState is True:
+            dataCor = np.where(data < threshold, 0, data)
+            result["summThre"] = round(dataCor.sum(), 3)
+        return result
+
+    def showResult(self, result):
+        '''
+        Add the result of 'compute' to the table and update the plots.
+        '''
+        self.data, self.transx, self.transy, self.scalex, self.scaley = result["obje"]
         
         #print(self.transx,self.scaley)
-        self.maxx = round(self.data.max(), 3)
-        self.minn = round(self.data.min(), 3)
-        self.summ = round(self.data.sum(), 3)
-        self.moy = round(self.data.mean(), 3)
+        self.maxx = result["maxx"]
+        self.minn = result["minn"]
+        self.summ = result["summ"]
+        self.moy = result["moy"]
         self.user1 = round(self.FctUser1(), 3)
         self.date = time.strftime("%Y_%m_%d_%H_%M_%S")
         
-        (self.xmax, self.ymax) = np.unravel_index(self.data.argmax(), self.data.shape)
-        self.xmax = (self.xmax + self.transx) * self.scalex 
-        self.ymax = (self.ymax  + self.transy) * self.scaley 
-        # print(self.maxx,data[int(self.xmax),int(self.ymax)])
-        (self.xcmass, self.ycmass) = ndimage.center_of_mass(self.data)
-        self.xcmass = (round(self.xcmass, 3) + self.transx) *self.scalex
-        self.ycmass = (round(self.ycmass, 3) + self.transy) *self.scaley
+        self.xmax = result["xmax"]
+        self.ymax = result["ymax"]
+        self.xcmass = result["xcmass"]
+        self.ycmass = result["ycmass"]
         
         self.xs = self.data.shape[0]
         self.ys = self.data.shape[1]
@@ -498,9 +521,8 @@ class MEAS(QMainWindow):
         self.table.resizeColumnsToContents()
         self.labelsVert.append('%s' % self.shoot)
         
-        if self.ThresholdState is True:
-            dataCor = np.where(self.data < self.threshold, 0, data)
-            self.summThre = round(dataCor.sum(), 3)
+        if result["summThre"] is not None:
+            self.summThre = result["summThre"]
             self.SummThre.append(self.summThre)
             self.TableSauv.append('%s,%.1f,%.1f,%i,%i,%.1f,%.3f,%.2f,%.2f,%.2f, %.2f,%.2f,%.2f,%.2f,%s' % (self.nomFichier, self.maxx, self.minn, self.xmax, self.ymax, self.summ, self.moy, self.xs, self.ys, self.xcmass, self.ycmass, Posi, self.summThre, self.user1, self.date))
             
@@ -19,10 +19,9 @@ import numpy as np
 import qdarkstyle  # pip install qdakstyle https://github.com/ColinDuquesnoy/QDarkStyleSheet  sur conda
 #import pylab
 import os
-from scipy.ndimage.filters import gaussian_filter  # pour la reduction du bruit
 # from scipy.interpolate import splrep, sproot # pour calcul fwhm et fit 
 import pathlib
-from scipy import ndimage
+from visu.frameProducts import getProduct
 
 
 class WINPOINTING(QMainWindow):
@@ -211,28 +210,38 @@ class WINPOINTING(QMainWindow):
             self.parent.signalPointing.connect(self.Display)
         
     def Display(self, obje):
+        self.showResult(self.compute(obje, self.centerOfMass.isChecked()))
 
-        self.data = obje[0]
-        self.dimx = self.data.shape[0]
-        self.dimy = self.data.shape[1]
-        self.stepX = obje[1]
-        self.stepY = obje[2]
-        self.xini = obje[3]
-        self.yini = obje[4]
-        dataF = gaussian_filter(self.data, 5)
-        
-        if self.centerOfMass.isChecked():
-            (self.xec, self.yec) = ndimage.center_of_mass(dataF)
-            self.label = 'com'
+    def compute(self, obje, centerOfMass=False):
+        '''
+        Position of the maximum (or of the center of mass) of the smoothed image.
+        No widget is used: it can run in a worker thread (see analysisDispatcher).
+        '''
+        data, stepX, stepY, xini, yini = obje
+        # smoothed image shared with the other windows of the parent
+        dataF = getProduct(self.parent, "smoothed", data, sigma=5)
+        
+        if centerOfMass:
+            (xec, yec) = getProduct(self.parent, "centerOfMass", dataF)
+            label = 'com'
 
         else:
-            (self.xec, self.yec) = np.unravel_index(dataF.argmax(), self.data.shape)
+            (xec, yec) = getProduct(self.parent, "argmax", dataF)
             #Replaced pylab.unravel_index by np.unravel_index a vernier 20/12/25
-            self.label = 'max'
+            label = 'max'
 
-        
-        self.xec = (self.xec+self.xini)*self.stepX
-        self.yec = (self.yec+self.yini)*self.stepX
+        return {"obje": obje, "xec": (xec+xini)*stepX, "yec": (yec+yini)*stepX, "label": label}
+
+    def showResult(self, result):
+        '''
+        Update the plots with the result of 'compute'.
+        '''
+        self.data, self.stepX, self.stepY, self.xini, self.yini = result["obje"]
+        self.dimx = self.data.shape[0]
+        self.dimy = self.data.shape[1]
+        self.xec = result["xec"]
+        self.yec = result["yec"]
+        self.label = result["label"]
         
         self.Xec.append(self.xec)
         self.Yec.append(self.yec)
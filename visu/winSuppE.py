@@ -24,6 +24,8 @@ from scipy.interpolate import splrep, sproot  # pour calcul fwhm et fit
 import pathlib
 
 from PIL import Image
+from visu.frameProducts import getProduct
+from visu.imageProcessing import displayArray
 
 class WINENCERCLED(QWidget):
 
@@ -582,6 +584,26 @@ class WINENCERCLED(QWidget):
 
 
     def Display(self, data):
+        self.showResult(self.compute(data, self.checkBoxAuto.isChecked()))
+
+    def compute(self, data, auto=True):
+        '''
+        Image to display, levels of the color scale (percentiles, see
+        autoLevels) and position of the maximum of the smoothed image.
+        No widget is used: it can run in a worker thread (see analysisDispatcher).
+        '''
+        result = {"data": data, "image": displayArray(data), "centroid": None,
+                  "levels": getProduct(self.parent, "levels", data)}
+        if auto:
+            dataF = getProduct(self.parent, "smoothed", data, sigma=5) # apply a gaussian filter
+            result["centroid"] = getProduct(self.parent, "argmax", dataF) # get the maximum
+        return result
+
+    def showResult(self, result):
+        '''
+        Display the image and the cuts with the result of 'compute'.
+        '''
+        data = result["data"]
         self.dataOrg = data
         self.data = data
         
@@ -595,26 +617,23 @@ class WINENCERCLED(QWidget):
         
         if not self.checkBoxCentred.isChecked():
             self.plotItem.enableAutoRange(False) # prevent the zoom pattern
-        self.imh.setImage(data.astype(float), autoLevels=True, autoDownsample=True)
+        self.imh.setImage(result["image"], autoLevels=False, levels=result["levels"],
+                          autoDownsample=True)
         
         # brightness levels
-        levels = self.imh.getLevels()
-        if levels[0] is None:
-            self.base_xmin = float(self.data.min())
-            self.base_xmax = float(self.data.max())
-        else:
-            self.base_xmin = float(levels[0])
-            self.base_xmax = float(levels[1])
+        self.base_xmin, self.base_xmax = result["levels"]
 
-        self.computeCentroid()
+        self.computeCentroid(result["centroid"])
         self.Coupe()
         self.Back()
         self.updateBrightness(self.brightnessBox.value())
     
-    def computeCentroid(self):
+    def computeCentroid(self, centroid=None):
         if self.checkBoxAuto.isChecked():
-            dataF = gaussian_filter(self.data, 5) # apply a gaussian filter
-            (self.xec, self.yec) = np.unravel_index(dataF.argmax(), self.data.shape) # get the maximum
+            if centroid is None:
+                dataF = getProduct(self.parent, "smoothed", self.data, sigma=5) # apply a gaussian filter
+                centroid = getProduct(self.parent, "argmax", dataF) # get the maximum
+            (self.xec, self.yec) = centroid
             self.vLine.setPos(self.xec) # set the cursors
             self.hLine.setPos(self.yec)   
             self.circle.setPos([self.xec - self.rxFixed, 